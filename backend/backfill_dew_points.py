@@ -0,0 +1,138 @@
+"""
+Ergänzt bestehende Messwerte um gespeicherte Taupunkte.
+
+Die Messwerte werden chronologisch in Blöcken verarbeitet. Nach jedem Block werden der Zeitstempel
+des letzten Messwerts und die IDs der Messwerte mit genau diesem Zeitstempel in CHECKPOINT_FILE
+gespeichert, ein abgebrochener Lauf macht beim nächsten Start dort weiter. Messwerte mit ungültiger
+Luftfeuchtigkeit (<= 0) werden protokolliert und übersprungen.
+
+Aufruf: python backfill_dew_points.py [Blockgröße]
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+from ravendb.documents.session.document_session import DocumentSession
+
+from dependencies import raven_db, calculations, indexes
+from dependencies.models import Reading
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "backfill_dew_points.checkpoint"
+DEFAULT_BATCH_SIZE = 1000
+
+
+def load_checkpoint() -> tuple[datetime | None, set[str]]:
+    if not os.path.exists(CHECKPOINT_FILE):
+        return None, set()
+    with open(CHECKPOINT_FILE) as f:
+        content = f.read().strip()
+    # Ältere Checkpoints enthalten nur den Zeitstempel
+    if not content.startswith("{"):
+        return datetime.fromisoformat(content), set()
+    checkpoint = json.loads(content)
+    return datetime.fromisoformat(checkpoint["after"]), set(checkpoint["ids"])
+
+
+def save_checkpoint(timestamp: datetime, seen: set[str]):
+    with open(CHECKPOINT_FILE, "w") as f:
+        json.dump({"after": timestamp.isoformat(), "ids": sorted(seen)}, f)
+
+
+def advance(batch: list[Reading], after: datetime | None, seen: set[str]) -> tuple[datetime | None, set[str]]:
+    """
+    Position nach einem Block: Zeitstempel des letzten Messwerts und IDs aller bereits verarbeiteten
+    Messwerte mit genau diesem Zeitstempel.
+
+    Die nächste Abfrage liest ab diesem Zeitstempel (>=) und lässt die IDs aus, so gehen Messwerte mit
+    gleichem Zeitstempel an einer Blockgrenze nicht verloren.
+    """
+    if not batch:
+        return after, seen
+
+    last = batch[-1].timestamp
+    at_last = {r.Id for r in batch if r.timestamp == last}
+    if last == after:
+        return last, seen | at_last
+    return last, at_last
+
+
+def _valid_humidity(reading: Reading) -> bool:
+    return reading.indoor_humidity > 0 and reading.outdoor_humidity > 0
+
+
+def backfill_batch(
+    session: DocumentSession, after: datetime | None, seen: set[str], batch_size: int,
+) -> tuple[list[Reading], int, int]:
+    """
+    Verarbeitet die nächsten batch_size noch nicht gesehenen Messwerte ab dem Zeitstempel after.
+
+    :return: (gelesene Messwerte, aktualisierte Messwerte, übersprungene ungültige Messwerte)
+    """
+    query = session.query_index_type(indexes.Readings_ByTimestamp, Reading)
+    if after is not None:
+        query = query.where_greater_than_or_equal("timestamp", after)
+    # Unter den ersten batch_size + len(seen) sind höchstens len(seen) schon verarbeitet
+    batch = [r for r in query.order_by("timestamp").take(batch_size + len(seen)) if r.Id not in seen]
+
+    missing = [r for r in batch if r.dew_point_indoor is None or r.dew_point_outdoor is None]
+    invalid = [r for r in missing if not _valid_humidity(r)]
+    for r in invalid:
+        logger.warning(
+            "Überspringe %s: ungültige Luftfeuchtigkeit (innen %s, außen %s)",
+            r.Id, r.indoor_humidity, r.outdoor_humidity,
+        )
+    missing = [r for r in missing if _valid_humidity(r)]
+    calculations.fill_dew_points(missing)
+
+    if missing:
+        session.save_changes()
+
+    return batch, len(missing), len(invalid)
+
+
+async def main(batch_size: int):
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    await raven_db.init()
+
+    after, seen = load_checkpoint()
+    if after is not None:
+        logger.info("Setze fort ab %s", after.isoformat())
+
+    total_read = total_updated = total_skipped = 0
+    while True:
+        batch, updated, skipped = await raven_db.run_in_session(
+            functools.partial(backfill_batch, after=after, seen=seen, batch_size=batch_size)
+        )
+        if not batch:
+            break
+
+        total_read += len(batch)
+        total_updated += updated
+        total_skipped += skipped
+        after, seen = advance(batch, after, seen)
+        save_checkpoint(after, seen)
+        logger.info(
+            "%d Messwerte gelesen, %d aktualisiert, %d übersprungen (bis %s)",
+            total_read, total_updated, total_skipped, after.isoformat(),
+        )
+
+    logger.info(
+        "Fertig: %d Messwerte gelesen, %d aktualisiert, %d ungültige übersprungen.",
+        total_read, total_updated, total_skipped,
+    )
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+
+    await raven_db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BATCH_SIZE))
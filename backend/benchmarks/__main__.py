@@ -0,0 +1,255 @@
+"""
+Benchmarks für das Backend.
+
+Aufruf im Ordner backend/:
+
+    python -m benchmarks run [--store fake|raven|sqlite] [--years 1 5 10] [--interval 1800] [--output benchmark.json]
+    python -m benchmarks compare alt.json neu.json [--threshold 0.1]
+
+--store fake (Standard) nutzt einen In-Memory-Speicher und misst nur die Anwendung.
+--store raven nutzt die RavenDB unter RAVEN_ADDRESS mit je einer eigenen Datenbank pro Datensatz,
+deren Namen mit BENCHMARK_RAVEN_DATABASE beginnen. Bereits befüllte Datenbanken werden wiederverwendet.
+--store sqlite nutzt pro Datensatz eine eigene SQLite-Datei in einem temporären Verzeichnis.
+
+compare gibt die Veränderung jeder Metrik aus und endet mit Exit-Code 1, wenn sich eine Metrik um mehr
+als threshold verschlechtert hat.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# Werte, ohne die sich die Anwendung nicht importieren lässt, und die Log-Stufe. Vorhandene Umgebungsvariablen
+# haben Vorrang.
+for name, value in {
+    "FAN_GPIO": "21",
+    "JWT_SECRET": "benchmark",
+    "JWT_ALGO": "HS256",
+    "MEASURE_STATION_AUTHENTICATION": "benchmark",
+    # Nur Warnungen und Fehler der Anwendung (Cronjob, Lüfter, httpx) zwischen den Fortschrittsmeldungen
+    "LOG_LEVEL": "WARNING",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+
+import hardware.check_rpi
+import main
+from benchmarks import suite
+from benchmarks.fake_store import FakeStore
+from dependencies import cache, indexes, raven_db, sqlite_db, storage
+from dependencies.models import Reading, Settings, State, Station
+
+# Endungen der Metriken: kleiner ist besser bzw. größer ist besser. Andere Metriken werden nur angezeigt.
+LOWER_IS_BETTER = ("_ms", "_mb")
+HIGHER_IS_BETTER = ("_per_s",)
+
+SETTINGS = Settings(
+    dht22_indoor_address="http://indoor.benchmark/get/",
+    dht22_outdoor_address="http://outdoor.benchmark/get/",
+    data_cron="*/30 * * * *",
+    fan_override_duration=0,
+)
+
+
+def _log(*args):
+    print(*args, file=sys.stderr, flush=True)
+
+
+def _registry(count: int) -> list[Station]:
+    return [
+        Station(
+            name=f"station-{i}",
+            address=f"http://station-{i}.benchmark/get/",
+            zone=f"zone-{i // 2}",
+            location="indoor" if i % 2 == 0 else "outdoor",
+        )
+        for i in range(count)
+    ]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _use_store(args, name: str, readings: list[Reading], station_count: int):
+    """Setzt einen leeren Cache und einen mit readings befüllten Speicher auf."""
+    cache.latest = cache.LatestCache()
+    initial_state = State(timestamp=datetime.now(tz=timezone.utc), fan_running=False, fan_override=None)
+
+    if args.store == "fake":
+        store = FakeStore(SETTINGS, _registry(station_count))
+        store.install()
+        store.add_readings(readings)
+        await storage.store_object(initial_state)
+        return
+
+    if args.store == "sqlite":
+        await sqlite_db.close()
+        os.environ["SQLITE_PATH"] = os.path.join(args.sqlite_dir, f"{name}.sqlite3")
+        storage.use(sqlite_db)
+    else:
+        if getattr(raven_db, "store", None) is not None:
+            await raven_db.close()
+        os.environ["RAVEN_DATABASE"] = f"{os.environ['BENCHMARK_RAVEN_DATABASE']}_{name}"
+        storage.use(raven_db)
+
+    await storage.init()
+    await storage.save_settings(SETTINGS.model_copy())
+    for station in _registry(station_count):
+        await storage.save_station(station)
+
+    _, stored = await storage.get_readings_version(datetime.min, datetime.max)
+    if stored < len(readings):
+        _log(f"  befülle {name} mit {len(readings)} Messwerten")
+        await storage.bulk_store(readings)
+    if args.store == "raven":
+        await raven_db.run_in_session(lambda session: list(
+            session.query_index_type(indexes.Readings_ByTimestamp, Reading)
+            .wait_for_non_stale_results(timedelta(minutes=30))
+            .take(1)
+        ))
+
+
+async def run(args) -> dict:
+    # Ohne Raspberry Pi legt /readings/history/ bei jedem Aufruf einen Zufallsmesswert an
+    hardware.check_rpi.is_raspberrypi = lambda: True
+
+    results: list[dict] = []
+    end = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    _log("Taupunkte")
+    results += suite.dew_point_throughput(args.dew_point_size, args.repeat)
+
+    _log("WebSocket")
+    results += await suite.websocket_fanout(args.ws_clients, args.ws_events)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for years in args.years:
+            for interval in args.interval:
+                dataset = f"{years:g}y_{interval}s"
+                _log(f"Verlauf {dataset}")
+                readings = suite.synthetic_readings(end, years, interval, args.seed)
+                await _use_store(args, dataset, readings, args.stations)
+                results += await suite.history_latency(client, dataset, end, timedelta(days=365 * years), args.repeat)
+
+        _log("Import")
+        await _use_store(args, "ingest", [], args.stations)
+        results += await suite.ingest_throughput(client, args.ingest_rows, args.seed)
+
+    _log("Cronjob")
+    await _use_store(args, "cron", [], args.stations)
+    results += await suite.cron_cycle(main.get_data_cron, args.stations, args.station_latency / 1000, args.repeat)
+
+    if args.store != "fake":
+        await storage.close()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "store": args.store,
+            "args": {k: v for k, v in vars(args).items() if k not in ("command", "sqlite_dir")},
+        },
+        "results": results,
+    }
+
+
+def _key(result: dict) -> str:
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    """
+    Vergleicht zwei Ergebnisdateien Metrik für Metrik.
+
+    :return: Anzahl der Verschlechterungen um mehr als threshold (relativ)
+    """
+    old_results = {_key(r): r for r in old["results"]}
+    regressions = 0
+    print(f"alt: {old['meta'].get('commit')}  neu: {new['meta'].get('commit')}")
+
+    for result in new["results"]:
+        previous = old_results.get(_key(result))
+        if previous is None:
+            continue
+        params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+        print(f"{result['name']} ({params})")
+
+        for metric, value in result["metrics"].items():
+            before = previous["metrics"].get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or before == 0:
+                continue
+            change = (value - before) / before
+            if metric.endswith(LOWER_IS_BETTER):
+                worse = change > threshold
+            elif metric.endswith(HIGHER_IS_BETTER):
+                worse = -change > threshold
+            else:
+                worse = False
+            regressions += worse
+            print(f"  {metric:<24} {before:>12g} -> {value:>12g}  {change:+7.1%}{'  VERSCHLECHTERT' if worse else ''}")
+
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmarks ausführen")
+    run_parser.add_argument("--store", choices=["fake", "raven", "sqlite"], default="fake")
+    run_parser.add_argument("--years", type=float, nargs="+", default=[1, 5, 10], help="Länge der Datensätze in Jahren")
+    run_parser.add_argument("--interval", type=int, nargs="+", default=[1800], help="Sekunden zwischen zwei Messwerten")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Wiederholungen pro Messung")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--dew-point-size", type=int, default=1_000_000)
+    run_parser.add_argument("--ingest-rows", type=int, default=10_000)
+    run_parser.add_argument("--stations", type=int, default=20, help="Registrierte Stationen im Cronjob")
+    run_parser.add_argument("--station-latency", type=float, default=50, help="Antwortzeit der Stationen in ms")
+    run_parser.add_argument("--ws-clients", type=int, default=100)
+    run_parser.add_argument("--ws-events", type=int, default=50)
+    run_parser.add_argument("--output", default="benchmark.json")
+
+    compare_parser = commands.add_parser("compare", help="Zwei Ergebnisdateien vergleichen")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Erlaubte Verschlechterung (0.1 = 10 %%)")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.old) as f_old, open(args.new) as f_new:
+            regressions = compare(json.load(f_old), json.load(f_new), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    if args.store == "raven" and not os.getenv("BENCHMARK_RAVEN_DATABASE"):
+        parser.error("--store raven benötigt BENCHMARK_RAVEN_DATABASE")
+
+    with tempfile.TemporaryDirectory() as sqlite_dir:
+        args.sqlite_dir = sqlite_dir
+        report = asyncio.run(run(args))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    _log(f"{len(report['results'])} Ergebnisse in {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,100 @@
+"""
+In-Memory-Backend für dependencies.storage.
+
+Bildet die Funktionen nach, die Routen und Cronjobs in den Benchmarks aufrufen, damit die Benchmarks
+ohne RavenDB laufen. Gemessen wird dann nur der Anteil der Anwendung (Serialisierung, Berechnungen,
+Routing), nicht die Datenbank. Stunden- und Tageswerte (Verdichtung) gibt es hier nicht.
+"""
+import bisect
+from datetime import datetime
+from typing import AsyncIterator
+
+from dependencies import cache, storage
+from dependencies.models import Reading, Settings, State, Station, ZoneState, StationReading
+from dependencies.timestamps import naive_utc
+
+
+class FakeStore:
+    def __init__(self, settings: Settings, stations: list[Station] | None = None):
+        self.settings = settings
+        self.stations = stations or []
+        self.readings: list[Reading] = []
+        self._timestamps: list[datetime] = []
+        self.states: list[State] = []
+        self.other: list = []
+
+    def install(self):
+        storage.use(self)
+
+    def add_readings(self, readings: list[Reading]):
+        """Fügt Messwerte ohne Cache-Aktualisierung hinzu, zum Befüllen vor der Messung."""
+        for reading in readings:
+            timestamp = naive_utc(reading.timestamp)
+            index = bisect.bisect_right(self._timestamps, timestamp)
+            self._timestamps.insert(index, timestamp)
+            self.readings.insert(index, reading)
+        if self.readings:
+            cache.latest.update(self.readings[-1])
+
+    def _range(self, start: datetime, end: datetime) -> tuple[int, int]:
+        return (
+            bisect.bisect_left(self._timestamps, naive_utc(start)),
+            bisect.bisect_right(self._timestamps, naive_utc(end)),
+        )
+
+    async def init(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def get_settings(self) -> list[Settings]:
+        return [self.settings]
+
+    async def get_state(self) -> State | None:
+        return cache.latest.get_state()
+
+    async def get_latest_reading(self) -> Reading | None:
+        return cache.latest.get_reading()
+
+    async def get_readings(self, start: datetime, end: datetime) -> list[Reading]:
+        first, last = self._range(start, end)
+        return self.readings[first:last]
+
+    async def get_readings_version(self, start: datetime, end: datetime) -> tuple[datetime | None, int]:
+        first, last = self._range(start, end)
+        return (self._timestamps[last - 1] if last > first else None), last - first
+
+    async def get_history(self, start: datetime, end: datetime) -> list[Reading]:
+        return await self.get_readings(start, end)
+
+    async def stream_readings(self, start: datetime, end: datetime, chunk_size: int = 500) -> AsyncIterator[list[Reading]]:
+        first, last = self._range(start, end)
+        for offset in range(first, last, chunk_size):
+            yield self.readings[offset:min(offset + chunk_size, last)]
+
+    async def store_object(self, db_object):
+        if isinstance(db_object, Reading):
+            self.add_readings([db_object])
+        elif isinstance(db_object, State):
+            self.states.append(db_object)
+        elif isinstance(db_object, Settings):
+            self.settings = db_object
+        else:
+            self.other.append(db_object)
+        cache.latest.update(db_object)
+
+    async def bulk_store(self, db_objects: list) -> int:
+        readings = [o for o in db_objects if isinstance(o, Reading)]
+        self.add_readings(readings)
+        self.other.extend(o for o in db_objects if not isinstance(o, Reading))
+        for db_object in db_objects:
+            if isinstance(db_object, (State, ZoneState, StationReading)):
+                cache.latest.update(db_object)
+        return len(db_objects)
+
+    async def get_stations(self) -> list[Station]:
+        return list(self.stations)
+
+    async def get_zone_states(self) -> list[ZoneState]:
+        return sorted(cache.latest.zones.values(), key=lambda z: z.zone)
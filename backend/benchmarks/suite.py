@@ -0,0 +1,244 @@
+"""
+Die einzelnen Benchmarks. Jeder liefert eine Liste von Ergebnissen {"name", "params", "metrics"}.
+
+Metriken mit der Endung _ms oder _mb sind besser, je kleiner sie sind, Metriken mit der Endung _per_s
+besser, je größer sie sind (siehe benchmarks.__main__.compare).
+"""
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import numpy as np
+
+from dependencies import calculations, stations
+from dependencies.app import ConnectionManager
+from dependencies.models import Reading, State
+
+HISTORY_RANGES = {"day": timedelta(days=1), "week": timedelta(days=7), "month": timedelta(days=30), "year": timedelta(days=365)}
+HISTORY_FORMATS = ["json", "columnar", "msgpack"]
+
+
+def synthetic_readings(end: datetime, years: float, interval: int, seed: int) -> list[Reading]:
+    """
+    Messwerte im Abstand von interval Sekunden über years Jahre bis end, mit Tages- und Jahresgang
+    und Rauschen. Derselbe seed ergibt dieselben Werte.
+    """
+    rng = np.random.default_rng(seed)
+    count = int(years * 365 * 24 * 3600 / interval)
+    seconds = np.arange(count, dtype=np.float64) * interval
+    start = end - timedelta(seconds=float(seconds[-1])) if count else end
+
+    day = np.sin(2 * np.pi * seconds / 86400)
+    season = np.sin(2 * np.pi * seconds / (365 * 86400))
+    outdoor_temp = 10 + 12 * season + 5 * day + rng.normal(0, 1, count)
+    indoor_temp = 19 + 3 * season + 1.5 * day + rng.normal(0, 0.3, count)
+    outdoor_humidity = np.clip(75 - 15 * day + rng.normal(0, 5, count), 5, 100)
+    indoor_humidity = np.clip(55 + 5 * season + rng.normal(0, 2, count), 5, 100)
+
+    dew_point_indoor = calculations.taupunkt_batch(indoor_temp, indoor_humidity)
+    dew_point_outdoor = calculations.taupunkt_batch(outdoor_temp, outdoor_humidity)
+
+    return [
+        Reading.model_construct(
+            Id=None,
+            timestamp=start + timedelta(seconds=float(seconds[i])),
+            indoor_temp=round(float(indoor_temp[i]), 1),
+            outdoor_temp=round(float(outdoor_temp[i]), 1),
+            indoor_humidity=round(float(indoor_humidity[i]), 1),
+            outdoor_humidity=round(float(outdoor_humidity[i]), 1),
+            dew_point_indoor=float(dew_point_indoor[i]),
+            dew_point_outdoor=float(dew_point_outdoor[i]),
+        )
+        for i in range(count)
+    ]
+
+
+def _latency_metrics(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        "min_ms": round(samples[0] * 1000, 3),
+    }
+
+
+async def _timed(fn, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def _peak_memory_mb(fn) -> float:
+    tracemalloc.start()
+    try:
+        await fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2)
+
+
+def dew_point_throughput(size: int, repeat: int) -> list[dict]:
+    rng = np.random.default_rng(0)
+    temps = rng.uniform(-20, 35, size)
+    humids = rng.uniform(5, 100, size)
+
+    batch = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        calculations.taupunkt_batch(temps, humids)
+        batch.append(time.perf_counter() - started)
+
+    scalar_size = min(size, 100_000)
+    scalar_temps, scalar_humids = temps[:scalar_size].tolist(), humids[:scalar_size].tolist()
+    started = time.perf_counter()
+    for t, h in zip(scalar_temps, scalar_humids):
+        calculations.taupunkt(t, h)
+    scalar = time.perf_counter() - started
+
+    return [
+        {"name": "dew_point.batch", "params": {"size": size}, "metrics": {
+            "values_per_s": round(size / statistics.median(batch)), **_latency_metrics(batch),
+        }},
+        {"name": "dew_point.scalar", "params": {"size": scalar_size}, "metrics": {
+            "values_per_s": round(scalar_size / scalar),
+        }},
+    ]
+
+
+async def history_latency(client: httpx.AsyncClient, dataset: str, end: datetime, span: timedelta, repeat: int) -> list[dict]:
+    results = []
+    for range_name, length in HISTORY_RANGES.items():
+        if length > span:
+            continue
+        params = {"start": (end - length).isoformat(), "end": end.isoformat()}
+
+        for response_format in HISTORY_FORMATS:
+            query = {**params, "format": response_format}
+            first = await client.get("/readings/history/", params=query)
+            first.raise_for_status()
+
+            async def fetch():
+                (await client.get("/readings/history/", params=query)).raise_for_status()
+
+            async def revalidate():
+                response = await client.get("/readings/history/", params=query, headers={"If-None-Match": first.headers["etag"]})
+                assert response.status_code == 304
+
+            results.append({
+                "name": "history.latency",
+                "params": {"dataset": dataset, "range": range_name, "format": response_format},
+                "metrics": {
+                    **_latency_metrics(await _timed(fetch, repeat)),
+                    "peak_mb": await _peak_memory_mb(fetch),
+                    "response_kb": round(len(first.content) / 1024, 1),
+                    "not_modified_median_ms": _latency_metrics(await _timed(revalidate, repeat))["median_ms"],
+                },
+            })
+    return results
+
+
+async def ingest_throughput(client: httpx.AsyncClient, rows: int, seed: int) -> list[dict]:
+    readings = synthetic_readings(datetime(2020, 1, 1, tzinfo=timezone.utc), (rows + 0.5) * 60 / (365 * 24 * 3600), 60, seed)
+    body = "".join(
+        json.dumps({
+            "timestamp": r.timestamp.isoformat(),
+            "indoorTemp": r.indoor_temp,
+            "outdoorTemp": r.outdoor_temp,
+            "indoorHumidity": r.indoor_humidity,
+            "outdoorHumidity": r.outdoor_humidity,
+        }) + "\n"
+        for r in readings
+    ).encode("utf-8")
+
+    started = time.perf_counter()
+    response = await client.post("/insert/batch/", content=body, headers={"Content-Type": "application/x-ndjson"})
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+
+    return [{"name": "ingest.batch", "params": {"rows": len(readings)}, "metrics": {
+        "rows_per_s": round(len(readings) / elapsed),
+        "total_ms": round(elapsed * 1000, 3),
+        "request_kb": round(len(body) / 1024, 1),
+    }}]
+
+
+async def cron_cycle(get_data_cron, station_count: int, station_latency: float, repeat: int) -> list[dict]:
+    """
+    Dauer eines Daten-Cronjobs mit station_count registrierten Stationen. Die Stationen antworten
+    nach station_latency Sekunden mit zufälligen Werten.
+    """
+    rng = np.random.default_rng(1)
+
+    async def fake_poll(address: str) -> dict:
+        await asyncio.sleep(station_latency)
+        return {"temp": float(rng.uniform(0, 30)), "humid": float(rng.uniform(20, 90))}
+
+    original = stations.poll_station
+    stations.poll_station = fake_poll
+    try:
+        samples = await _timed(get_data_cron, repeat)
+    finally:
+        stations.poll_station = original
+
+    return [{"name": "cron.get_data", "params": {"stations": station_count, "station_latency_ms": station_latency * 1000},
+             "metrics": _latency_metrics(samples)}]
+
+
+class _FakeWebSocket:
+    def __init__(self, expected: int, done: asyncio.Event, remaining: list[int]):
+        self.received = 0
+        self.expected = expected
+        self.done = done
+        self.remaining = remaining
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.received += 1
+        if self.received == self.expected:
+            self.remaining[0] -= 1
+            if self.remaining[0] == 0:
+                self.done.set()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def websocket_fanout(clients: int, events: int) -> list[dict]:
+    """Zeit, bis events Lüfterstatus-Ereignisse bei allen clients angekommen sind."""
+    manager = ConnectionManager()
+    done = asyncio.Event()
+    remaining = [clients]
+    sockets = [_FakeWebSocket(events, done, remaining) for _ in range(clients)]
+    for socket in sockets:
+        await manager.connect(socket, last=0)
+
+    state = State(timestamp=datetime.now(tz=timezone.utc), fan_running=True, fan_override=None)
+    started = time.perf_counter()
+    for _ in range(events):
+        await manager.publish_state(state)
+        # Den Writer-Tasks Gelegenheit zum Senden geben, wie zwischen echten Ereignissen
+        await asyncio.sleep(0)
+    try:
+        await asyncio.wait_for(done.wait(), 60)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+
+    for socket in sockets:
+        manager.disconnect(socket)
+
+    return [{"name": "websocket.fanout", "params": {"clients": clients, "events": events}, "metrics": {
+        "messages_per_s": round(clients * events / elapsed),
+        "total_ms": round(elapsed * 1000, 3),
+        "dropped": clients - sum(1 for s in sockets if s.received == events),
+    }}]
@@ -1,17 +1,25 @@
+import asyncio
+import json
+import logging
 import os
+from collections import deque
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import datetime, timezone
 
 from croniter import croniter
 from fastapi import FastAPI, WebSocket
+from pydantic import BaseModel
 from fastapi_crons import Crons, get_cron_router
 
 import dependencies.globals
 import hardware.util
-from dependencies import raven_db
-from dependencies.models import State
+from dependencies import storage, stations, calculations, fan_control
+from dependencies.metrics import WS_DROPPED
+from dependencies.models import State, FanStatus, Reading, ReadingWithDewPoint
+from dependencies.timestamps import as_utc
 from routes import auth
-from routes.auth import User
+
+logger = logging.getLogger(__name__)
 
 
 async def update_get_data_cron():
@@ -22,62 +30,165 @@ async def update_get_data_cron():
     await crons_app.stop()
     await crons_app.start()
 
-async def update_fan_override_cron(state: State):
-    fan_override_job = crons_app.get_job("fan-override")
-
-    if state.fan_override:
-        expression = state.fan_override.strftime('%M %H %d %m %w')
-    else:
-        expression = "* * * * *"
-
-    fan_override_job.expr = expression
-    fan_override_job._cron_iter = croniter(fan_override_job.expr, datetime.now())
-    fan_override_job.update_next_run()
-
 @asynccontextmanager
 async def lifespan(fastapi_app: FastAPI):
-    await raven_db.init()
-    db_settings = await raven_db.get_create_app_settings()
-    print("populating settings")
-    print(db_settings)
-    dependencies.globals.settings = db_settings
+    # nmcli kann mehrere Aufrufe mit je 20s Timeout brauchen, die API soll währenddessen schon antworten
+    hotspot = asyncio.create_task(asyncio.to_thread(hardware.util.start_hotspot))
 
-    hardware.util.start_hotspot()
+    await storage.init()
+    db_settings = await storage.get_create_app_settings()
+    logger.info("Einstellungen geladen: %s", db_settings)
+    dependencies.globals.settings = db_settings
 
+    # Startet auch den Scheduler
     await update_get_data_cron()
-
-    with raven_db.store.open_session() as session:
-        amount_users = session.query(object_type=User).count()
-        if amount_users == 0:
-            await raven_db.add_user(
-                os.environ.get("INIT_ADMIN_USER"),
-                auth.password_hash.hash(os.environ.get("INIT_ADMIN_PASS")),
-                "Default User",
-                "",
-            )
+    # Der Status wird nur bei Änderungen geschrieben und geschaltet, nach einem Neustart muss der Pin ihn erst übernehmen
+    state = await storage.get_state()
+    if state is not None:
+        hardware.util.sync_state(state)
+    fan_control.override_timer.arm(state)
+
+    amount_users = await storage.count_users()
+    if amount_users == 0:
+        await storage.add_user(
+            os.environ.get("INIT_ADMIN_USER"),
+            await auth.get_password_hash(os.environ.get("INIT_ADMIN_PASS")),
+            "Default User",
+            "",
+        )
 
     yield
+    await crons_app.stop()
+    hotspot.cancel()
+    await fan_control.override_timer.close()
+    await stations.close()
+    await storage.close()
     hardware.util.shutdown()
 
 app = FastAPI(lifespan=lifespan)
-crons_app = Crons(app)
+# Ohne app, damit fastapi_crons den Start nicht um 2s für die Registrierung der Jobs verzögert. Die Jobs stehen
+# schon beim Import fest, gestartet und gestoppt wird der Scheduler in lifespan.
+crons_app = Crons()
 app.include_router(get_cron_router(), prefix="/crons")
 
 
+# Nachrichten, die pro Client höchstens auf den Versand warten dürfen. Wer weiter zurückliegt, wird getrennt.
+WS_QUEUE_SIZE = 100
+# Sekunden, die das Senden einer einzelnen Nachricht an einen Client dauern darf
+WS_SEND_TIMEOUT = 5.0
+# Anzahl der letzten Ereignisse, die neu verbundene Clients nachgeliefert bekommen können
+WS_REPLAY_SIZE = 50
+
+
+class _Client:
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.writer: asyncio.Task | None = None
+
+
 class ConnectionManager:
+    """
+    Verwaltet die WebSocket-Clients und verteilt Nachrichten an sie.
+
+    Jeder Client hat eine eigene Warteschlange und einen eigenen Task, der daraus sendet. Ein langsamer
+    oder toter Client hält so niemanden sonst auf. Läuft seine Warteschlange voll oder schlägt das
+    Senden fehl, wird er getrennt.
+
+    Ereignisse (neue Messwerte, neuer Lüfterstatus) werden als {"type", "timestamp", "data"} verschickt
+    und in einem Ringpuffer gehalten, aus dem neu verbundene Clients die letzten Ereignisse nachgeliefert bekommen.
+    """
     def __init__(self):
-        self.active_connections: list[WebSocket] = []
+        self.active_connections: dict[WebSocket, _Client] = {}
+        self._closing: set[asyncio.Task] = set()
+        self.events: deque[tuple[datetime, str]] = deque(maxlen=WS_REPLAY_SIZE)
+
+    async def connect(self, websocket: WebSocket, since: datetime | None = None, last: int | None = None):
+        """
+        Nimmt einen Client an und liefert ihm die gepufferten Ereignisse nach.
 
-    async def connect(self, websocket: WebSocket):
+        :param since: Nur Ereignisse nach diesem Zeitpunkt nachliefern
+        :param last: Nur die letzten n Ereignisse nachliefern (0: keine)
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = _Client(websocket)
+        for message in self.replay(since, last):
+            client.queue.put_nowait(message)
+        client.writer = asyncio.create_task(self._write(client))
+        self.active_connections[websocket] = client
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.active_connections.pop(websocket, None)
+        if client is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def replay(self, since: datetime | None = None, last: int | None = None) -> list[str]:
+        events = list(self.events)
+        if since is not None:
+            since = as_utc(since)
+            events = [event for event in events if event[0] > since]
+        if last is not None:
+            events = events[-last:] if last > 0 else []
+        return [message for _, message in events]
+
+    async def publish(self, event_type: str, data: BaseModel):
+        """Serialisiert ein Ereignis einmal, puffert es und schickt es an alle Clients."""
+        timestamp = datetime.now(tz=timezone.utc)
+        message = json.dumps({
+            "type": event_type,
+            "timestamp": timestamp.isoformat(),
+            "data": data.model_dump(mode="json", by_alias=True),
+        })
+        self.events.append((timestamp, message))
+        await self.broadcast(message)
+
+    async def publish_reading(self, reading: Reading):
+        if not isinstance(reading, ReadingWithDewPoint):
+            reading = calculations.append_dew_points(reading)
+        await self.publish("reading", reading)
+
+    async def publish_state(self, state: State):
+        await self.publish("state", FanStatus(
+            Id=state.Id,
+            running=state.fan_running,
+            updatedAt=state.timestamp,
+            override=state.fan_override,
+        ))
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+        """Reiht eine bereits serialisierte Nachricht bei allen Clients ein, ohne auf den Versand zu warten."""
+        for client in list(self.active_connections.values()):
+            try:
+                client.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                logger.warning("WebSocket-Client kommt nicht hinterher und wird getrennt.")
+                self._drop(client)
+
+    async def _write(self, client: _Client):
+        try:
+            while True:
+                message = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(message), WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("WebSocket-Client wird nach Sendefehler getrennt: %r", e)
+            self._drop(client)
+
+    def _drop(self, client: _Client):
+        WS_DROPPED.inc()
+        self.disconnect(client.websocket)
+        # Schließen im Hintergrund, ein hängender Client soll den Aufrufer nicht blockieren
+        task = asyncio.create_task(self._close(client.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1011), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
 
 
 wsmanager = ConnectionManager()
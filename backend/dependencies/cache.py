@@ -0,0 +1,99 @@
+import os
+import time
+
+from dependencies.models import Reading, State, ZoneState, StationReading
+from dependencies.timestamps import naive_utc
+
+
+class LatestCache:
+    """
+    Hält den aktuellen Lüfterstatus, den neuesten Messwert und die aktuelle Entscheidung pro Zone im Speicher.
+
+    Wird beim Start aus der Datenbank befüllt und von storage.store_object bei jedem Schreiben
+    aktualisiert (write-through). Setzt voraus, dass nur ein Backend-Prozess in die Datenbank schreibt.
+    """
+    def __init__(self):
+        self.state: State | None = None
+        self.reading: Reading | None = None
+        self.zones: dict[str, ZoneState] = {}
+        self.stations: dict[str, StationReading] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_state(self) -> State | None:
+        return self._count(self.state)
+
+    def get_reading(self) -> Reading | None:
+        return self._count(self.reading)
+
+    def update(self, db_object):
+        if isinstance(db_object, State):
+            if self.state is None or naive_utc(db_object.timestamp) >= naive_utc(self.state.timestamp):
+                self.state = db_object
+        elif isinstance(db_object, Reading):
+            if self.reading is None or naive_utc(db_object.timestamp) >= naive_utc(self.reading.timestamp):
+                self.reading = db_object
+        elif isinstance(db_object, ZoneState):
+            current = self.zones.get(db_object.zone)
+            if current is None or naive_utc(db_object.timestamp) >= naive_utc(current.timestamp):
+                self.zones[db_object.zone] = db_object
+        elif isinstance(db_object, StationReading):
+            current = self.stations.get(db_object.station)
+            if current is None or naive_utc(db_object.timestamp) >= naive_utc(current.timestamp):
+                self.stations[db_object.station] = db_object
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / total, 4) if total else None,
+            "stateCached": self.state is not None,
+            "readingCached": self.reading is not None,
+        }
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+
+class TTLCache:
+    """
+    Einfacher Cache, dessen Einträge nach ttl Sekunden verfallen.
+
+    Wird für angemeldete Benutzer genutzt (Schlüssel: Benutzername aus dem Token). storage.store_object
+    entfernt einen Benutzer beim Speichern, damit Änderungen wie disabled sofort greifen.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, object]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key: str | None = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+latest = LatestCache()
+users = TTLCache(float(os.getenv("AUTH_USER_CACHE_TTL", "60")))
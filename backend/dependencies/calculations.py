@@ -1,6 +1,15 @@
+import logging
 import math
+import os
 
-from dependencies.models import Reading, ReadingWithDewPoint
+import numpy as np
+
+from dependencies.models import Reading, ReadingWithDewPoint, StationReading
+
+logger = logging.getLogger(__name__)
+
+# Breite des Bands (K) um gleiche Taupunkte, in dem der Lüfter seinen bisherigen Zustand beibehält
+FAN_HYSTERESIS = float(os.getenv("FAN_HYSTERESIS", "1.0"))
 
 
 # https://www.wetterochs.de/wetter/feuchte.html
@@ -27,7 +36,7 @@ def v(temp, humid):
     try:
         return math.log10(dampfdruck(temp, humid) / 6.1078)
     except ValueError:
-        print(temp, humid)
+        logger.debug("Taupunkt nicht berechenbar: temp=%s humid=%s", temp, humid)
         raise ValueError
 
 def taupunkt(temp, humid) -> float:
@@ -35,13 +44,128 @@ def taupunkt(temp, humid) -> float:
     res = b*v(temp, humid) / (a-v(temp, humid))
     return round(res, 2)
 
+def taupunkt_batch(temps, humids) -> np.ndarray:
+    """
+    Berechnet die Taupunkte für viele Messwerte in einem Durchlauf.
+
+    Nutzt dieselben Magnus-Parameter wie taupunkt() (über/unter 0 °C) und rundet auf zwei Nachkommastellen.
+
+    :param temps: Temperaturen in °C
+    :param humids: Relative Luftfeuchtigkeiten in %
+    :return: Taupunkte in °C
+    """
+    temps = np.asarray(temps, dtype=np.float64)
+    humids = np.asarray(humids, dtype=np.float64)
+
+    if np.any(humids <= 0):
+        raise ValueError("Luftfeuchtigkeit muss größer als 0 sein.")
+
+    frost = temps < 0
+    a = np.where(frost, 7.6, 7.5)
+    b = np.where(frost, 250.7, 237.3)
+
+    # log10(dampfdruck / 6.1078) ohne Umweg über den Sättigungsdampfdruck
+    v_ = np.log10(humids / 100) + (a * temps) / (b + temps)
+
+    return np.round(b * v_ / (a - v_), 2)
+
+def fill_dew_points(data: list[Reading]) -> list[Reading]:
+    """
+    Berechnet die Taupunkte für alle Messwerte, bei denen sie noch nicht gespeichert sind.
+
+    Die Messwerte werden direkt verändert.
+    """
+    missing = [r for r in data if r.dew_point_indoor is None or r.dew_point_outdoor is None]
+    if not missing:
+        return data
+
+    indoor = taupunkt_batch(
+        [r.indoor_temp for r in missing],
+        [r.indoor_humidity for r in missing],
+    ).tolist()
+    outdoor = taupunkt_batch(
+        [r.outdoor_temp for r in missing],
+        [r.outdoor_humidity for r in missing],
+    ).tolist()
+
+    for r, dp_in, dp_out in zip(missing, indoor, outdoor):
+        r.dew_point_indoor = dp_in
+        r.dew_point_outdoor = dp_out
+
+    return data
+
+def append_dew_points_batch(data: list[Reading]) -> list[dict]:
+    """
+    Ergänzt eine Liste von Messwerten um die Taupunkte.
+
+    Gespeicherte Taupunkte werden übernommen, nur fehlende werden berechnet.
+
+    :return: JSON-fähige Dicts im Format von ReadingWithDewPoint (mit Aliasen)
+    """
+    fill_dew_points(data)
+
+    return [
+        {
+            "Id": r.Id,
+            "timestamp": r.timestamp.isoformat(),
+            "indoorTemp": r.indoor_temp,
+            "outdoorTemp": r.outdoor_temp,
+            "indoorHumidity": r.indoor_humidity,
+            "outdoorHumidity": r.outdoor_humidity,
+            "dewPointIndoor": r.dew_point_indoor,
+            "dewPointOutdoor": r.dew_point_outdoor,
+        }
+        for r in data
+    ]
+
+def with_dew_points(data: Reading) -> Reading:
+    """Setzt die Taupunkte eines Messwerts, damit sie mit ihm gespeichert werden."""
+    data.dew_point_indoor = taupunkt(data.indoor_temp, data.indoor_humidity)
+    data.dew_point_outdoor = taupunkt(data.outdoor_temp, data.outdoor_humidity)
+    return data
+
 def append_dew_points(data: Reading) -> ReadingWithDewPoint:
-    reading_with_dewpoint = ReadingWithDewPoint(
-        dew_point_indoor=taupunkt(data.indoor_temp, data.indoor_humidity),
-        dew_point_outdoor=taupunkt(data.outdoor_temp, data.outdoor_humidity),
-        **data.__dict__,
-    )
-    return reading_with_dewpoint
-
-def should_fan_run(indoor_taupunkt, outdoor_taupunkt):
-    return indoor_taupunkt > outdoor_taupunkt
+    if data.dew_point_indoor is None or data.dew_point_outdoor is None:
+        with_dew_points(data)
+
+    return ReadingWithDewPoint(**data.__dict__)
+
+def should_fan_run(indoor_taupunkt, outdoor_taupunkt, running: bool | None = None, hysteresis: float = FAN_HYSTERESIS):
+    """
+    Lüfter an, wenn der Taupunkt innen über dem außen liegt.
+
+    Ist der bisherige Zustand bekannt, schaltet der Lüfter erst ein, wenn innen um mehr als hysteresis/2 über
+    außen liegt, und erst aus, wenn innen um mehr als hysteresis/2 darunter liegt. Dazwischen bleibt er wie er ist.
+    """
+    difference = indoor_taupunkt - outdoor_taupunkt
+    if running is None:
+        return difference > 0
+    if running:
+        return difference > -hysteresis / 2
+    return difference > hysteresis / 2
+
+def zone_dew_points(readings: list[StationReading]) -> dict[str, tuple[float, float]]:
+    """
+    Mittlere Taupunkte pro Zone aus den Messwerten der registrierten Stationen, für die Lüfterentscheidung.
+
+    Verglichen wird der mittlere Taupunkt der Innenstationen einer Zone mit dem der Außenstationen
+    derselben Zone. Hat eine Zone keine Außenstation, werden alle Außenstationen herangezogen.
+
+    :return: Zone -> (Taupunkt innen, Taupunkt außen); Zonen ohne Innen- oder Außenwert fehlen
+    """
+    indoor: dict[str, list[float]] = {}
+    outdoor: dict[str, list[float]] = {}
+    for r in readings:
+        target = indoor if r.location == "indoor" else outdoor
+        target.setdefault(r.zone, []).append(r.dew_point)
+
+    all_outdoor = [dp for values in outdoor.values() for dp in values]
+
+    dew_points = {}
+    for zone, values in indoor.items():
+        reference = outdoor.get(zone) or all_outdoor
+        if not reference:
+            continue
+        dew_points[zone] = (round(sum(values) / len(values), 2), round(sum(reference) / len(reference), 2))
+
+    return dew_points
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: wählt threshold Punkte aus, die den Verlauf von y möglichst gut erhalten.
+
+    Erster und letzter Punkt bleiben immer erhalten.
+
+    :param x: Streng monoton steigende x-Werte (z.B. Zeitstempel in Sekunden)
+    :param y: y-Werte
+    :param threshold: Anzahl der Punkte im Ergebnis
+    :return: Sortierte Indizes der ausgewählten Punkte
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
+
+
+def lttb_multi(x: np.ndarray, series: list[np.ndarray], threshold: int) -> np.ndarray:
+    """
+    LTTB für mehrere Messreihen mit gemeinsamer x-Achse.
+
+    Jede Messreihe bekommt einen gleich großen Anteil von threshold, das Ergebnis ist die Vereinigung
+    der ausgewählten Punkte. So bleiben Spitzen in allen Reihen erhalten. Reicht threshold nicht für
+    3 Punkte pro Reihe, wählt LTTB die Punkte aus dem Mittel der auf 0 bis 1 skalierten Reihen.
+
+    :return: Sortierte Indizes, höchstens threshold viele
+    """
+    if threshold >= len(x) or not series:
+        return np.arange(len(x))
+
+    per_series = threshold // len(series)
+    if per_series < 3:
+        return lttb_indices(x, _scaled_mean(series), threshold)
+
+    selected = [lttb_indices(x, y, per_series) for y in series]
+    return np.unique(np.concatenate(selected))
+
+
+def _scaled_mean(series: list[np.ndarray]) -> np.ndarray:
+    stacked = np.vstack(series)
+    low = stacked.min(axis=1, keepdims=True)
+    span = np.ptp(stacked, axis=1, keepdims=True)
+    return ((stacked - low) / np.where(span > 0, span, 1)).mean(axis=0)
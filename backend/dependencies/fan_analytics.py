@@ -0,0 +1,92 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Literal
+
+from dependencies.models import FanAnalytics, FanDay, State
+from dependencies.timestamps import naive_utc
+
+# Leistungsaufnahme des Lüfters für die Verbrauchsschätzung
+FAN_POWER_WATTS = float(os.getenv("FAN_POWER_WATTS", "25"))
+
+
+def fan_day_id(day: date) -> str:
+    return f"FanDays/{day.isoformat()}"
+
+
+def _split_by_day(start: datetime, end: datetime) -> list[tuple[date, float]]:
+    """Teilt den Zeitraum an Mitternacht (UTC). :return: (Tag, Sekunden) pro berührtem Tag"""
+    parts = []
+    while start < end:
+        next_day = datetime.combine(start.date() + timedelta(days=1), datetime.min.time())
+        part_end = min(end, next_day)
+        parts.append((start.date(), (part_end - start).total_seconds()))
+        start = part_end
+    return parts
+
+
+def affected_days(previous: State | None, until: datetime) -> list[date]:
+    """Tage, deren FanDay-Dokumente add_interval bzw. apply_state verändert."""
+    if previous is None:
+        return [naive_utc(until).date()]
+    days = [day for day, _ in _split_by_day(naive_utc(previous.timestamp), naive_utc(until))]
+    return days or [naive_utc(until).date()]
+
+
+def add_interval(days: dict[date, FanDay], state: State, until: datetime):
+    """Rechnet die Zeit von state.timestamp bis until dem Status state zu."""
+    for day, seconds in _split_by_day(naive_utc(state.timestamp), naive_utc(until)):
+        fan_day = days.setdefault(day, FanDay(Id=fan_day_id(day), day=day.isoformat()))
+        fan_day.tracked_seconds += seconds
+        if state.fan_running:
+            fan_day.runtime_seconds += seconds
+
+    # Der Override gilt nur bis zu seinem Ablauf, auch wenn der nächste Status erst später kommt
+    if state.fan_override is not None:
+        override_end = min(naive_utc(until), naive_utc(state.fan_override))
+        for day, seconds in _split_by_day(naive_utc(state.timestamp), override_end):
+            days[day].override_seconds += seconds
+
+
+def apply_state(days: dict[date, FanDay], previous: State | None, new: State):
+    """
+    Schreibt die Tageswerte beim Speichern eines neuen Lüfterstatus fort.
+
+    Die Zeit seit dem vorherigen Status wird diesem zugerechnet, ein Wechsel zählt am Tag des neuen Status.
+
+    :param days: Tag -> vorhandenes Dokument, fehlende Tage werden ergänzt
+    """
+    if previous is None:
+        return
+    add_interval(days, previous, new.timestamp)
+
+    if previous.fan_running != new.fan_running and naive_utc(new.timestamp) >= naive_utc(previous.timestamp):
+        day = naive_utc(new.timestamp).date()
+        fan_day = days.setdefault(day, FanDay(Id=fan_day_id(day), day=day.isoformat()))
+        fan_day.switches += 1
+
+
+def summarize(fan_days: list[FanDay], period: Literal["day", "week"]) -> list[FanAnalytics]:
+    """Fasst die Tageswerte pro Tag bzw. Woche zusammen."""
+    groups: dict[date, list[FanDay]] = {}
+    for fan_day in fan_days:
+        day = date.fromisoformat(fan_day.day)
+        start = day if period == "day" else day - timedelta(days=day.weekday())
+        groups.setdefault(start, []).append(fan_day)
+
+    result = []
+    for start, group in sorted(groups.items()):
+        tracked = sum(d.tracked_seconds for d in group)
+        runtime = sum(d.runtime_seconds for d in group)
+        override = sum(d.override_seconds for d in group)
+        result.append(FanAnalytics(
+            period=period,
+            start=start,
+            tracked_seconds=round(tracked),
+            runtime_seconds=round(runtime),
+            override_seconds=round(override),
+            switches=sum(d.switches for d in group),
+            duty_cycle=round(runtime / tracked, 4) if tracked else None,
+            override_share=round(override / tracked, 4) if tracked else None,
+            energy_wh=round(runtime / 3600 * FAN_POWER_WATTS, 1),
+        ))
+    return result
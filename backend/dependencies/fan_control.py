@@ -0,0 +1,133 @@
+"""
+Automatische Lüftersteuerung.
+
+Damit der Lüfter bei fast gleichen Taupunkten nicht ständig schaltet, gilt eine Hysterese
+(FAN_HYSTERESIS, siehe calculations.should_fan_run) und eine Mindestdauer zwischen zwei
+automatischen Schaltvorgängen (FAN_MIN_SWITCH_SECONDS). Ein neuer Status entsteht nur,
+wenn sich der Lüfter tatsächlich umschaltet oder ein Override aufgehoben wird. Dasselbe gilt
+für die Entscheidungen pro Zone.
+
+Das Ende eines Overrides überwacht override_timer mit einem einzelnen asyncio-Timer.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from dependencies import calculations
+from dependencies.models import State, ZoneState
+from dependencies.timestamps import naive_utc
+
+logger = logging.getLogger(__name__)
+
+# Mindestdauer, die der Lüfter an bzw. aus bleibt, bevor die Automatik wieder umschaltet
+FAN_MIN_SWITCH_SECONDS = float(os.getenv("FAN_MIN_SWITCH_SECONDS", "600"))
+
+
+def override_active(state: State | None, now: datetime) -> bool:
+    return state is not None and state.fan_override is not None and naive_utc(state.fan_override) > naive_utc(now)
+
+
+def _switch(running: bool, since: datetime, dew_point_indoor: float, dew_point_outdoor: float, now: datetime) -> bool:
+    """Neuer Zustand mit Hysterese; vor Ablauf der Mindestdauer seit since bleibt es bei running."""
+    run_fan = calculations.should_fan_run(dew_point_indoor, dew_point_outdoor, running)
+    if run_fan != running and naive_utc(now) - naive_utc(since) < timedelta(seconds=FAN_MIN_SWITCH_SECONDS):
+        return running
+    return run_fan
+
+
+def next_state(current: State | None, dew_point_indoor: float, dew_point_outdoor: float, now: datetime) -> State | None:
+    """
+    Neuer Lüfterstatus aus den Taupunkten.
+
+    Die Mindestdauer wird ab current.timestamp gerechnet, da ein Status nur bei einer Änderung geschrieben wird.
+    Ein manuell gesetzter Override wird aufgehoben, auch wenn der Lüfter dabei nicht umschaltet.
+
+    :return: None, wenn sich am Status nichts ändert
+    """
+    if current is None:
+        run_fan = calculations.should_fan_run(dew_point_indoor, dew_point_outdoor)
+        return State(timestamp=now, fan_running=run_fan, fan_override=None)
+
+    run_fan = _switch(current.fan_running, current.timestamp, dew_point_indoor, dew_point_outdoor, now)
+    if run_fan == current.fan_running and current.fan_override is None:
+        return None
+    return State(timestamp=now, fan_running=run_fan, fan_override=None)
+
+
+def next_zone_state(
+    current: ZoneState | None, zone: str, dew_point_indoor: float, dew_point_outdoor: float, now: datetime,
+) -> ZoneState | None:
+    """
+    Neue Entscheidung für eine Zone, nach denselben Regeln wie next_state (Zonen haben keinen Override).
+
+    :return: None, wenn die Zone nicht umschaltet
+    """
+    if current is None:
+        run_fan = calculations.should_fan_run(dew_point_indoor, dew_point_outdoor)
+    else:
+        run_fan = _switch(current.fan_running, current.timestamp, dew_point_indoor, dew_point_outdoor, now)
+        if run_fan == current.fan_running:
+            return None
+
+    return ZoneState(
+        zone=zone, timestamp=now, fan_running=run_fan,
+        dew_point_indoor=dew_point_indoor, dew_point_outdoor=dew_point_outdoor,
+    )
+
+
+class OverrideTimer:
+    """
+    Ruft on_expiry genau zum Ende des Overrides des aktuellen Lüfterstatus auf.
+
+    arm() wird mit jedem neuen Status aufgerufen und ersetzt den bisherigen Timer; ohne Override bleibt
+    keiner gesetzt. Beim Start wird der Timer aus dem gespeicherten Status wiederhergestellt. Geht ein
+    Ablauf trotzdem verloren (z.B. Zeitsprung der Systemuhr), hebt der nächste Daten-Cronjob den
+    abgelaufenen Override auf.
+    """
+    def __init__(self):
+        self.on_expiry: Callable[[], Awaitable] | None = None
+        self.expires: datetime | None = None
+        self._handle: asyncio.TimerHandle | None = None
+        self._running: asyncio.Task | None = None
+
+    def arm(self, state: State | None):
+        self.cancel()
+        if state is None or state.fan_override is None:
+            return
+
+        now = datetime.now(tz=timezone.utc)
+        delay = max((naive_utc(state.fan_override) - naive_utc(now)).total_seconds(), 0)
+        self.expires = state.fan_override
+        self._handle = asyncio.get_running_loop().call_later(delay, self._fire)
+        logger.debug("Override endet in %.0fs", delay)
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = None
+        self.expires = None
+
+    async def close(self):
+        self.cancel()
+        if self._running is not None:
+            self._running.cancel()
+
+    def _fire(self):
+        self._handle = None
+        self.expires = None
+        if self.on_expiry is not None:
+            self._running = asyncio.create_task(self._expire())
+
+    async def _expire(self):
+        try:
+            await self.on_expiry()
+        except Exception:
+            logger.exception("Ende des Overrides konnte nicht verarbeitet werden")
+        finally:
+            if self._running is asyncio.current_task():
+                self._running = None
+
+
+override_timer = OverrideTimer()
@@ -0,0 +1,66 @@
+from datetime import timezone
+from typing import Literal
+
+import msgpack
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from dependencies import calculations
+from dependencies.models import Reading
+
+HistoryFormat = Literal["json", "columnar", "msgpack"]
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+COLUMNAR_MEDIA_TYPE = "application/vnd.bbs2.columnar+json"
+
+# Attribut im Messwert -> Schlüssel der Spalte
+COLUMNS = {
+    "indoor_temp": "indoorTemp",
+    "outdoor_temp": "outdoorTemp",
+    "indoor_humidity": "indoorHumidity",
+    "outdoor_humidity": "outdoorHumidity",
+    "dew_point_indoor": "dewPointIndoor",
+    "dew_point_outdoor": "dewPointOutdoor",
+}
+
+
+def to_columns(data: list[Reading]) -> dict[str, list]:
+    """
+    Wandelt Messwerte in ein spaltenweises Format um: ein Array mit Zeitstempeln (Unix-Sekunden)
+    und ein Array pro Messreihe, jeweils in derselben Reihenfolge.
+    """
+    calculations.fill_dew_points(data)
+
+    columns: dict[str, list] = {
+        "timestamp": [
+            int((r.timestamp if r.timestamp.tzinfo else r.timestamp.replace(tzinfo=timezone.utc)).timestamp())
+            for r in data
+        ],
+    }
+    for field, key in COLUMNS.items():
+        columns[key] = [getattr(r, field) for r in data]
+
+    return columns
+
+
+def negotiate(request: Request, requested: HistoryFormat | None) -> HistoryFormat:
+    """Bestimmt das Antwortformat aus dem format-Parameter oder, falls nicht gesetzt, aus dem Accept-Header."""
+    if requested is not None:
+        return requested
+
+    accept = request.headers.get("accept", "")
+    if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        return "msgpack"
+    if COLUMNAR_MEDIA_TYPE in accept:
+        return "columnar"
+    return "json"
+
+
+def render_readings(data: list[Reading], response_format: HistoryFormat) -> Response:
+    if response_format == "msgpack":
+        return Response(msgpack.packb(to_columns(data)), media_type=MSGPACK_MEDIA_TYPES[0])
+    if response_format == "columnar":
+        return JSONResponse(to_columns(data), media_type=COLUMNAR_MEDIA_TYPE)
+
+    # Bereits fertig serialisiert, daher an der erneuten Validierung durch FastAPI vorbei
+    return JSONResponse(calculations.append_dew_points_batch(data))
@@ -0,0 +1,72 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from dependencies.timestamps import as_utc
+
+# Zeiträume, die mindestens so lange zurückliegen, gelten als abgeschlossen
+CLOSED_RANGE_AFTER = timedelta(hours=1)
+# Abgeschlossene Zeiträume ändern sich nur noch durch nachgereichte Messwerte oder die nächtliche Verdichtung
+CLOSED_RANGE_MAX_AGE = 24 * 3600
+# Zeiträume bis "jetzt" (z.B. /history/delta/ ohne end) bekommen laufend neue Messwerte
+OPEN_RANGE_MAX_AGE = 60
+
+
+def etag(*parts) -> str:
+    """Starker Validator aus allen Werten, von denen der Inhalt der Antwort abhängt."""
+    digest = hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def cache_control(end: datetime | None = None, open_range: bool = False) -> str:
+    """
+    :param end: Ende des abgefragten Zeitraums, None für den aktuellen Messwert
+    :param open_range: Der Zeitraum reicht bis zum Zeitpunkt der Anfrage und verschiebt sich mit ihr
+    """
+    if open_range:
+        return f"private, max-age={OPEN_RANGE_MAX_AGE}"
+    if end is not None and as_utc(end) < datetime.now(tz=timezone.utc) - CLOSED_RANGE_AFTER:
+        return f"public, max-age={CLOSED_RANGE_MAX_AGE}"
+    # Offene Zeiträume bei jedem Aufruf neu prüfen, bei unveränderten Daten reicht dafür ein 304
+    return "no-cache"
+
+
+def _headers(tag: str, last_modified: datetime | None, control: str) -> dict[str, str]:
+    headers = {"ETag": tag, "Cache-Control": control, "Vary": "Accept"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, tag: str, last_modified: datetime | None) -> bool:
+    """
+    Auswertung von If-None-Match bzw., falls nicht gesetzt, If-Modified-Since.
+
+    :param last_modified: None, wenn sich der Inhalt ändern kann, ohne dass ein Zeitstempel steigt. Dann
+        entscheidet nur das ETag.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [c.strip().removeprefix("W/") for c in if_none_match.split(",")]
+        return "*" in candidates or tag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return as_utc(last_modified).replace(microsecond=0) <= as_utc(since)
+
+
+def not_modified(tag: str, last_modified: datetime | None, control: str) -> Response:
+    return Response(status_code=304, headers=_headers(tag, last_modified, control))
+
+
+def set_validators(response: Response, tag: str, last_modified: datetime | None, control: str) -> Response:
+    response.headers.update(_headers(tag, last_modified, control))
+    return response
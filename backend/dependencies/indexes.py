@@ -0,0 +1,156 @@
+from ravendb.documents.indexes.index_creation import IndexCreation
+from ravendb.documents.indexes.abstract_index_creation_tasks import AbstractJavaScriptIndexCreationTask
+
+from dependencies.retention import SERIES, BUCKET_FORMATS
+
+# Fallback für Messwerte, die noch ohne gespeicherte Taupunkte abgelegt wurden (siehe calculations.taupunkt)
+_DEW_POINT_SOURCE = """
+function taupunkt(t, h) {
+    var a = t >= 0 ? 7.5 : 7.6;
+    var b = t >= 0 ? 237.3 : 250.7;
+    var v = Math.log10(h / 100) + (a * t) / (b + t);
+    return Math.round(b * v / (a - v) * 100) / 100;
+}
+"""
+
+
+def _bucket_map(bucket_length: int) -> str:
+    values = {
+        "indoor_temp": "r.indoor_temp",
+        "outdoor_temp": "r.outdoor_temp",
+        "indoor_humidity": "r.indoor_humidity",
+        "outdoor_humidity": "r.outdoor_humidity",
+        "dew_point_indoor": "dpIndoor",
+        "dew_point_outdoor": "dpOutdoor",
+    }
+    fields = ",\n".join(
+        f"        {s}_min: {values[s]}, {s}_max: {values[s]}, {s}_sum: {values[s]}" for s in SERIES
+    )
+    return f"""map('Readings', function (r) {{
+    var dpIndoor = r.dew_point_indoor != null ? r.dew_point_indoor : taupunkt(r.indoor_temp, r.indoor_humidity);
+    var dpOutdoor = r.dew_point_outdoor != null ? r.dew_point_outdoor : taupunkt(r.outdoor_temp, r.outdoor_humidity);
+    return {{
+        bucket: r.timestamp.substring(0, {bucket_length}),
+        count: 1,
+{fields}
+    }};
+}})"""
+
+
+def _bucket_reduce() -> str:
+    fields = ",\n".join(
+        f"        {s}_min: v.reduce((a, x) => Math.min(a, x.{s}_min), Infinity),\n"
+        f"        {s}_max: v.reduce((a, x) => Math.max(a, x.{s}_max), -Infinity),\n"
+        f"        {s}_sum: v.reduce((a, x) => a + x.{s}_sum, 0)"
+        for s in SERIES
+    )
+    return f"""groupBy(x => x.bucket).aggregate(g => {{
+    var v = g.values;
+    return {{
+        bucket: g.key,
+        count: v.reduce((a, x) => a + x.count, 0),
+{fields}
+    }};
+}})"""
+
+
+class _JavaScriptMapReduceIndex(AbstractJavaScriptIndexCreationTask):
+    @property
+    def is_map_reduce(self) -> bool:
+        # Der Client legt reduce bei JavaScript-Indizes nur in der Indexdefinition ab und würde
+        # den Index sonst als reinen Map-Index anlegen.
+        return self.reduce is not None
+
+
+class Readings_ByHour(_JavaScriptMapReduceIndex):
+    """Min, Max und Summe aller Messreihen pro Stunde. Bucket-Schlüssel: YYYY-MM-DDTHH"""
+    def __init__(self):
+        super().__init__()
+        self.additional_sources = {"taupunkt.js": _DEW_POINT_SOURCE}
+        self.maps = [_bucket_map(13)]
+        self.reduce = _bucket_reduce()
+
+
+class Readings_ByDay(_JavaScriptMapReduceIndex):
+    """Min, Max und Summe aller Messreihen pro Tag. Bucket-Schlüssel: YYYY-MM-DD"""
+    def __init__(self):
+        super().__init__()
+        self.additional_sources = {"taupunkt.js": _DEW_POINT_SOURCE}
+        self.maps = [_bucket_map(10)]
+        self.reduce = _bucket_reduce()
+
+
+def _field_map(collection: str, *fields: str) -> str:
+    values = ", ".join(f"{field}: d.{field}" for field in fields)
+    return f"map('{collection}', function (d) {{ return {{ {values} }}; }})"
+
+
+class Readings_ByTimestamp(AbstractJavaScriptIndexCreationTask):
+    """Messwerte nach Zeitstempel, für den neuesten Messwert und Zeitraumabfragen"""
+    def __init__(self):
+        super().__init__()
+        self.maps = [_field_map("Readings", "timestamp")]
+
+
+class States_ByTimestamp(AbstractJavaScriptIndexCreationTask):
+    """Lüfterstatus nach Zeitstempel, für den aktuellen Status"""
+    def __init__(self):
+        super().__init__()
+        self.maps = [_field_map("States", "timestamp")]
+
+
+class Users_ByUsername(AbstractJavaScriptIndexCreationTask):
+    def __init__(self):
+        super().__init__()
+        self.maps = [_field_map("Users", "username")]
+
+
+class Stations_ByName(AbstractJavaScriptIndexCreationTask):
+    def __init__(self):
+        super().__init__()
+        self.maps = [_field_map("Stations", "name")]
+
+
+class StationReadings_ByStationAndTimestamp(AbstractJavaScriptIndexCreationTask):
+    def __init__(self):
+        super().__init__()
+        self.maps = [_field_map("StationReadings", "station", "timestamp")]
+
+
+class ZoneStates_ByZoneAndTimestamp(AbstractJavaScriptIndexCreationTask):
+    def __init__(self):
+        super().__init__()
+        self.maps = [_field_map("ZoneStates", "zone", "timestamp")]
+
+
+class ReadingRollups_ByResolutionAndTimestamp(AbstractJavaScriptIndexCreationTask):
+    def __init__(self):
+        super().__init__()
+        self.maps = [_field_map("ReadingRollups", "resolution", "bucket", "timestamp")]
+
+
+# Indizes für alle Abfragen in raven_db. Sie werden beim Start angelegt, damit der Server keine
+# Auto-Indizes erst bei der ersten Abfrage erzeugen muss.
+QUERY_INDEXES = [
+    Readings_ByTimestamp,
+    States_ByTimestamp,
+    Users_ByUsername,
+    Stations_ByName,
+    StationReadings_ByStationAndTimestamp,
+    ZoneStates_ByZoneAndTimestamp,
+    ReadingRollups_ByResolutionAndTimestamp,
+]
+
+# Auflösung -> (Index, strftime-Format des Bucket-Schlüssels)
+BUCKET_INDEXES = {
+    "hour": (Readings_ByHour, BUCKET_FORMATS["hour"]),
+    "day": (Readings_ByDay, BUCKET_FORMATS["day"]),
+}
+
+
+def deploy(store):
+    """Legt alle Indizes an bzw. aktualisiert sie. Unveränderte Indizes werden vom Server ignoriert."""
+    IndexCreation.create_indexes(
+        [index() for index in QUERY_INDEXES] + [index() for index, _ in BUCKET_INDEXES.values()],
+        store,
+    )
@@ -0,0 +1,105 @@
+"""
+Prometheus-Metriken für /metrics.
+
+Die Messpunkte sitzen dort, wo die Arbeit passiert: Requests (RequestMetricsMiddleware), Datenbank
+(dependencies.storage), Stationsabrufe (dependencies.stations), Cronjobs (instrument_crons),
+WebSocket-Clients (watch_websockets) und Lüfter (hardware.util.sync_state).
+"""
+import time
+from datetime import datetime
+
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Grenzen der Histogramme in Sekunden: schnelle Cache-Treffer bis zu langsamen Verlaufsabfragen
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Cronjobs und Stationsabrufe dauern mit Wiederholungen bis zu POLL_DEADLINE (20s)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Dauer der HTTP-Requests pro Route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+DB_LATENCY = Histogram(
+    "db_operation_duration_seconds", "Dauer der Datenbankzugriffe pro Funktion des Backends",
+    ["backend", "operation"], buckets=LATENCY_BUCKETS,
+)
+STATION_FETCH_LATENCY = Histogram(
+    "station_fetch_duration_seconds", "Dauer eines Stationsabrufs einschließlich Wiederholungen",
+    ["result"], buckets=SLOW_BUCKETS,
+)
+STATION_FETCH_FAILURES = Counter(
+    "station_fetch_failures_total", "Fehlgeschlagene Stationsabrufe pro Adresse", ["address"],
+)
+CRON_DURATION = Histogram(
+    "cron_run_duration_seconds", "Laufzeit der Cronjobs", ["job", "result"], buckets=SLOW_BUCKETS,
+)
+CRON_LAG = Histogram(
+    "cron_run_lag_seconds", "Verspätung des Starts gegenüber dem geplanten Zeitpunkt", ["job"], buckets=LATENCY_BUCKETS,
+)
+WS_CLIENTS = Gauge("websocket_clients", "Verbundene WebSocket-Clients")
+WS_QUEUE_DEPTH = Gauge("websocket_send_queue_messages", "Wartende Nachrichten in den Sendewarteschlangen", ["stat"])
+WS_DROPPED = Counter("websocket_clients_dropped_total", "Wegen voller Warteschlange oder Sendefehler getrennte Clients")
+FAN_SWITCHES = Counter("fan_switches_total", "Wechsel des Lüfters zwischen an und aus")
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI-Middleware für REQUEST_LATENCY.
+
+    Als Label dient die Pfadvorlage der Route (z.B. /stations/{name}/), nicht der konkrete Pfad, damit die
+    Anzahl der Zeitreihen begrenzt bleibt. WebSockets werden nicht gemessen, sie laufen beliebig lange.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status),
+            ).observe(time.perf_counter() - started)
+
+
+def instrument_crons(crons_app):
+    """Misst Laufzeit und Verspätung aller registrierten Cronjobs über die Hooks von fastapi_crons."""
+    async def after_run(job_name: str, context: dict):
+        CRON_DURATION.labels(job_name, "success" if context.get("success") else "error").observe(context["duration"])
+
+    async def before_run(job_name: str, context: dict):
+        # Beide Zeitpunkte sind lokale Zeit ohne Zeitzone aus fastapi_crons
+        lag = datetime.fromisoformat(context["actual_time"]) - datetime.fromisoformat(context["scheduled_time"])
+        CRON_LAG.labels(job_name).observe(max(lag.total_seconds(), 0))
+
+    for job in crons_app.jobs:
+        job.add_before_run_hook(before_run)
+        job.add_after_run_hook(after_run)
+        job.add_on_error_hook(after_run)
+
+
+def watch_websockets(manager):
+    """Liest Anzahl der Clients und Tiefe der Warteschlangen erst beim Abruf von /metrics aus."""
+    def queue_sizes() -> list[int]:
+        return [client.queue.qsize() for client in manager.active_connections.values()]
+
+    WS_CLIENTS.set_function(lambda: len(manager.active_connections))
+    WS_QUEUE_DEPTH.labels("total").set_function(lambda: sum(queue_sizes()))
+    WS_QUEUE_DEPTH.labels("max").set_function(lambda: max(queue_sizes(), default=0))
+
+
+def response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
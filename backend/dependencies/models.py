@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import Optional, Literal
 
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -14,21 +14,159 @@ class Reading(BaseRavenDoc):
     outdoor_temp: float = Field(validation_alias="outdoorTemp", serialization_alias="outdoorTemp")
     indoor_humidity: float = Field(validation_alias="indoorHumidity", serialization_alias="indoorHumidity")
     outdoor_humidity: float = Field(validation_alias="outdoorHumidity", serialization_alias="outdoorHumidity")
+    dew_point_indoor: float | None = Field(None, validation_alias="dewPointIndoor", serialization_alias="dewPointIndoor")
+    dew_point_outdoor: float | None = Field(None, validation_alias="dewPointOutdoor", serialization_alias="dewPointOutdoor")
 
 class ReadingWithDewPoint(Reading):
     dew_point_indoor: float = Field(validation_alias="dewPointIndoor", serialization_alias="dewPointIndoor")
     dew_point_outdoor: float = Field(validation_alias="dewPointOutdoor", serialization_alias="dewPointOutdoor")
 
+class SeriesAggregate(BaseModel):
+    min: float
+    max: float
+    mean: float
+
+class ReadingAggregate(BaseModel):
+    """
+    Zusammengefasste Messwerte eines Zeitabschnitts (Stunde oder Tag)
+
+    Attributes:
+        timestamp (datetime): Beginn des Zeitabschnitts (UTC)
+        count (int): Anzahl der zusammengefassten Messwerte
+    """
+    model_config = ConfigDict(populate_by_name=True)
+    timestamp: datetime
+    count: int
+    indoor_temp: SeriesAggregate = Field(serialization_alias="indoorTemp")
+    outdoor_temp: SeriesAggregate = Field(serialization_alias="outdoorTemp")
+    indoor_humidity: SeriesAggregate = Field(serialization_alias="indoorHumidity")
+    outdoor_humidity: SeriesAggregate = Field(serialization_alias="outdoorHumidity")
+    dew_point_indoor: SeriesAggregate = Field(serialization_alias="dewPointIndoor")
+    dew_point_outdoor: SeriesAggregate = Field(serialization_alias="dewPointOutdoor")
+
+class ReadingRollup(BaseRavenDoc):
+    """
+    Gespeicherte Stunden- oder Tageswerte für Zeiträume, deren einzelne Messwerte schon gelöscht sind
+
+    Attributes:
+        resolution (str): hour oder day
+        bucket (str): Schlüssel des Zeitabschnitts wie in den Map-Reduce-Indizes, z.B. 2024-01-31T13
+        timestamp (datetime): Beginn des Zeitabschnitts (UTC)
+        count (int): Anzahl der zusammengefassten Messwerte
+        values (dict[str, float]): Min, Max und Summe pro Messreihe, Schlüssel wie in den Indizes (z.B. indoor_temp_min)
+    """
+    resolution: Literal["hour", "day"]
+    bucket: str
+    timestamp: datetime
+    count: int
+    values: dict[str, float]
+
+class BatchInsertError(BaseModel):
+    index: int
+    error: str
+
+class BatchInsertResult(BaseModel):
+    """
+    Ergebnis eines Batch-Imports
+
+    Attributes:
+        accepted (int): Anzahl gespeicherter Messwerte
+        rejected (int): Anzahl abgelehnter Messwerte
+        errors (list[BatchInsertError]): Fehler der abgelehnten Messwerte (Position in der Eingabe), höchstens 100
+    """
+    accepted: int
+    rejected: int
+    errors: list[BatchInsertError]
+
 class State(BaseRavenDoc):
     timestamp: datetime
     fan_running: bool
     fan_override: datetime | None
 
+class FanDay(BaseRavenDoc):
+    """
+    Laufzeit des Lüfters an einem Tag (UTC), wird bei jedem neuen Lüfterstatus fortgeschrieben
+
+    Attributes:
+        day (str): YYYY-MM-DD
+        tracked_seconds (float): Sekunden, für die ein Lüfterstatus bekannt ist
+        runtime_seconds (float): Sekunden, in denen der Lüfter lief
+        override_seconds (float): Sekunden mit manuellem Override
+        switches (int): Anzahl der Wechsel zwischen an und aus
+    """
+    day: str
+    tracked_seconds: float = 0
+    runtime_seconds: float = 0
+    override_seconds: float = 0
+    switches: int = 0
+
+class FanAnalytics(BaseModel):
+    """
+    Lüfterauswertung für einen Tag oder eine Woche (ab Montag)
+
+    Attributes:
+        duty_cycle (float | None): Anteil der Laufzeit an der bekannten Zeit
+        override_share (float | None): Anteil der Zeit mit manuellem Override
+        energy_wh (float): Geschätzter Verbrauch aus Laufzeit und FAN_POWER_WATTS
+    """
+    model_config = ConfigDict(populate_by_name=True)
+    period: Literal["day", "week"]
+    start: date
+    tracked_seconds: float = Field(serialization_alias="trackedSeconds")
+    runtime_seconds: float = Field(serialization_alias="runtimeSeconds")
+    override_seconds: float = Field(serialization_alias="overrideSeconds")
+    switches: int
+    duty_cycle: float | None = Field(serialization_alias="dutyCycle")
+    override_share: float | None = Field(serialization_alias="overrideShare")
+    energy_wh: float = Field(serialization_alias="energyWh")
+
 class FanStatus(BaseRavenDoc):
     running: bool
     updatedAt: datetime
     override: datetime | None
 
+class Station(BaseRavenDoc):
+    """
+    Zusätzliche Messstation neben den beiden Stationen aus den Settings
+
+    Attributes:
+        name (str): Eindeutiger Name der Station, z.B. raum-101
+        address (str | None): Adresse des /get/-Endpunkts der Station, nur für abgefragte Stationen (push=False) nötig
+        zone (str): Raum bzw. Gebäudeteil. Innen- und Außenstationen einer Zone werden für die Lüfterentscheidung verglichen.
+        location (str): indoor oder outdoor
+        enabled (bool): Deaktivierte Stationen werden nicht abgefragt
+        push (bool): Die Station schickt ihre Messwerte selbst an /insert/station/batch/ und wird nicht abgefragt
+    """
+    name: str
+    address: str | None = None
+    zone: str
+    location: Literal["indoor", "outdoor"]
+    enabled: bool = True
+    push: bool = False
+
+class StationReading(BaseRavenDoc):
+    station: str
+    zone: str
+    location: Literal["indoor", "outdoor"]
+    timestamp: datetime
+    temp: float
+    humidity: float
+    dew_point: float = Field(serialization_alias="dewPoint")
+
+class ZoneState(BaseRavenDoc):
+    """
+    Lüfterentscheidung für eine Zone
+
+    Attributes:
+        dew_point_indoor (float): Mittlerer Taupunkt der Innenstationen
+        dew_point_outdoor (float): Mittlerer Taupunkt der Außenstationen (der Zone, sonst aller Zonen)
+    """
+    zone: str
+    timestamp: datetime
+    fan_running: bool
+    dew_point_indoor: float = Field(serialization_alias="dewPointIndoor")
+    dew_point_outdoor: float = Field(serialization_alias="dewPointOutdoor")
+
 class Settings(BaseRavenDoc):
     """
     Einstellungen der App
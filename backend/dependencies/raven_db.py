@@ -1,120 +1,506 @@
+import asyncio
+import functools
+import logging
 import os
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Callable, Iterator, TypeVar
 
 from ravendb import DocumentStore, CreateDatabaseOperation
+from ravendb.documents.operations.misc import DeleteByQueryOperation
+from ravendb.documents.queries.index_query import IndexQuery
+from ravendb.documents.session.document_session import DocumentSession
+from ravendb.exceptions.exceptions import TimeoutException
+from ravendb.tools.utils import Utils
 from ravendb.serverwide.database_record import DatabaseRecord
 
-from dependencies.models import Settings, State
+from dependencies import indexes, cache, calculations, retention, fan_analytics, storage
+from dependencies.models import Settings, State, Reading, ReadingAggregate, ReadingRollup, Station, StationReading, \
+    ZoneState, FanDay
+from dependencies.timestamps import naive_utc
 from routes.auth import User
 
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
 store: DocumentStore
 
-class TooManySettings(Exception):
-    pass
-class TooFewSettings(Exception):
-    pass
+# Der RavenDB-Client arbeitet synchron. Alle Zugriffe laufen deshalb in diesem Threadpool,
+# damit der Event-Loop während eines Datenbankzugriffs andere Requests bedienen kann.
+_executor: ThreadPoolExecutor | None = None
+
+# Neu angelegte Indizes über große Bestände brauchen länger; so lange wartet der Start höchstens auf sie
+INDEX_WAIT = timedelta(seconds=float(os.getenv("RAVEN_INDEX_WAIT_SECONDS", "15")))
+# Indizes für aktuellen Status und neuesten Messwert, deren Ergebnis beim Start in den Cache kommt
+LATEST_INDEXES = ((indexes.States_ByTimestamp, State), (indexes.Readings_ByTimestamp, Reading))
+# Lädt nach einem Start mit noch nicht aktuellen Indizes den Cache nach
+_index_wait: asyncio.Task | None = None
+
+async def _run(fn: Callable[..., T], *args) -> T:
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args))
+
+async def run_in_session(work: Callable[[DocumentSession], T]) -> T:
+    """
+    Führt work mit einer eigenen Session im Threadpool aus.
+
+    Eine Session entspricht einer Arbeitseinheit: alle Abfragen und Änderungen in work teilen sich
+    die Session, Änderungen müssen von work selbst mit save_changes() gespeichert werden.
+    """
+    def _work():
+        with store.open_session() as session:
+            return work(session)
+
+    return await _run(_work)
+
+def _first_or_none(query):
+    return next(iter(query.take(1)), None)
+
+def _latest(session: DocumentSession, index: type, object_type: type[T]) -> T | None:
+    return _first_or_none(session.query_index_type(index, object_type).order_by_descending("timestamp"))
+
+def _latest_when_indexed(session: DocumentSession, index: type, object_type: type[T]) -> tuple[T | None, bool]:
+    """
+    Wie _latest, wartet aber höchstens INDEX_WAIT darauf, dass der Index aktuell ist.
+
+    :return: (neuestes Dokument, True, falls der Index danach noch nicht aktuell war)
+    """
+    query = session.query_index_type(index, object_type).wait_for_non_stale_results(INDEX_WAIT)
+    try:
+        return _first_or_none(query.order_by_descending("timestamp")), False
+    except (TimeoutError, TimeoutException):
+        return _latest(session, index, object_type), True
+
+def _load_many(session: DocumentSession, ids: list[str], object_type: type[T]) -> dict[str, T]:
+    # session.load liefert bei genau einem gefundenen Dokument das Dokument selbst statt eines dict
+    result = session.load(ids, object_type) if ids else None
+    if result is None:
+        return {}
+    if isinstance(result, dict):
+        return result
+    return {result.Id: result}
+
+def _create_database(db_name: str):
+    database_record = DatabaseRecord(db_name)
+    create_database_operation = CreateDatabaseOperation(database_record)
+
+    try:
+        store.maintenance.server.send(create_database_operation)
+        logger.info("Datenbank %s angelegt.", database_record.database_name)
+    except Exception as e:
+        if "already exists" in str(e):
+            logger.debug("Datenbank %s ist bereits vorhanden.", database_record.database_name)
+        else:
+            raise e
+
+    indexes.deploy(store)
 
 async def init():
-    global store
+    global store, _executor, _index_wait
     urls = [os.environ["RAVEN_ADDRESS"]]
     db_name = os.environ["RAVEN_DATABASE"]
 
+    _executor = ThreadPoolExecutor(
+        max_workers=int(os.getenv("RAVEN_MAX_WORKERS", "4")),
+        thread_name_prefix="raven",
+    )
+
     store = DocumentStore(urls, db_name)
     store.initialize()
 
-    database_record = DatabaseRecord(db_name)
-    create_database_operation = CreateDatabaseOperation(database_record)
+    await _run(_create_database, db_name)
 
-    with store.open_session() as session:
-        try:
-            store.maintenance.server.send(create_database_operation)
-            print(f"Database '{database_record.database_name}' created successfully.")
-        except Exception as e:
-            if "already exists" in str(e):
-                print(f"Database '{database_record.database_name}' already exists. Skipping creation.")
-            else:
-                raise e
-
-        try:
-            state = await get_state()
-            print("State found", state)
-        except IndexError:
-            print("Creating new state")
-            state = State(
-                fan_running=False,
-                fan_override=None,
-                timestamp=datetime.now(tz=timezone.utc),
+    # Beim Start kurz auf die Indizes warten, falls sie gerade erst angelegt wurden. Danach kommen
+    # aktueller Status und neuester Messwert aus dem Cache.
+    stale = False
+    for index, object_type in LATEST_INDEXES:
+        latest, index_stale = await run_in_session(functools.partial(
+            _latest_when_indexed, index=index, object_type=object_type,
+        ))
+        if latest is not None:
+            cache.latest.update(latest)
+        if index_stale:
+            logger.warning(
+                "Index %s ist nach %ss noch nicht aktuell, der Start nutzt vorläufige Ergebnisse.",
+                index.__name__, INDEX_WAIT.total_seconds(),
             )
-            await store_object(state)
+            stale = True
 
-        session.save_changes()
+    if stale:
+        # Ohne aktuellen Index fehlt ein vorhandener Lüfterstatus womöglich nur, deshalb erst danach anlegen
+        _index_wait = asyncio.create_task(_load_latest_when_indexed())
+    else:
+        await storage.ensure_state()
 
-async def get_app_settings():
-    global store
-    with store.open_session() as db:
-        db_settings = list(
-            db.advanced.document_query(object_type=Settings)
+    await _load_zone_states()
+
+async def _load_latest_when_indexed():
+    """Übernimmt Status und neuesten Messwert in den Cache, sobald die Indizes nach dem Start aktuell sind."""
+    for index, object_type in LATEST_INDEXES:
+        stale = True
+        while stale:
+            latest, stale = await run_in_session(functools.partial(
+                _latest_when_indexed, index=index, object_type=object_type,
+            ))
+        if latest is not None:
+            cache.latest.update(latest)
+        logger.info("Index %s ist aktuell.", index.__name__)
+
+    await storage.ensure_state()
+
+async def close():
+    if _index_wait is not None:
+        _index_wait.cancel()
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+    store.close()
+
+async def get_settings() -> list[Settings]:
+    return await run_in_session(lambda session: list(session.advanced.document_query(object_type=Settings)))
+
+async def get_state() -> State | None:
+    cached = cache.latest.get_state()
+    if cached is not None:
+        return cached
+
+    res = await run_in_session(functools.partial(_latest, index=indexes.States_ByTimestamp, object_type=State))
+    if res is not None:
+        cache.latest.update(res)
+    return res
+
+async def get_latest_reading() -> Reading | None:
+    cached = cache.latest.get_reading()
+    if cached is not None:
+        return cached
+
+    res = await run_in_session(functools.partial(_latest, index=indexes.Readings_ByTimestamp, object_type=Reading))
+    if res is not None:
+        cache.latest.update(res)
+    return res
+
+async def get_readings(start: datetime, end: datetime) -> list[Reading]:
+    def work(session: DocumentSession):
+        return list(
+            session.query_index_type(indexes.Readings_ByTimestamp, Reading)
+            .where_between("timestamp", start, end)
+            .order_by("timestamp")
         )
-        if len(db_settings) < 1:
-            raise TooFewSettings()
-        if len(db_settings) > 1:
-            raise TooManySettings()
 
-        db_settings = db_settings[0]
+    return await run_in_session(work)
+
+async def get_readings_version(start: datetime, end: datetime) -> tuple[datetime | None, int]:
+    """
+    Zeitstempel des neuesten Messwerts und Anzahl der Messwerte im Zeitraum, ohne die Messwerte zu laden.
+
+    Ändert sich keiner der beiden Werte, ist auch der Inhalt des Zeitraums unverändert.
+    """
+    start, end = naive_utc(start), naive_utc(end)
+
+    def work(session: DocumentSession):
+        def in_range():
+            return session.query_index_type(indexes.Readings_ByTimestamp, Reading).where_between("timestamp", start, end)
+
+        newest = _first_or_none(in_range().order_by_descending("timestamp"))
+        return (newest.timestamp if newest is not None else None), in_range().count()
 
-    return db_settings
+    return await run_in_session(work)
 
-async def get_create_app_settings() -> Settings:
-    global store
+def _stream_readings(start: datetime, end: datetime, chunk_size: int) -> Iterator[list[Reading]]:
+    with store.open_session() as session:
+        query = (
+            session.query_index_type(indexes.Readings_ByTimestamp, Reading)
+            .where_between("timestamp", start, end)
+            .order_by("timestamp")
+        )
+
+        chunk: list[Reading] = []
+        for result in session.advanced.stream(query):
+            chunk.append(result.document)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+async def stream_readings(start: datetime, end: datetime, chunk_size: int = 500) -> AsyncIterator[list[Reading]]:
+    """
+    Liest die Messwerte im Zeitraum über die Streaming-API, ohne den ganzen Zeitraum im Speicher zu halten.
+
+    Wie bei get_history kommen Zeiträume, deren Messwerte schon verdichtet sind, aus den Stunden- bzw.
+    Tageswerten. Diese werden vor den einzelnen Messwerten geliefert.
+
+    :return: Messwerte in Blöcken von höchstens chunk_size, aufsteigend nach Zeitstempel
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    chunks = _stream_readings(start, end, chunk_size)
     try:
-        settings = await get_app_settings()
-    except TooFewSettings:
-        settings = Settings(
-            dht22_indoor_address="",
-            dht22_outdoor_address="",
-            data_cron="*/30 * * * *",
-            fan_override_duration=0,
+        chunk = await _run(next, chunks, None)
+        if start < retention.raw_cutoff():
+            older = await _older_tiers(start, chunk[0].timestamp if chunk else end)
+            for i in range(0, len(older), chunk_size):
+                yield older[i:i + chunk_size]
+
+        while chunk is not None:
+            yield chunk
+            chunk = await _run(next, chunks, None)
+    finally:
+        await _run(chunks.close)
+
+async def _older_tiers(start: datetime, boundary: datetime) -> list[Reading]:
+    def work(session: DocumentSession):
+        def load_rollups(resolution: str, first: datetime, before: datetime) -> list[ReadingRollup]:
+            return list(
+                session.query_index_type(indexes.ReadingRollups_ByResolutionAndTimestamp, ReadingRollup)
+                .where_equals("resolution", resolution)
+                .and_also()
+                .where_greater_than_or_equal("timestamp", first)
+                .and_also()
+                .where_less_than("timestamp", before)
+                .order_by("timestamp")
+            )
+
+        return retention.older_tiers(start, boundary, load_rollups)
+
+    return await run_in_session(work)
+
+async def get_history(start: datetime, end: datetime) -> list[Reading]:
+    """
+    Messwerte im Zeitraum aus der jeweils feinsten vorhandenen Stufe.
+
+    Solange einzelne Messwerte vorhanden sind, werden diese geliefert. Davor liegende Zeiträume, deren
+    Messwerte durch storage.compact_readings schon gelöscht sind, werden mit den Mittelwerten der gespeicherten
+    Stunden- bzw. Tageswerte aufgefüllt.
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    readings = await get_readings(start, end)
+    if start >= retention.raw_cutoff():
+        return readings
+
+    return await _older_tiers(start, readings[0].timestamp if readings else end) + readings
+
+async def get_reading_aggregates(resolution: str, start: datetime, end: datetime) -> list[ReadingAggregate]:
+    """
+    Liest die vorberechneten Stunden- oder Tageswerte aus den Map-Reduce-Indizes und den
+    gespeicherten Werten für Zeiträume, deren Messwerte schon gelöscht sind.
+
+    :param resolution: "hour" oder "day", siehe indexes.BUCKET_INDEXES
+    """
+    index, bucket_format = indexes.BUCKET_INDEXES[resolution]
+    first, last = naive_utc(start).strftime(bucket_format), naive_utc(end).strftime(bucket_format)
+
+    def work(session: DocumentSession):
+        rollups = list(
+            session.query_index_type(indexes.ReadingRollups_ByResolutionAndTimestamp, ReadingRollup)
+            .where_equals("resolution", resolution)
+            .and_also()
+            .where_between("bucket", first, last)
         )
-        await store_object(settings)
-    except TooManySettings:
-        print("Too many settings in database.")
-        raise Exception("Too many settings in database.")
+        buckets = list(session.query_index_type(index, dict).where_between("bucket", first, last))
+        return rollups, buckets
 
-    return settings
+    rollups, buckets = await run_in_session(work)
+    return retention.merge_aggregates(resolution, rollups, buckets)
 
-async def save_settings(new_settings: Settings):
-    global store
-    with store.open_session() as session:
-        old_settings = await get_create_app_settings()
-        if old_settings.Id is None:
-            raise RuntimeError("Settings Error")
+def _compact_oldest_day(session: DocumentSession, cutoff: datetime) -> int:
+    """
+    Fasst den ältesten Tag mit Messwerten vor cutoff zu Stunden- und Tageswerten zusammen und löscht
+    dessen Messwerte. Beides wird gemeinsam gespeichert, ein abgebrochener Lauf zählt nichts doppelt.
+
+    :return: Anzahl gelöschter Messwerte, 0 wenn es vor cutoff keine Messwerte mehr gibt
+    """
+    oldest = _first_or_none(
+        session.query_index_type(indexes.Readings_ByTimestamp, Reading)
+        .where_less_than("timestamp", cutoff)
+        .order_by("timestamp")
+    )
+    if oldest is None:
+        return 0
+
+    day = naive_utc(oldest.timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+    readings: list[Reading] = list(
+        session.query_index_type(indexes.Readings_ByTimestamp, Reading)
+        .where_greater_than_or_equal("timestamp", day)
+        .and_also()
+        .where_less_than("timestamp", min(day + timedelta(days=1), cutoff))
+    )
+    calculations.fill_dew_points(readings)
+
+    rollup_ids, merge = retention.roll_up(readings)
+    for rollup in merge(_load_many(session, rollup_ids, ReadingRollup)):
+        session.store(rollup)
+
+    for reading in readings:
+        session.delete(reading)
+    session.save_changes()
+    return len(readings)
+
+def _delete_by_query(query: str, **parameters) -> None:
+    index_query = IndexQuery(query)
+    index_query.query_parameters = parameters
+    store.operations.send_async(DeleteByQueryOperation(index_query)).wait_for_completion()
+
+async def compact_oldest_day(cutoff: datetime) -> int:
+    return await run_in_session(functools.partial(_compact_oldest_day, cutoff=cutoff))
+
+async def delete_hourly_rollups(before: datetime):
+    await _run(functools.partial(
+        _delete_by_query,
+        f"from index '{indexes.ReadingRollups_ByResolutionAndTimestamp().index_name}' "
+        "where resolution = 'hour' and timestamp < $cutoff",
+        cutoff=Utils.datetime_to_string(naive_utc(before)),
+    ))
+
+async def delete_states(before: datetime, keep: str | None):
+    await _run(functools.partial(
+        _delete_by_query,
+        f"from index '{indexes.States_ByTimestamp().index_name}' where timestamp < $cutoff and id() != $current",
+        cutoff=Utils.datetime_to_string(naive_utc(before)),
+        current=keep or "",
+    ))
+
+async def delete_station_readings(before: datetime):
+    await _run(functools.partial(
+        _delete_by_query,
+        f"from index '{indexes.StationReadings_ByStationAndTimestamp().index_name}' where timestamp < $cutoff",
+        cutoff=Utils.datetime_to_string(naive_utc(before)),
+    ))
+
+async def delete_zone_states(before: datetime, keep: dict[str, datetime]):
+    """
+    Löscht Entscheidungen pro Zone vor before, für die Zonen in keep nur die vor dem angegebenen Zeitpunkt.
+    """
+    index_name = indexes.ZoneStates_ByZoneAndTimestamp().index_name
+    for zone, zone_before in keep.items():
+        await _run(functools.partial(
+            _delete_by_query,
+            f"from index '{index_name}' where zone = $zone and timestamp < $before",
+            zone=zone,
+            before=Utils.datetime_to_string(naive_utc(zone_before)),
+        ))
+
+    query = f"from index '{index_name}' where timestamp < $cutoff"
+    parameters = {"cutoff": Utils.datetime_to_string(naive_utc(before))}
+    if keep:
+        query += " and not zone in ($zones)"
+        parameters["zones"] = list(keep)
+    await _run(functools.partial(_delete_by_query, query, **parameters))
+
+def _update_fan_days(session: DocumentSession, previous: State | None, new: State):
+    days = fan_analytics.affected_days(previous, new.timestamp)
+    existing = _load_many(session, [fan_analytics.fan_day_id(day) for day in days], FanDay)
+    fan_days = {date.fromisoformat(d.day): d for d in existing.values() if d is not None}
+
+    fan_analytics.apply_state(fan_days, previous, new)
+    for fan_day in fan_days.values():
+        session.store(fan_day)
+
+async def store_object(db_object):
+    # Ein neuer Lüfterstatus schreibt die Tageswerte der Lüfterauswertung in derselben Session fort
+    previous_state = cache.latest.state if isinstance(db_object, State) and db_object.Id is None else None
+
+    def work(session: DocumentSession):
+        session.store(db_object)
+        if previous_state is not None:
+            _update_fan_days(session, previous_state, db_object)
+        session.save_changes()
+
+    await run_in_session(work)
+    cache.latest.update(db_object)
+    if isinstance(db_object, User):
+        cache.users.invalidate(db_object.username)
+
+async def bulk_store(db_objects: list) -> int:
+    """
+    Speichert viele neue Dokumente per Bulk Insert in einem Durchgang.
+
+    :return: Anzahl gespeicherter Dokumente
+    """
+    def work():
+        with store.bulk_insert() as bulk:
+            for db_object in db_objects:
+                bulk.store(db_object)
 
-        new_settings.Id = old_settings.Id
-        session.store(new_settings)
+    await _run(work)
+    for db_object in db_objects:
+        cache.latest.update(db_object)
+    return len(db_objects)
+
+async def get_fan_days(start: date, end: date) -> list[FanDay]:
+    """Tageswerte der Lüfterauswertung von start bis end (einschließlich), Tage ohne Status fehlen."""
+    ids = [fan_analytics.fan_day_id(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+    fan_days = await run_in_session(lambda session: _load_many(session, ids, FanDay))
+    return sorted((d for d in fan_days.values() if d is not None), key=lambda d: d.day)
+
+async def get_stations() -> list[Station]:
+    return await run_in_session(
+        lambda session: list(session.query_index_type(indexes.Stations_ByName, Station).order_by("name"))
+    )
+
+async def save_station(station: Station) -> Station:
+    """Legt eine Station an oder ersetzt die Station mit demselben Namen."""
+    def work(session: DocumentSession):
+        existing = _first_or_none(
+            session.query_index_type(indexes.Stations_ByName, Station).where_equals("name", station.name)
+        )
+        station.Id = existing.Id if existing is not None else None
+        if existing is not None:
+            session.advanced.evict(existing)
+        session.store(station)
+        session.save_changes()
+        return station
+
+    return await run_in_session(work)
+
+async def delete_station(name: str) -> bool:
+    def work(session: DocumentSession):
+        existing = _first_or_none(
+            session.query_index_type(indexes.Stations_ByName, Station).where_equals("name", name)
+        )
+        if existing is None:
+            return False
+        session.delete(existing)
         session.save_changes()
+        return True
 
-async def get_state() -> State:
-    with (store.open_session() as session):
-        res = (
-            session.query(object_type=State)
-            .wait_for_non_stale_results()
+    return await run_in_session(work)
+
+async def get_station_readings(name: str, start: datetime, end: datetime) -> list[StationReading]:
+    def work(session: DocumentSession):
+        return list(
+            session.query_index_type(indexes.StationReadings_ByStationAndTimestamp, StationReading)
+            .where_equals("station", name)
+            .and_also()
+            .where_between("timestamp", start, end)
+            .order_by("timestamp")
+        )
+
+    return await run_in_session(work)
+
+async def _load_zone_states():
+    zones = {station.zone for station in await get_stations()}
+
+    def latest(zone: str):
+        return lambda session: _first_or_none(
+            session.query_index_type(indexes.ZoneStates_ByZoneAndTimestamp, ZoneState)
+            .where_equals("zone", zone)
             .order_by_descending("timestamp")
-            .first()
         )
-        print(res)
-        return res
 
-async def store_object(db_object):
-    with store.open_session() as db:
-        db.store(db_object)
-        db.save_changes()
-
-async def add_user(username, password_hash, full_name, email):
-    user = User(
-        username=username,
-        hashed_password=password_hash,
-        full_name=full_name,
-        disabled=False,
-        email=email,
-    )
-    await store_object(user)
+    for zone_state in await asyncio.gather(*(run_in_session(latest(zone)) for zone in zones)):
+        if zone_state is not None:
+            cache.latest.update(zone_state)
+
+async def get_zone_states() -> list[ZoneState]:
+    return sorted(cache.latest.zones.values(), key=lambda z: z.zone)
+
+async def get_user(username: str) -> User | None:
+    def work(session: DocumentSession):
+        return _first_or_none(
+            session.query_index_type(indexes.Users_ByUsername, User).where_equals("username", username)
+        )
+
+    return await run_in_session(work)
+
+async def count_users() -> int:
+    return await run_in_session(lambda session: session.query_index_type(indexes.Users_ByUsername, User).count())
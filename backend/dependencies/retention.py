@@ -0,0 +1,199 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from dependencies.models import Reading, ReadingAggregate, ReadingRollup, SeriesAggregate
+
+# Einzelne Messwerte werden so viele Tage aufbewahrt, danach bleiben nur Stunden- und Tageswerte
+RAW_DAYS = int(os.getenv("RETENTION_RAW_DAYS", "30"))
+# Stundenwerte werden so viele Tage aufbewahrt, Tageswerte unbegrenzt
+HOURLY_DAYS = int(os.getenv("RETENTION_HOURLY_DAYS", "365"))
+# Ältere Lüfterstatus werden gelöscht, der aktuelle bleibt immer erhalten
+STATE_DAYS = int(os.getenv("RETENTION_STATE_DAYS", "30"))
+# Messwerte der registrierten Stationen und Entscheidungen pro Zone, die aktuelle jeder Zone bleibt erhalten
+STATION_DAYS = int(os.getenv("RETENTION_STATION_DAYS", "30"))
+
+# Reihenfolge der Stufen für Verlaufsabfragen, von fein nach grob
+TIERS = ["hour", "day"]
+
+# Felder eines Messwerts, die in den Aggregaten zusammengefasst werden
+SERIES = [
+    "indoor_temp",
+    "outdoor_temp",
+    "indoor_humidity",
+    "outdoor_humidity",
+    "dew_point_indoor",
+    "dew_point_outdoor",
+]
+
+# Auflösung -> strftime-Format des Bucket-Schlüssels, wie in den Map-Reduce-Indizes (indexes.BUCKET_INDEXES).
+# Steht hier und nicht in indexes, damit nur raven_db den RavenDB-Client importiert.
+BUCKET_FORMATS = {
+    "hour": "%Y-%m-%dT%H",
+    "day": "%Y-%m-%d",
+}
+
+
+def _cutoff(days: int, now: datetime | None = None) -> datetime:
+    """Beginn des UTC-Tages vor days Tagen, ohne Zeitzone wie in der Datenbank."""
+    now = now or datetime.now(tz=timezone.utc)
+    day = now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return day - timedelta(days=days)
+
+
+def raw_cutoff(now: datetime | None = None) -> datetime:
+    # Auf ganze Tage gerundet, damit Stunden- und Tageswerte immer vollständige Zeitabschnitte umfassen
+    return _cutoff(RAW_DAYS, now)
+
+
+def hourly_cutoff(now: datetime | None = None) -> datetime:
+    return _cutoff(max(HOURLY_DAYS, RAW_DAYS), now)
+
+
+def state_cutoff(now: datetime | None = None) -> datetime:
+    return _cutoff(STATE_DAYS, now)
+
+
+def station_cutoff(now: datetime | None = None) -> datetime:
+    return _cutoff(STATION_DAYS, now)
+
+
+def rollup_id(resolution: str, bucket: str) -> str:
+    return f"ReadingRollups/{resolution}/{bucket}"
+
+
+def summarize(readings: list[Reading], resolution: str) -> list[dict]:
+    """
+    Fasst Messwerte pro Stunde bzw. Tag zusammen, im selben Format wie die Map-Reduce-Indizes.
+
+    Die Taupunkte müssen gesetzt sein (calculations.fill_dew_points).
+    """
+    bucket_format = BUCKET_FORMATS[resolution]
+    buckets: dict[str, dict] = {}
+    for reading in readings:
+        key = reading.timestamp.strftime(bucket_format)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {"bucket": key, "count": 0}
+            for series in SERIES:
+                value = getattr(reading, series)
+                bucket.update({f"{series}_min": value, f"{series}_max": value, f"{series}_sum": 0.0})
+
+        bucket["count"] += 1
+        for series in SERIES:
+            value = getattr(reading, series)
+            bucket[f"{series}_min"] = min(bucket[f"{series}_min"], value)
+            bucket[f"{series}_max"] = max(bucket[f"{series}_max"], value)
+            bucket[f"{series}_sum"] += value
+    return list(buckets.values())
+
+
+def merge_bucket(rollup: ReadingRollup | None, resolution: str, bucket: dict) -> ReadingRollup:
+    """
+    Übernimmt einen zusammengefassten Zeitabschnitt (aus summarize oder dem Map-Reduce-Index) in einen
+    gespeicherten Stunden- bzw. Tageswert.
+
+    Existiert für den Zeitabschnitt schon ein Wert (z.B. bei nachträglich importierten Messwerten),
+    werden beide zusammengefasst.
+    """
+    bucket_format = BUCKET_FORMATS[resolution]
+    values = {
+        f"{series}_{field}": bucket[f"{series}_{field}"]
+        for series in SERIES
+        for field in ("min", "max", "sum")
+    }
+
+    if rollup is None:
+        return ReadingRollup(
+            Id=rollup_id(resolution, bucket["bucket"]),
+            resolution=resolution,
+            bucket=bucket["bucket"],
+            timestamp=datetime.strptime(bucket["bucket"], bucket_format),
+            count=bucket["count"],
+            values=values,
+        )
+
+    for series in SERIES:
+        values[f"{series}_min"] = min(values[f"{series}_min"], rollup.values[f"{series}_min"])
+        values[f"{series}_max"] = max(values[f"{series}_max"], rollup.values[f"{series}_max"])
+        values[f"{series}_sum"] += rollup.values[f"{series}_sum"]
+    rollup.values = values
+    rollup.count += bucket["count"]
+    return rollup
+
+
+def to_aggregate(timestamp: datetime, count: int, values: dict) -> ReadingAggregate:
+    """
+    :param values: Min, Max und Summe pro Messreihe wie im Map-Reduce-Index
+    """
+    return ReadingAggregate(
+        timestamp=timestamp.replace(tzinfo=timezone.utc),
+        count=count,
+        **{
+            series: SeriesAggregate(
+                min=values[f"{series}_min"],
+                max=values[f"{series}_max"],
+                mean=round(values[f"{series}_sum"] / count, 2),
+            )
+            for series in SERIES
+        },
+    )
+
+
+def to_reading(rollup: ReadingRollup) -> Reading:
+    """Mittelwerte eines Zeitabschnitts als Messwert zum Beginn des Abschnitts."""
+    return Reading(
+        timestamp=rollup.timestamp,
+        **{series: round(rollup.values[f"{series}_sum"] / rollup.count, 2) for series in SERIES},
+    )
+
+
+def older_tiers(
+    start: datetime,
+    boundary: datetime,
+    load_rollups: Callable[[str, datetime, datetime], list[ReadingRollup]],
+) -> list[Reading]:
+    """
+    Füllt den Zeitraum von start bis boundary (dem ältesten vorhandenen Messwert) aus den gespeicherten
+    Stunden- bzw. Tageswerten auf, jeweils aus der feinsten Stufe, die noch Werte hat.
+
+    :param load_rollups: (Auflösung, von, bis ausschließlich) -> Werte aufsteigend nach Zeitstempel
+    """
+    older: list[Reading] = []
+    for resolution in TIERS:
+        if boundary <= start:
+            break
+        rollups = load_rollups(resolution, start, boundary)
+        if rollups:
+            older = [to_reading(rollup) for rollup in rollups] + older
+            boundary = rollups[0].timestamp
+    return older
+
+
+def merge_aggregates(resolution: str, rollups: list[ReadingRollup], buckets: list[dict]) -> list[ReadingAggregate]:
+    """Führt gespeicherte Stunden- bzw. Tageswerte und die aus den Messwerten berechneten zusammen."""
+    by_bucket = {rollup.bucket: rollup for rollup in rollups}
+    for bucket in buckets:
+        by_bucket[bucket["bucket"]] = merge_bucket(by_bucket.get(bucket["bucket"]), resolution, bucket)
+
+    return [to_aggregate(rollup.timestamp, rollup.count, rollup.values) for _, rollup in sorted(by_bucket.items())]
+
+
+def roll_up(readings: list[Reading]) -> tuple[list[str], Callable[[dict[str, ReadingRollup]], list[ReadingRollup]]]:
+    """
+    Fasst Messwerte für die Verdichtung in allen Stufen zusammen.
+
+    :return: (IDs der betroffenen gespeicherten Werte, Funktion, die aus den vorhandenen Werten mit diesen
+        IDs die neuen bzw. ergänzten Werte erzeugt)
+    """
+    summaries = {resolution: summarize(readings, resolution) for resolution in TIERS}
+    ids = [rollup_id(resolution, b["bucket"]) for resolution, buckets in summaries.items() for b in buckets]
+
+    def merge(existing: dict[str, ReadingRollup]) -> list[ReadingRollup]:
+        return [
+            merge_bucket(existing.get(rollup_id(resolution, bucket["bucket"])), resolution, bucket)
+            for resolution, buckets in summaries.items()
+            for bucket in buckets
+        ]
+
+    return ids, merge
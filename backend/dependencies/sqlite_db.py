@@ -0,0 +1,452 @@
+"""
+Eingebettetes Backend in einer SQLite-Datei, Alternative zu raven_db ohne eigenen Datenbankserver.
+
+Messwerte liegen spaltenweise in der Tabelle readings mit einem Index auf dem Zeitstempel, Stunden- und
+Tageswerte berechnet SQLite per GROUP BY. Alle anderen Objekte liegen als JSON in der Tabelle documents,
+Sammlung, Schlüssel (z.B. Stationsname) und Zeitstempel sind als Spalten indiziert.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Callable, TypeVar
+
+from dependencies import cache, calculations, retention, fan_analytics, storage
+from dependencies.models import Settings, State, Reading, ReadingAggregate, ReadingRollup, Station, StationReading, \
+    ZoneState, FanDay
+from dependencies.timestamps import naive_utc
+from routes.auth import User
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Zeitstempel werden ohne Zeitzone in UTC gespeichert, in diesem Format sind sie als Text sortierbar
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+# Dokumenttyp -> (Sammlung, Feld für die Spalte key)
+COLLECTIONS: dict[type, tuple[str, str | None]] = {
+    Settings: ("Settings", None),
+    State: ("States", None),
+    User: ("Users", "username"),
+    Station: ("Stations", "name"),
+    StationReading: ("StationReadings", "station"),
+    ZoneState: ("ZoneStates", "zone"),
+    ReadingRollup: ("ReadingRollups", "resolution"),
+    FanDay: ("FanDays", "day"),
+}
+
+_READING_COLUMNS = ["id", "timestamp", *retention.SERIES]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS readings (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    {", ".join(f"{series} REAL" for series in retention.SERIES)}
+);
+CREATE INDEX IF NOT EXISTS readings_timestamp ON readings (timestamp, id);
+
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    key TEXT,
+    timestamp TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_key_timestamp ON documents (collection, key, timestamp);
+CREATE INDEX IF NOT EXISTS documents_timestamp ON documents (collection, timestamp);
+"""
+
+_connection: sqlite3.Connection | None = None
+
+# SQLite erlaubt nur einen Schreiber gleichzeitig. Alle Zugriffe laufen deshalb nacheinander in diesem
+# einen Thread, der Event-Loop bleibt währenddessen frei.
+_executor: ThreadPoolExecutor | None = None
+
+async def _run(fn: Callable[..., T], *args) -> T:
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args))
+
+def _ts(timestamp: datetime) -> str:
+    return naive_utc(timestamp).strftime(TIMESTAMP_FORMAT)
+
+def _parse(value: str) -> datetime:
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, check_same_thread=False)
+    # WAL: Lesen blockiert das Schreiben nicht, NORMAL: fsync nur an Checkpoints, auf der SD-Karte deutlich schneller
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(_SCHEMA)
+    return connection
+
+def _reading(row: tuple) -> Reading:
+    # Werte kommen aus der eigenen Tabelle, eine erneute Validierung ist nicht nötig
+    return Reading.model_construct(
+        Id=row[0],
+        timestamp=_parse(row[1]),
+        **dict(zip(retention.SERIES, row[2:])),
+    )
+
+def _select_readings(where: str, params: tuple, suffix: str = "") -> list[Reading]:
+    rows = _connection.execute(
+        f"SELECT {', '.join(_READING_COLUMNS)} FROM readings WHERE {where} ORDER BY timestamp, id {suffix}", params
+    )
+    return [_reading(row) for row in rows]
+
+def _documents(object_type: type[T], where: str = "", params: tuple = (), order: str = "timestamp", limit: int | None = None) -> list[T]:
+    collection, _ = COLLECTIONS[object_type]
+    sql = "SELECT body FROM documents WHERE collection = ?"
+    if where:
+        sql += f" AND {where}"
+    sql += f" ORDER BY {order}"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return [object_type.model_validate_json(body) for body, in _connection.execute(sql, (collection, *params))]
+
+def _first_or_none(documents: list[T]) -> T | None:
+    return documents[0] if documents else None
+
+def _load_many(ids: list[str], object_type: type[T]) -> dict[str, T]:
+    if not ids:
+        return {}
+    placeholders = ", ".join("?" * len(ids))
+    documents = _documents(object_type, f"id IN ({placeholders})", tuple(ids), order="id")
+    return {document.Id: document for document in documents}
+
+def _latest_reading() -> Reading | None:
+    row = _connection.execute(
+        f"SELECT {', '.join(_READING_COLUMNS)} FROM readings ORDER BY timestamp DESC, id DESC LIMIT 1"
+    ).fetchone()
+    return _reading(row) if row is not None else None
+
+def _reading_row(reading: Reading) -> tuple:
+    if reading.Id is None:
+        reading.Id = f"Readings/{uuid.uuid4().hex}"
+    return reading.Id, _ts(reading.timestamp), *(getattr(reading, series) for series in retention.SERIES)
+
+def _document_row(db_object) -> tuple:
+    collection, key_field = COLLECTIONS[type(db_object)]
+    if db_object.Id is None:
+        db_object.Id = f"{collection}/{uuid.uuid4().hex}"
+
+    # Zeitstempel im Dokument wie in der Spalte ohne Zeitzone, wie sie auch RavenDB zurückgibt
+    body = {
+        name: _ts(value) if isinstance(value, datetime) else value
+        for name, value in db_object.model_dump().items()
+    }
+    timestamp = getattr(db_object, "timestamp", None)
+    return (
+        db_object.Id,
+        collection,
+        getattr(db_object, key_field) if key_field else None,
+        _ts(timestamp) if timestamp is not None else None,
+        json.dumps(body),
+    )
+
+def _store(db_objects: list):
+    readings = [o for o in db_objects if isinstance(o, Reading)]
+    if readings:
+        calculations.fill_dew_points(readings)
+        _connection.executemany(
+            f"INSERT OR REPLACE INTO readings ({', '.join(_READING_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(_READING_COLUMNS))})",
+            [_reading_row(reading) for reading in readings],
+        )
+
+    documents = [o for o in db_objects if not isinstance(o, Reading)]
+    if documents:
+        _connection.executemany(
+            "INSERT OR REPLACE INTO documents (id, collection, key, timestamp, body) VALUES (?, ?, ?, ?, ?)",
+            [_document_row(document) for document in documents],
+        )
+
+async def init():
+    global _connection, _executor
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+    _connection = await _run(_connect, os.getenv("SQLITE_PATH", "bbs2.sqlite3"))
+
+    def latest():
+        return _first_or_none(_documents(State, order="timestamp DESC", limit=1)), _latest_reading()
+
+    for latest_object in await _run(latest):
+        if latest_object is not None:
+            cache.latest.update(latest_object)
+
+    await storage.ensure_state()
+    await _load_zone_states()
+
+async def close():
+    global _connection, _executor
+    if _connection is not None:
+        await _run(_connection.close)
+        _connection = None
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+async def get_settings() -> list[Settings]:
+    return await _run(_documents, Settings)
+
+async def get_state() -> State | None:
+    cached = cache.latest.get_state()
+    if cached is not None:
+        return cached
+
+    res = _first_or_none(await _run(functools.partial(_documents, State, order="timestamp DESC", limit=1)))
+    if res is not None:
+        cache.latest.update(res)
+    return res
+
+async def get_latest_reading() -> Reading | None:
+    cached = cache.latest.get_reading()
+    if cached is not None:
+        return cached
+
+    res = await _run(_latest_reading)
+    if res is not None:
+        cache.latest.update(res)
+    return res
+
+async def get_readings(start: datetime, end: datetime) -> list[Reading]:
+    return await _run(_select_readings, "timestamp BETWEEN ? AND ?", (_ts(start), _ts(end)))
+
+async def get_readings_version(start: datetime, end: datetime) -> tuple[datetime | None, int]:
+    """
+    Zeitstempel des neuesten Messwerts und Anzahl der Messwerte im Zeitraum, ohne die Messwerte zu laden.
+
+    Ändert sich keiner der beiden Werte, ist auch der Inhalt des Zeitraums unverändert.
+    """
+    def work():
+        return _connection.execute(
+            "SELECT max(timestamp), count(*) FROM readings WHERE timestamp BETWEEN ? AND ?", (_ts(start), _ts(end))
+        ).fetchone()
+
+    newest, count = await _run(work)
+    return (_parse(newest) if newest is not None else None), count
+
+async def stream_readings(start: datetime, end: datetime, chunk_size: int = 500) -> AsyncIterator[list[Reading]]:
+    """
+    Liest die Messwerte im Zeitraum blockweise, ohne den ganzen Zeitraum im Speicher zu halten.
+
+    Jeder Block ist eine eigene Abfrage ab dem letzten Messwert des vorherigen Blocks, zwischen zwei
+    Blöcken ist die Verbindung also für andere Zugriffe frei. Wie bei get_history kommen Zeiträume,
+    deren Messwerte schon verdichtet sind, aus den Stunden- bzw. Tageswerten.
+
+    :return: Messwerte in Blöcken von höchstens chunk_size, aufsteigend nach Zeitstempel
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    after, until = (_ts(start), ""), _ts(end)
+
+    def next_chunk():
+        return _select_readings(
+            "(timestamp, id) > (?, ?) AND timestamp <= ?", (*after, until), f"LIMIT {int(chunk_size)}",
+        )
+
+    chunk = await _run(next_chunk)
+    if start < retention.raw_cutoff():
+        older = await _older_tiers(start, chunk[0].timestamp if chunk else end)
+        for i in range(0, len(older), chunk_size):
+            yield older[i:i + chunk_size]
+
+    while chunk:
+        yield chunk
+        after = (_ts(chunk[-1].timestamp), chunk[-1].Id)
+        chunk = await _run(next_chunk)
+
+def _rollups(resolution: str, first: datetime, before: datetime) -> list[ReadingRollup]:
+    return _documents(ReadingRollup, "key = ? AND timestamp >= ? AND timestamp < ?", (resolution, _ts(first), _ts(before)))
+
+async def _older_tiers(start: datetime, boundary: datetime) -> list[Reading]:
+    return await _run(retention.older_tiers, start, boundary, _rollups)
+
+async def get_history(start: datetime, end: datetime) -> list[Reading]:
+    """
+    Messwerte im Zeitraum aus der jeweils feinsten vorhandenen Stufe, siehe raven_db.get_history.
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    readings = await get_readings(start, end)
+    if start >= retention.raw_cutoff():
+        return readings
+
+    return await _older_tiers(start, readings[0].timestamp if readings else end) + readings
+
+async def get_reading_aggregates(resolution: str, start: datetime, end: datetime) -> list[ReadingAggregate]:
+    """
+    Stunden- oder Tageswerte aus den gespeicherten Messwerten (per GROUP BY) und den gespeicherten Werten
+    für Zeiträume, deren Messwerte schon gelöscht sind.
+
+    :param resolution: "hour" oder "day", siehe retention.BUCKET_FORMATS
+    """
+    bucket_format = retention.BUCKET_FORMATS[resolution]
+    first, last = naive_utc(start).strftime(bucket_format), naive_utc(end).strftime(bucket_format)
+    # Der Bucket-Schlüssel ist ein Präfix des gespeicherten Zeitstempels
+    length = len(first)
+    columns = ", ".join(
+        f"min({series}), max({series}), total({series})" for series in retention.SERIES
+    )
+
+    def work():
+        rollups = _documents(
+            ReadingRollup,
+            "key = ? AND timestamp BETWEEN ? AND ?",
+            (resolution, _ts(datetime.strptime(first, bucket_format)), _ts(datetime.strptime(last, bucket_format))),
+        )
+        rows = _connection.execute(
+            f"SELECT substr(timestamp, 1, {length}) AS bucket, count(*), {columns} FROM readings "
+            f"WHERE timestamp >= ? AND substr(timestamp, 1, {length}) <= ? GROUP BY bucket",
+            (first, last),
+        ).fetchall()
+        return rollups, rows
+
+    rollups, rows = await _run(work)
+    fields = [f"{series}_{field}" for series in retention.SERIES for field in ("min", "max", "sum")]
+    buckets = [{"bucket": row[0], "count": row[1], **dict(zip(fields, row[2:]))} for row in rows]
+    return retention.merge_aggregates(resolution, rollups, buckets)
+
+def _compact_oldest_day(cutoff: datetime) -> int:
+    """
+    Fasst den ältesten Tag mit Messwerten vor cutoff zu Stunden- und Tageswerten zusammen und löscht
+    dessen Messwerte in derselben Transaktion.
+
+    :return: Anzahl gelöschter Messwerte, 0 wenn es vor cutoff keine Messwerte mehr gibt
+    """
+    oldest, = _connection.execute("SELECT min(timestamp) FROM readings WHERE timestamp < ?", (_ts(cutoff),)).fetchone()
+    if oldest is None:
+        return 0
+
+    day = _parse(oldest).replace(hour=0, minute=0, second=0, microsecond=0)
+    params = (_ts(day), _ts(min(day + timedelta(days=1), cutoff)))
+    readings = _select_readings("timestamp >= ? AND timestamp < ?", params)
+    calculations.fill_dew_points(readings)
+
+    rollup_ids, merge = retention.roll_up(readings)
+    with _connection:
+        _store(merge(_load_many(rollup_ids, ReadingRollup)))
+        _connection.execute("DELETE FROM readings WHERE timestamp >= ? AND timestamp < ?", params)
+    return len(readings)
+
+def _delete_documents(object_type: type, where: str, params: tuple) -> int:
+    collection, _ = COLLECTIONS[object_type]
+    with _connection:
+        return _connection.execute(f"DELETE FROM documents WHERE collection = ? AND {where}", (collection, *params)).rowcount
+
+async def compact_oldest_day(cutoff: datetime) -> int:
+    return await _run(_compact_oldest_day, cutoff)
+
+async def delete_hourly_rollups(before: datetime):
+    await _run(_delete_documents, ReadingRollup, "key = 'hour' AND timestamp < ?", (_ts(before),))
+
+async def delete_states(before: datetime, keep: str | None):
+    await _run(_delete_documents, State, "timestamp < ? AND id != ?", (_ts(before), keep or ""))
+
+async def delete_station_readings(before: datetime):
+    await _run(_delete_documents, StationReading, "timestamp < ?", (_ts(before),))
+
+async def delete_zone_states(before: datetime, keep: dict[str, datetime]):
+    """
+    Löscht Entscheidungen pro Zone vor before, für die Zonen in keep nur die vor dem angegebenen Zeitpunkt.
+    """
+    def work():
+        for zone, zone_before in keep.items():
+            _delete_documents(ZoneState, "key = ? AND timestamp < ?", (zone, _ts(zone_before)))
+        placeholders = ", ".join("?" * len(keep))
+        _delete_documents(ZoneState, f"timestamp < ? AND key NOT IN ({placeholders})", (_ts(before), *keep))
+
+    await _run(work)
+
+def _fan_days(previous: State, new: State) -> list[FanDay]:
+    days = fan_analytics.affected_days(previous, new.timestamp)
+    existing = _load_many([fan_analytics.fan_day_id(day) for day in days], FanDay)
+    fan_days = {date.fromisoformat(d.day): d for d in existing.values()}
+
+    fan_analytics.apply_state(fan_days, previous, new)
+    return list(fan_days.values())
+
+async def store_object(db_object):
+    # Ein neuer Lüfterstatus schreibt die Tageswerte der Lüfterauswertung in derselben Transaktion fort
+    previous_state = cache.latest.state if isinstance(db_object, State) and db_object.Id is None else None
+
+    def work():
+        with _connection:
+            _store([db_object])
+            if previous_state is not None:
+                _store(_fan_days(previous_state, db_object))
+
+    await _run(work)
+    cache.latest.update(db_object)
+    if isinstance(db_object, User):
+        cache.users.invalidate(db_object.username)
+
+async def bulk_store(db_objects: list) -> int:
+    """
+    Speichert viele neue Objekte in einer Transaktion.
+
+    :return: Anzahl gespeicherter Objekte
+    """
+    def work():
+        with _connection:
+            _store(db_objects)
+
+    await _run(work)
+    for db_object in db_objects:
+        cache.latest.update(db_object)
+    return len(db_objects)
+
+async def get_fan_days(start: date, end: date) -> list[FanDay]:
+    """Tageswerte der Lüfterauswertung von start bis end (einschließlich), Tage ohne Status fehlen."""
+    return await _run(functools.partial(
+        _documents, FanDay, "key BETWEEN ? AND ?", (start.isoformat(), end.isoformat()), order="key",
+    ))
+
+async def get_stations() -> list[Station]:
+    return await _run(functools.partial(_documents, Station, order="key"))
+
+async def save_station(station: Station) -> Station:
+    """Legt eine Station an oder ersetzt die Station mit demselben Namen."""
+    def work():
+        existing = _first_or_none(_documents(Station, "key = ?", (station.name,)))
+        station.Id = existing.Id if existing is not None else None
+        with _connection:
+            _store([station])
+        return station
+
+    return await _run(work)
+
+async def delete_station(name: str) -> bool:
+    return await _run(_delete_documents, Station, "key = ?", (name,)) > 0
+
+async def get_station_readings(name: str, start: datetime, end: datetime) -> list[StationReading]:
+    return await _run(_documents, StationReading, "key = ? AND timestamp BETWEEN ? AND ?", (name, _ts(start), _ts(end)))
+
+async def _load_zone_states():
+    zones = {station.zone for station in await get_stations()}
+
+    def work():
+        return [
+            _first_or_none(_documents(ZoneState, "key = ?", (zone,), order="timestamp DESC", limit=1))
+            for zone in zones
+        ]
+
+    for zone_state in await _run(work):
+        if zone_state is not None:
+            cache.latest.update(zone_state)
+
+async def get_zone_states() -> list[ZoneState]:
+    return sorted(cache.latest.zones.values(), key=lambda z: z.zone)
+
+async def get_user(username: str) -> User | None:
+    return _first_or_none(await _run(_documents, User, "key = ?", (username,)))
+
+async def count_users() -> int:
+    def work():
+        return _connection.execute(
+            "SELECT count(*) FROM documents WHERE collection = ?", (COLLECTIONS[User][0],)
+        ).fetchone()[0]
+
+    return await _run(work)
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from dependencies.metrics import STATION_FETCH_LATENCY, STATION_FETCH_FAILURES
+from dependencies.models import Station, StationReading
+from dependencies.timestamps import as_utc
+
+# Zeitlimits pro Messstation. Der DHT22 braucht für eine Messung bis zu ~2s,
+# alles darüber deutet auf eine hängende Station hin.
+CONNECT_TIMEOUT = 3.0
+READ_TIMEOUT = 8.0
+
+# Wiederholungen pro Abruf (zusätzlich zum ersten Versuch).
+RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+# Nach so vielen fehlgeschlagenen Abrufen in Folge wird die Station für
+# FAIL_COOLDOWN Sekunden gar nicht mehr angefragt (fast-fail).
+FAIL_THRESHOLD = 3
+FAIL_COOLDOWN = 120.0
+
+# Höchstens so viele Stationen werden gleichzeitig abgefragt
+POLL_CONCURRENCY = int(os.getenv("STATION_POLL_CONCURRENCY", "8"))
+# Obergrenze für einen Abruf einschließlich aller Wiederholungen
+POLL_DEADLINE = 20.0
+
+# Ältere Messwerte einer Push-Station zählen nicht mehr für die Lüfterentscheidung (Sekunden)
+PUSH_STATION_MAX_AGE = float(os.getenv("PUSH_STATION_MAX_AGE", "3600"))
+
+client: httpx.AsyncClient | None = None
+_poll_slots = asyncio.Semaphore(POLL_CONCURRENCY)
+
+
+class StationError(Exception):
+    pass
+
+
+class StationUnavailable(StationError):
+    pass
+
+
+class _StationHealth:
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+    def check(self, address: str):
+        if self.open_until > time.monotonic():
+            raise StationUnavailable(f"Messstation {address} wird nach wiederholten Fehlern vorübergehend übersprungen.")
+
+    def success(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= FAIL_THRESHOLD:
+            self.open_until = time.monotonic() + FAIL_COOLDOWN
+
+
+_health: dict[str, _StationHealth] = {}
+
+
+async def init():
+    global client
+    client = httpx.AsyncClient(
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=POLL_CONCURRENCY + 2, max_keepalive_connections=POLL_CONCURRENCY + 2),
+    )
+
+
+async def close():
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
+
+
+async def fetch_station(address: str) -> dict:
+    """
+    Holt einen Messwert von einer Messstation.
+
+    Nutzt den gemeinsamen Client, wiederholt fehlgeschlagene Abrufe bis zu RETRIES mal
+    und überspringt Stationen, die zuletzt mehrfach nicht erreichbar waren.
+
+    :raises StationError: Die Station hat keinen gültigen Messwert geliefert.
+    """
+    # Der Client wird erst beim ersten Abruf angelegt, das Laden der Zertifikate verzögert sonst den Start
+    if client is None:
+        await init()
+
+    health = _health.setdefault(address, _StationHealth())
+    health.check(address)
+
+    params = {"auth": os.environ["MEASURE_STATION_AUTHENTICATION"]}
+    last_error: Exception | None = None
+    for attempt in range(RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(RETRY_BACKOFF * attempt)
+        try:
+            response = await client.get(address, params=params)
+            response.raise_for_status()
+            data = response.json()
+            result = {"temp": float(data["temp"]), "humid": float(data["humid"])}
+        except httpx.HTTPStatusError as e:
+            last_error = e
+            # Fehler auf Client-Seite (z.B. falsche Authentifizierung) werden durch Wiederholen nicht besser.
+            if e.response.status_code < 500:
+                break
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+            last_error = e
+        else:
+            health.success()
+            return result
+
+    health.failure()
+    raise StationError(f"Messstation {address} konnte nicht abgefragt werden: {last_error!r}") from last_error
+
+
+async def poll_station(address: str) -> dict:
+    """fetch_station mit globaler Begrenzung der gleichzeitigen Abrufe und fester Obergrenze für die Dauer."""
+    async with _poll_slots:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(fetch_station(address), POLL_DEADLINE)
+        except (StationError, asyncio.TimeoutError) as e:
+            STATION_FETCH_LATENCY.labels("error").observe(time.perf_counter() - started)
+            STATION_FETCH_FAILURES.labels(address).inc()
+            if isinstance(e, asyncio.TimeoutError):
+                raise StationError(f"Messstation {address} hat nicht rechtzeitig geantwortet.") from e
+            raise
+        STATION_FETCH_LATENCY.labels("ok").observe(time.perf_counter() - started)
+        return result
+
+
+async def fetch_indoor_outdoor(indoor_address: str, outdoor_address: str) -> tuple[dict, dict]:
+    """Fragt Innen- und Außenstation gleichzeitig ab."""
+    indoor, outdoor = await asyncio.gather(
+        poll_station(indoor_address),
+        poll_station(outdoor_address),
+    )
+    return indoor, outdoor
+
+
+async def poll_all(addresses: dict[str, str]) -> dict[str, dict | StationError]:
+    """
+    Fragt alle Stationen gleichzeitig ab, höchstens POLL_CONCURRENCY auf einmal.
+
+    :param addresses: Name der Station -> Adresse
+    :return: Name der Station -> Messwert oder Fehler
+    """
+    results = await asyncio.gather(
+        *(poll_station(address) for address in addresses.values()),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, StationError):
+            raise result
+    return dict(zip(addresses.keys(), results))
+
+
+def recent_pushed(
+    registry: list[Station], latest: dict[str, StationReading], now: datetime,
+) -> list[StationReading]:
+    """
+    Neueste Messwerte der Push-Stationen, sofern sie höchstens PUSH_STATION_MAX_AGE alt sind.
+
+    Schickt eine Station nichts mehr, entscheidet ihre Zone sonst dauerhaft nach dem letzten Messwert.
+
+    :param latest: Name der Station -> neuester Messwert
+    """
+    cutoff = as_utc(now) - timedelta(seconds=PUSH_STATION_MAX_AGE)
+    return [
+        latest[station.name]
+        for station in registry
+        if station.push and station.name in latest and as_utc(latest[station.name].timestamp) >= cutoff
+    ]
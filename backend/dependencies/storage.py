@@ -0,0 +1,240 @@
+"""
+Speicherschnittstelle der Anwendung.
+
+Routen und Cronjobs rufen die Funktionen aus Storage über dieses Modul auf (storage.get_state() usw.).
+Welches Backend dahinter liegt, bestimmt STORAGE_BACKEND:
+
+- raven (Standard): RavenDB-Server, siehe dependencies.raven_db
+- sqlite: eine lokale SQLite-Datei (SQLITE_PATH), siehe dependencies.sqlite_db
+
+Das Backend wird erst beim ersten Zugriff ausgewählt und importiert. Die Backends stellen nur Lese- und
+Schreibzugriffe bereit; was für beide gleich ist (Settings, Standardstatus, Benutzer, Ablauf der
+Aufbewahrungsfristen), steht hier.
+"""
+import functools
+import importlib
+import inspect
+import logging
+import os
+import time
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, Protocol
+
+from dependencies import cache, retention
+from dependencies.timestamps import as_utc
+from dependencies.metrics import DB_LATENCY
+from dependencies.models import Settings, State, Reading, ReadingAggregate, Station, StationReading, ZoneState, \
+    FanDay
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {
+    "raven": "dependencies.raven_db",
+    "sqlite": "dependencies.sqlite_db",
+}
+
+
+class TooManySettings(Exception):
+    pass
+
+
+class TooFewSettings(Exception):
+    pass
+
+
+class Storage(Protocol):
+    """Funktionen, die jedes Backend als Modulfunktionen bereitstellt."""
+    async def init(self): ...
+    async def close(self): ...
+
+    async def get_settings(self) -> list[Settings]: ...
+
+    async def get_state(self) -> State | None: ...
+
+    async def get_latest_reading(self) -> Reading | None: ...
+    async def get_readings(self, start: datetime, end: datetime) -> list[Reading]: ...
+    async def get_readings_version(self, start: datetime, end: datetime) -> tuple[datetime | None, int]: ...
+    def stream_readings(self, start: datetime, end: datetime, chunk_size: int = 500) -> AsyncIterator[list[Reading]]: ...
+    async def get_history(self, start: datetime, end: datetime) -> list[Reading]: ...
+    async def get_reading_aggregates(self, resolution: str, start: datetime, end: datetime) -> list[ReadingAggregate]: ...
+    async def compact_oldest_day(self, cutoff: datetime) -> int: ...
+    async def delete_hourly_rollups(self, before: datetime): ...
+    async def delete_states(self, before: datetime, keep: str | None): ...
+    async def delete_station_readings(self, before: datetime): ...
+    async def delete_zone_states(self, before: datetime, keep: dict[str, datetime]): ...
+
+    async def store_object(self, db_object): ...
+    async def bulk_store(self, db_objects: list) -> int: ...
+
+    async def get_fan_days(self, start: date, end: date) -> list[FanDay]: ...
+
+    async def get_stations(self) -> list[Station]: ...
+    async def save_station(self, station: Station) -> Station: ...
+    async def delete_station(self, name: str) -> bool: ...
+    async def get_station_readings(self, name: str, start: datetime, end: datetime) -> list[StationReading]: ...
+    async def get_zone_states(self) -> list[ZoneState]: ...
+
+    async def get_user(self, username: str): ...
+    async def count_users(self) -> int: ...
+
+
+_backend: Storage | None = None
+# Name -> gemessene Funktion des aktuellen Backends
+_timed: dict[str, object] = {}
+
+
+def use(backend: Storage):
+    """Setzt das Backend, z.B. für Benchmarks."""
+    global _backend
+    _backend = backend
+    _timed.clear()
+
+
+def backend() -> Storage:
+    if _backend is None:
+        name = os.getenv("STORAGE_BACKEND", "raven")
+        if name not in BACKENDS:
+            raise ValueError(f"Unbekanntes STORAGE_BACKEND {name!r}, möglich sind: {', '.join(BACKENDS)}")
+        use(importlib.import_module(BACKENDS[name]))
+    return _backend
+
+
+def _measure(backend_name: str, name: str, fn):
+    """Misst die Dauer einer async-Funktion des Backends in metrics.DB_LATENCY."""
+    histogram = DB_LATENCY.labels(backend_name, name)
+
+    @functools.wraps(fn)
+    async def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return timed
+
+
+def __getattr__(name: str):
+    timed = _timed.get(name)
+    if timed is not None:
+        return timed
+
+    current = backend()
+    attribute = getattr(current, name)
+    if not inspect.iscoroutinefunction(attribute):
+        return attribute
+    timed = _timed[name] = _measure(getattr(current, "__name__", type(current).__name__).rsplit(".", 1)[-1], name, attribute)
+    return timed
+
+
+def _call(name: str):
+    # Globale Namen laufen nicht über __getattr__, die Funktionen hier holen sich das Backend deshalb selbst
+    return __getattr__(name)
+
+
+async def get_app_settings() -> Settings:
+    db_settings = await _call("get_settings")()
+    if len(db_settings) < 1:
+        raise TooFewSettings()
+    if len(db_settings) > 1:
+        raise TooManySettings()
+
+    return db_settings[0]
+
+
+async def get_create_app_settings() -> Settings:
+    try:
+        settings = await get_app_settings()
+    except TooFewSettings:
+        settings = Settings(
+            dht22_indoor_address="",
+            dht22_outdoor_address="",
+            data_cron="*/30 * * * *",
+            fan_override_duration=0,
+        )
+        await _call("store_object")(settings)
+    except TooManySettings:
+        logger.error("Mehr als ein Settings-Dokument in der Datenbank.")
+        raise Exception("Too many settings in database.")
+
+    return settings
+
+
+async def save_settings(new_settings: Settings):
+    old_settings = await get_create_app_settings()
+    if old_settings.Id is None:
+        raise RuntimeError("Settings Error")
+
+    new_settings.Id = old_settings.Id
+    await _call("store_object")(new_settings)
+
+
+async def ensure_state():
+    """Legt einen ausgeschalteten Lüfterstatus an, falls noch keiner gespeichert ist. Die Backends rufen das beim Start auf."""
+    state = await _call("get_state")()
+    if state is not None:
+        logger.info("Lüfterstatus geladen: %s", state)
+    else:
+        logger.info("Kein Lüfterstatus vorhanden, lege einen neuen an.")
+        state = State(
+            fan_running=False,
+            fan_override=None,
+            timestamp=datetime.now(tz=timezone.utc),
+        )
+        await _call("store_object")(state)
+
+
+async def add_user(username, password_hash, full_name, email):
+    # routes.auth importiert dieses Modul
+    from routes.auth import User
+
+    user = User(
+        username=username,
+        hashed_password=password_hash,
+        full_name=full_name,
+        disabled=False,
+        email=email,
+    )
+    await _call("store_object")(user)
+
+
+async def compact_readings(now: datetime | None = None) -> dict:
+    """
+    Wendet die Aufbewahrungsfristen aus dependencies.retention an.
+
+    Messwerte vor retention.raw_cutoff werden tageweise zu Stunden- und Tageswerten zusammengefasst und
+    gelöscht, Stundenwerte vor retention.hourly_cutoff und Lüfterstatus vor retention.state_cutoff
+    werden gelöscht. Der aktuelle Lüfterstatus bleibt immer erhalten. Messwerte registrierter Stationen
+    und Entscheidungen pro Zone vor retention.station_cutoff werden gelöscht, bis auf die aktuelle
+    Entscheidung jeder Zone.
+
+    :return: Anzahl zusammengefasster Messwerte und verwendete Grenzen
+    """
+    raw_cutoff = retention.raw_cutoff(now)
+    hourly_cutoff = retention.hourly_cutoff(now)
+    state_cutoff = retention.state_cutoff(now)
+    station_cutoff = retention.station_cutoff(now)
+
+    # Jeder Tag wird für sich gespeichert, ein abgebrochener Lauf macht beim nächsten Mal weiter
+    compacted = 0
+    while removed := await _call("compact_oldest_day")(raw_cutoff):
+        compacted += removed
+
+    await _call("delete_hourly_rollups")(hourly_cutoff)
+
+    state = await _call("get_state")()
+    await _call("delete_states")(state_cutoff, state.Id if state is not None else None)
+
+    await _call("delete_station_readings")(station_cutoff)
+    await _call("delete_zone_states")(station_cutoff, {
+        zone: min(as_utc(zone_state.timestamp), as_utc(station_cutoff))
+        for zone, zone_state in cache.latest.zones.items()
+    })
+
+    return {
+        "compacted": compacted,
+        "rawCutoff": raw_cutoff.isoformat(),
+        "hourlyCutoff": hourly_cutoff.isoformat(),
+        "stateCutoff": state_cutoff.isoformat(),
+        "stationCutoff": station_cutoff.isoformat(),
+    }
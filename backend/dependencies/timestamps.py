@@ -0,0 +1,20 @@
+"""
+Zeitstempel ohne Zeitzone sind in der ganzen Anwendung UTC: so werden sie gespeichert und so liefern
+beide Backends sie zurück. Vergleiche zwischen gespeicherten und neuen Zeitstempeln gehen über diese
+Funktionen.
+"""
+from datetime import datetime, timezone
+
+
+def as_utc(timestamp: datetime) -> datetime:
+    """Zeitstempel mit Zeitzone UTC."""
+    if timestamp.tzinfo:
+        return timestamp.astimezone(timezone.utc)
+    return timestamp.replace(tzinfo=timezone.utc)
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """Zeitstempel in UTC ohne Zeitzone, wie er in der Datenbank steht."""
+    if timestamp.tzinfo:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
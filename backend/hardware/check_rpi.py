@@ -1,6 +1,9 @@
+import functools
 import io
 
 
+# Die Hardware ändert sich zur Laufzeit nicht, die Datei wird nur beim ersten Aufruf gelesen
+@functools.cache
 def is_raspberrypi():
     try:
         with io.open('/sys/firmware/devicetree/base/model', 'r') as m:
@@ -1,8 +1,11 @@
+import logging
 import random
 import time
 
 from hardware.check_rpi import is_raspberrypi
 
+logger = logging.getLogger(__name__)
+
 
 if is_raspberrypi():
     import adafruit_dht
@@ -16,17 +19,23 @@ class DHT:
         pin = getattr(board, f"D{gpio}")
         self.sensor = adafruit_dht.DHT22(pin)
 
-    def get_data(self):
+    def read(self):
+        """Ein einzelner Leseversuch ohne Wiederholung."""
         if not is_raspberrypi():
             return random.randint(15, 30), random.randint(60, 100)
 
+        temperature = self.sensor.temperature
+        humidity = self.sensor.humidity
+        if temperature is None or humidity is None:
+            raise RuntimeError("DHT22 lieferte keinen Messwert.")
+        return temperature, humidity
+
+    def get_data(self):
         for i in range(10):
             try:
-                temperature = self.sensor.temperature
-                humidity = self.sensor.humidity
-                return temperature, humidity
+                return self.read()
             except Exception as e:
-                print("Warn: DHT22 Error:", e.args)
+                logger.warning("DHT22 Error: %s", e.args)
             time.sleep(1)
 
         raise Exception("Kommunikation mit dem DHT22 fehlgeschlagen.")
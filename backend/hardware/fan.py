@@ -17,10 +17,7 @@ class Fan:
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(gpio, GPIO.OUT)
 
-        if GPIO.input(gpio):
-            running = True
-        else:
-            running = False
+        self.running = bool(GPIO.input(gpio))
 
     def on(self):
         self.running = True
@@ -1,11 +1,15 @@
+import logging
 import os
 import shutil
 import subprocess
 from dataclasses import dataclass
+from datetime import datetime, timezone
 from ipaddress import ip_interface
+from typing import Literal
 
 from hardware.check_rpi import is_raspberrypi
 
+logger = logging.getLogger(__name__)
 
 TRUE_VALUES = {"1", "true", "yes", "on"}
 FALSE_VALUES = {"0", "false", "no", "off"}
@@ -21,56 +25,77 @@ class HotspotConfig:
     address: str
 
 
+@dataclass
+class HotspotStatus:
+    """
+    Stand des Hotspot-Starts, abrufbar über /system/hotspot/
+
+    Attributes:
+        state (str): pending (noch nicht begonnen), starting, started, skipped (nicht vorgesehen) oder failed
+        message (str): Letzte Meldung, z.B. der Grund für skipped oder failed
+        updated (datetime | None): Zeitpunkt der letzten Änderung (UTC)
+    """
+    state: Literal["pending", "starting", "started", "skipped", "failed"] = "pending"
+    message: str = ""
+    updated: datetime | None = None
+
+
+status = HotspotStatus()
+
+
+def _report(state: str, message: str, level: int = logging.INFO) -> bool:
+    status.state, status.message, status.updated = state, message, datetime.now(tz=timezone.utc)
+    logger.log(level, message)
+    return state == "started"
+
+
 def ensure_hotspot_started() -> bool:
+    """
+    Richtet den Hotspot per nmcli ein und startet ihn. Blockiert bis zu einigen nmcli-Timeouts,
+    das Backend ruft es deshalb im Hintergrund auf. Das Ergebnis steht zusätzlich in status.
+    """
     if not is_raspberrypi():
-        print("Hotspot wird nicht gestartet: kein Raspberry Pi erkannt.")
-        return False
+        return _report("skipped", "Hotspot wird nicht gestartet: kein Raspberry Pi erkannt.")
 
     config = _load_config()
     if not config.enabled:
-        print("Hotspot ist deaktiviert.")
-        return False
+        return _report("skipped", "Hotspot ist deaktiviert.")
 
     if not config.ssid:
-        print("Hotspot wird nicht gestartet: HOTSPOT_SSID ist leer.")
-        return False
+        return _report("skipped", "Hotspot wird nicht gestartet: HOTSPOT_SSID ist leer.", logging.WARNING)
 
     if not config.interface:
-        print("Hotspot wird nicht gestartet: HOTSPOT_INTERFACE ist leer.")
-        return False
+        return _report("skipped", "Hotspot wird nicht gestartet: HOTSPOT_INTERFACE ist leer.", logging.WARNING)
 
     if not config.connection_name:
-        print("Hotspot wird nicht gestartet: HOTSPOT_CONNECTION_NAME ist leer.")
-        return False
+        return _report("skipped", "Hotspot wird nicht gestartet: HOTSPOT_CONNECTION_NAME ist leer.", logging.WARNING)
 
     if not _is_valid_address(config.address):
-        print("Hotspot wird nicht gestartet: HOTSPOT_ADDRESS muss eine CIDR-Adresse sein.")
-        return False
+        return _report(
+            "skipped", "Hotspot wird nicht gestartet: HOTSPOT_ADDRESS muss eine CIDR-Adresse sein.", logging.WARNING,
+        )
 
     if not config.password or len(config.password) < 8:
-        print(
-            "Hotspot wird nicht gestartet: "
-            "HOTSPOT_PASSWORD muss mindestens 8 Zeichen haben."
+        return _report(
+            "skipped", "Hotspot wird nicht gestartet: HOTSPOT_PASSWORD muss mindestens 8 Zeichen haben.", logging.WARNING,
         )
-        return False
 
     if not shutil.which("nmcli"):
-        print("Hotspot wird nicht gestartet: nmcli wurde nicht gefunden.")
-        return False
+        return _report("skipped", "Hotspot wird nicht gestartet: nmcli wurde nicht gefunden.", logging.WARNING)
 
+    _report("starting", f"Hotspot {config.ssid} wird gestartet.")
     try:
         _ensure_connection(config)
         _run_nmcli(["connection", "up", config.connection_name])
     except subprocess.CalledProcessError as error:
         error_message = error.stderr.strip() or str(error)
-        print(f"Hotspot konnte nicht gestartet werden: {error_message}")
-        return False
+        return _report("failed", f"Hotspot konnte nicht gestartet werden: {error_message}", logging.ERROR)
     except subprocess.TimeoutExpired:
-        print("Hotspot konnte nicht gestartet werden: nmcli Timeout.")
-        return False
+        return _report("failed", "Hotspot konnte nicht gestartet werden: nmcli Timeout.", logging.ERROR)
+    except OSError as error:
+        return _report("failed", f"Hotspot konnte nicht gestartet werden: {error}", logging.ERROR)
 
-    print(f"Hotspot '{config.ssid}' ist gestartet.")
-    return True
+    return _report("started", f"Hotspot {config.ssid} ist gestartet.")
 
 
 def _load_config() -> HotspotConfig:
@@ -94,10 +119,7 @@ def _parse_bool(value: str | None, default: bool) -> bool:
     if normalized in FALSE_VALUES:
         return False
 
-    print(
-        f"Ungueltiger Boolean-Wert fuer HOTSPOT_ENABLED: "
-        f"'{value}'. Nutze Standardwert."
-    )
+    logger.warning("Ungueltiger Boolean-Wert fuer HOTSPOT_ENABLED: %r. Nutze Standardwert.", value)
     return default
 
 
@@ -0,0 +1,116 @@
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+from hardware.dht22 import DHT
+
+logger = logging.getLogger(__name__)
+
+# Messbereich des DHT22, Werte außerhalb sind Übertragungsfehler
+TEMP_RANGE = (-40.0, 80.0)
+HUMID_RANGE = (0.0, 100.0)
+
+# Abweichung vom Median in Vielfachen der mittleren absoluten Abweichung (MAD), ab der ein Wert als Ausreißer gilt
+OUTLIER_FACTOR = 3.0
+# Untergrenze für die MAD, damit bei sehr ruhigen Werten nicht jede kleine Änderung als Ausreißer gilt
+MIN_MAD = (0.2, 1.0)
+
+
+@dataclass(frozen=True)
+class Sample:
+    timestamp: float
+    temp: float
+    humid: float
+
+
+class Sampler:
+    """
+    Liest den DHT22 in einem Hintergrund-Thread in festen Abständen aus.
+
+    Die letzten Messwerte liegen in einem Ringpuffer. latest() liefert sofort einen gefilterten Wert
+    (Median der letzten Messwerte ohne Ausreißer), ohne auf den Sensor zu warten.
+    """
+    def __init__(
+        self,
+        dht: DHT,
+        interval: float,
+        buffer_size: int,
+        window: int,
+        on_sample: Callable[["Sample"], None] | None = None,
+    ):
+        """
+        :param on_sample: Wird im Sampler-Thread mit jedem gültigen Messwert aufgerufen
+        """
+        self.dht = dht
+        self.on_sample = on_sample
+        self.interval = interval
+        self.window = window
+        self.samples: deque[Sample] = deque(maxlen=buffer_size)
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dht22-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                temp, humid = self.dht.read()
+                if not (TEMP_RANGE[0] <= temp <= TEMP_RANGE[1] and HUMID_RANGE[0] < humid <= HUMID_RANGE[1]):
+                    raise ValueError(f"Unplausibler Messwert: {temp} °C, {humid} %")
+            except Exception as e:
+                self.errors += 1
+                logger.warning("DHT22 Error: %s", e.args)
+            else:
+                sample = Sample(time.time(), float(temp), float(humid))
+                with self._lock:
+                    self.samples.append(sample)
+                if self.on_sample is not None:
+                    try:
+                        self.on_sample(sample)
+                    except Exception as e:
+                        logger.warning("Messwert konnte nicht weitergegeben werden: %r", e)
+
+            self._stop.wait(self.interval)
+
+    def latest(self) -> tuple[Sample, int] | None:
+        """
+        Gefilterter aktueller Messwert.
+
+        :return: (Messwert mit Zeitstempel der neuesten Messung, Anzahl der eingeflossenen Messungen)
+            oder None, wenn noch nicht gemessen wurde
+        """
+        with self._lock:
+            recent = list(self.samples)[-self.window:]
+
+        if not recent:
+            return None
+
+        temps = _without_outliers([s.temp for s in recent], MIN_MAD[0])
+        humids = _without_outliers([s.humid for s in recent], MIN_MAD[1])
+
+        sample = Sample(
+            timestamp=recent[-1].timestamp,
+            temp=round(statistics.median(temps), 1),
+            humid=round(statistics.median(humids), 1),
+        )
+        return sample, min(len(temps), len(humids))
+
+
+def _without_outliers(values: list[float], min_mad: float) -> list[float]:
+    if len(values) < 3:
+        return values
+
+    median = statistics.median(values)
+    mad = max(statistics.median(abs(v - median) for v in values), min_mad)
+    return [v for v in values if abs(v - median) <= OUTLIER_FACTOR * mad]
@@ -0,0 +1,138 @@
+import gzip
+import json
+import logging
+import sqlite3
+import threading
+
+import httpx
+
+from hardware.sampler import Sample
+
+logger = logging.getLogger(__name__)
+
+# Obergrenze für die lokale Warteschlange. Bei längeren Ausfällen werden die ältesten Messwerte verworfen.
+MAX_QUEUED = 500_000
+# Längste Wartezeit zwischen zwei Versuchen, wenn das Backend nicht erreichbar ist
+MAX_BACKOFF = 600.0
+
+
+class SampleQueue:
+    """
+    Persistente Warteschlange für Messwerte in einer SQLite-Datei.
+
+    Messwerte bleiben gespeichert, bis das Backend sie bestätigt hat, und überstehen so auch einen
+    Neustart der Messstation.
+    """
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS samples ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp REAL NOT NULL, temp REAL NOT NULL, humid REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def append(self, sample: Sample):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO samples (timestamp, temp, humid) VALUES (?, ?, ?)",
+                (sample.timestamp, sample.temp, sample.humid),
+            )
+            self._db.execute(
+                "DELETE FROM samples WHERE id <= (SELECT MAX(id) FROM samples) - ?",
+                (MAX_QUEUED,),
+            )
+            self._db.commit()
+
+    def peek(self, limit: int) -> list[tuple[int, float, float, float]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, timestamp, temp, humid FROM samples ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+    def remove_up_to(self, last_id: int):
+        with self._lock:
+            self._db.execute("DELETE FROM samples WHERE id <= ?", (last_id,))
+            self._db.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Uploader:
+    """
+    Schickt die Messwerte aus der Warteschlange in gzip-komprimierten NDJSON-Blöcken an das Backend.
+
+    Nach einem Ausfall wird der Rückstau Block für Block abgearbeitet, bis die Warteschlange leer ist.
+    Schlägt ein Upload fehl, wird mit wachsendem Abstand erneut versucht.
+    """
+    def __init__(self, queue: SampleQueue, url: str, station: str, auth: str, interval: float, batch_size: int):
+        self.queue = queue
+        self.url = url
+        self.station = station
+        self.auth = auth
+        self.interval = interval
+        self.batch_size = batch_size
+        self.uploaded = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sample-uploader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=30)
+
+    def _run(self):
+        backoff = self.interval
+        with httpx.Client(timeout=httpx.Timeout(30.0, connect=5.0)) as client:
+            while not self._stop.is_set():
+                try:
+                    drained = self._upload_pending(client)
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning("Upload fehlgeschlagen: %r", e)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                else:
+                    backoff = self.interval
+                    if not drained:
+                        # Rückstau: nächsten Block sofort senden
+                        continue
+
+                self._stop.wait(backoff)
+
+    def _upload_pending(self, client: httpx.Client) -> bool:
+        """
+        Sendet einen Block.
+
+        :return: True, wenn die Warteschlange danach leer ist
+        """
+        rows = self.queue.peek(self.batch_size)
+        if not rows:
+            return True
+
+        body = "".join(
+            json.dumps({"station": self.station, "timestamp": timestamp, "temp": temp, "humid": humid}) + "\n"
+            for _, timestamp, temp, humid in rows
+        )
+        response = client.post(
+            self.url,
+            params={"auth": self.auth},
+            content=gzip.compress(body.encode("utf-8")),
+            headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+        )
+        response.raise_for_status()
+
+        self.queue.remove_up_to(rows[-1][0])
+        self.uploaded += len(rows)
+        return len(rows) < self.batch_size
@@ -1,7 +1,9 @@
+import logging
 import os
 
 from dotenv import load_dotenv
 
+from dependencies.metrics import FAN_SWITCHES
 from dependencies.models import State, FanStatus
 from hardware.check_rpi import is_raspberrypi
 from hardware.fan import Fan
@@ -9,11 +11,13 @@ from hardware.hotspot import ensure_hotspot_started
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 fan_gpio = os.getenv("FAN_GPIO")
 try:
     fan_gpio = int(fan_gpio)
 except ValueError:
-    print("Fan GPIO must be an integer.")
+    logger.error("FAN_GPIO muss eine Zahl sein.")
     exit(1)
 
 fan = Fan(fan_gpio)
@@ -21,9 +25,13 @@ fan = Fan(fan_gpio)
 if is_raspberrypi():
     import RPi.GPIO as GPIO
 
+# Zuletzt geschalteter Zustand, für FAN_SWITCHES
+_running: bool | None = None
+
 def sync_state(state: FanStatus|State):
-    print("Syncing state to hardware.")
-    print("State:", state.model_dump_json(by_alias=True))
+    global _running
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Lüfterstatus wird übernommen: %s", state.model_dump_json(by_alias=True))
 
     if isinstance(state, FanStatus):
         run = state.running
@@ -32,6 +40,10 @@ def sync_state(state: FanStatus|State):
     else:
         raise ValueError("Invalid state type")
 
+    if _running is not None and run != _running:
+        FAN_SWITCHES.inc()
+    _running = run
+
     if not run:
         fan.on()
     else:
@@ -41,7 +53,7 @@ def start_hotspot():
     return ensure_hotspot_started()
 
 def shutdown():
-    print("Shutting down hardware")
+    logger.info("Hardware wird heruntergefahren.")
 
     if is_raspberrypi():
         GPIO.cleanup()
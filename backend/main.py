@@ -1,20 +1,27 @@
+import asyncio
+import logging
 import os
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 
-import requests
 from dotenv import load_dotenv
 from fastapi import WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.websockets import WebSocketDisconnect
 
 import hardware
-from dependencies import raven_db, calculations
-from dependencies.app import app, crons_app, wsmanager, update_fan_override_cron
-from dependencies.models import Reading, State, ReadingWithDewPoint
-from routes import readings, fan, settings, auth, insert
+from dependencies import storage, calculations, stations, cache, metrics, fan_control
+from dependencies.app import app, crons_app, wsmanager
+from dependencies.models import Reading, Settings, StationReading
+from routes import readings, fan, settings, auth, insert, system, stations as stations_routes
 
 load_dotenv()
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
 auth.init()
 
 app.include_router(readings.router, prefix="/readings")
@@ -22,6 +29,8 @@ app.include_router(fan.router, prefix="/fan")
 app.include_router(settings.router, prefix="/settings")
 app.include_router(auth.router, prefix="/auth")
 app.include_router(insert.router, prefix="/insert")
+app.include_router(system.router, prefix="/system")
+app.include_router(stations_routes.router, prefix="/stations")
 
 origins = [
     "*"
@@ -34,61 +43,159 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.RequestMetricsMiddleware)
+metrics.watch_websockets(wsmanager)
 
 @app.get("/")
 async def read_root():
     return {"Hello": "World"}
 
-async def generate_fan_state(reading: ReadingWithDewPoint):
-    run_fan = calculations.should_fan_run(reading.dew_point_indoor,
-                                          reading.dew_point_outdoor)
-
-    new_state = State(
-        timestamp=datetime.now(tz=timezone.utc),
-        fan_running=run_fan,
-        fan_override=None,
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Metriken im Prometheus-Textformat, siehe dependencies.metrics."""
+    return metrics.response()
+
+async def generate_fan_state(reading: Reading):
+    """
+    Automatische Lüfterentscheidung, speichert und verschickt den Status nur bei einer Änderung.
+
+    :param reading: Messwert mit gesetzten Taupunkten
+    """
+    new_state = fan_control.next_state(
+        await storage.get_state(),
+        reading.dew_point_indoor,
+        reading.dew_point_outdoor,
+        datetime.now(tz=timezone.utc),
     )
-    await raven_db.store_object(new_state)
-    hardware.util.sync_state(new_state)
-    await update_fan_override_cron(new_state)
+    if new_state is None:
+        return
 
-@crons_app.cron("*/30 * * * *", name="get-data")
-async def get_data_cron():
-    print("Daten werden geholt")
+    await storage.store_object(new_state)
+    hardware.util.sync_state(new_state)
+    await wsmanager.publish_state(new_state)
+    fan_control.override_timer.arm(new_state)
 
-    db_settings = await raven_db.get_app_settings()
+async def collect_default_zone(db_settings: Settings):
+    """Messwerte der beiden Stationen aus den Settings, steuert den Lüfter."""
+    if not db_settings.dht22_indoor_address or not db_settings.dht22_outdoor_address:
+        return
 
-    indoor = requests.get(db_settings.dht22_indoor_address+"?auth="+os.environ["MEASURE_STATION_AUTHENTICATION"]).json()
-    outdoor = requests.get(db_settings.dht22_outdoor_address+"?auth="+os.environ["MEASURE_STATION_AUTHENTICATION"]).json()
+    try:
+        indoor, outdoor = await stations.fetch_indoor_outdoor(
+            db_settings.dht22_indoor_address,
+            db_settings.dht22_outdoor_address,
+        )
+    except stations.StationError as e:
+        logger.warning("Daten konnten nicht geholt werden: %s", e)
+        return
 
-    reading = Reading(
+    reading = calculations.with_dew_points(Reading(
         timestamp=datetime.now(tz=timezone.utc),
         indoor_temp=indoor["temp"],
         outdoor_temp=outdoor["temp"],
         indoor_humidity=indoor["humid"],
         outdoor_humidity=outdoor["humid"],
-    )
-    await raven_db.store_object(reading)
+    ))
+    await storage.store_object(reading)
+    await wsmanager.publish_reading(reading)
 
-    state = await raven_db.get_state()
-    if state.fan_override is None or not state.fan_override:
-        reading_with_dew_point = calculations.append_dew_points(reading)
-        await generate_fan_state(reading_with_dew_point)
+    if not fan_control.override_active(await storage.get_state(), reading.timestamp):
+        await generate_fan_state(reading)
 
-@crons_app.cron("* * * * *", name="fan-override")
-async def fan_override_cron():
-    state = await raven_db.get_state()
-    if state.fan_override is None:
+async def collect_registered_stations():
+    """Messwerte aller registrierten Stationen, Lüfterentscheidung pro Zone."""
+    registry = [station for station in await storage.get_stations() if station.enabled]
+    if not registry:
         return
-    if state.fan_override.timestamp() < (datetime.now(tz=timezone.utc) + timedelta(seconds=10)).timestamp():
-        current = await readings.current()
-        await generate_fan_state(current)
 
-@app.websocket("/ws/")
-async def websocket_endpoint(websocket: WebSocket):
-    await wsmanager.connect(websocket)
-    while True:
+    results = await stations.poll_all({station.name: station.address for station in registry if not station.push})
+    now = datetime.now(tz=timezone.utc)
+
+    station_readings: list[StationReading] = []
+    # Push-Stationen haben ihre Messwerte bereits selbst gespeichert, für die Entscheidung zählt der neueste
+    pushed = stations.recent_pushed(registry, cache.latest.stations, now)
+    for station in registry:
+        if station.push:
+            continue
+        result = results[station.name]
+        if isinstance(result, stations.StationError):
+            logger.warning("Daten konnten nicht geholt werden: %s", result)
+            continue
         try:
-            await websocket.receive()
-        except WebSocketDisconnect:
-            wsmanager.disconnect(websocket)
+            dew_point = calculations.taupunkt(result["temp"], result["humid"])
+        except ValueError:
+            logger.warning("Ungültiger Messwert von %s: %s", station.name, result)
+            continue
+
+        station_readings.append(StationReading(
+            station=station.name,
+            zone=station.zone,
+            location=station.location,
+            timestamp=now,
+            temp=result["temp"],
+            humidity=result["humid"],
+            dew_point=dew_point,
+        ))
+
+    if station_readings:
+        await storage.bulk_store(station_readings)
+    if not station_readings and not pushed:
+        return
+
+    # Wie beim Lüfter wird eine Zone nur gespeichert, wenn sie umschaltet
+    zone_states = [
+        zone_state
+        for zone, (dp_indoor, dp_outdoor) in calculations.zone_dew_points(station_readings + pushed).items()
+        if (zone_state := fan_control.next_zone_state(cache.latest.zones.get(zone), zone, dp_indoor, dp_outdoor, now))
+    ]
+    if zone_states:
+        await storage.bulk_store(zone_states)
+        for zone_state in zone_states:
+            await wsmanager.publish("zone", zone_state)
+
+@crons_app.cron("*/30 * * * *", name="get-data")
+async def get_data_cron():
+    logger.debug("Daten werden geholt")
+
+    db_settings = await storage.get_app_settings()
+
+    await asyncio.gather(
+        collect_default_zone(db_settings),
+        collect_registered_stations(),
+    )
+
+@crons_app.cron("15 3 * * *", name="retention")
+async def retention_cron():
+    result = await storage.compact_readings()
+    logger.info("Aufbewahrungsfristen angewendet: %s", result)
+
+async def end_fan_override():
+    """Vom Override-Timer zum Ende eines Overrides aufgerufen, die Automatik übernimmt wieder."""
+    latest = await storage.get_latest_reading()
+    if latest is not None:
+        # Ältere gespeicherte Messwerte haben noch keine Taupunkte
+        calculations.fill_dew_points([latest])
+        await generate_fan_state(latest)
+
+fan_control.override_timer.on_expiry = end_fan_override
+
+metrics.instrument_crons(crons_app)
+
+@app.websocket("/ws/")
+async def websocket_endpoint(websocket: WebSocket, since: datetime | None = None, last: int | None = None):
+    """
+    Schickt neue Messwerte ({"type": "reading", ...}) und Lüfterstatus ({"type": "state", ...}) an den Client.
+
+    Direkt nach dem Verbinden werden die zuletzt gepufferten Ereignisse nachgeliefert, wahlweise nur die
+    nach `since` oder nur die letzten `last`.
+    """
+    await wsmanager.connect(websocket, since, last)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        wsmanager.disconnect(websocket)
@@ -1,5 +1,8 @@
+import logging
 import os
 import sys
+import time
+from contextlib import asynccontextmanager
 
 import uvicorn
 from dotenv import load_dotenv
@@ -7,9 +10,16 @@ from fastapi import FastAPI, HTTPException
 from starlette import status
 
 from hardware import dht22
+from hardware.sampler import Sampler
+from hardware.uploader import SampleQueue, Uploader
 
 load_dotenv()
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
 if sys.argv[1] == "INDOOR":
     gpio = os.environ["MEASURE_STATION_INDOOR_GPIO"]
 elif sys.argv[1] == "OUTDOOR":
@@ -26,18 +36,70 @@ except:
 
 dht = dht22.DHT(gpio)
 
-app = FastAPI()
+# Push-Modus: Messwerte werden lokal gepuffert und gesammelt an das Backend geschickt.
+# Ohne MEASURE_STATION_PUSH_URL fragt nur das Backend über /get/ ab.
+push_url = os.getenv("MEASURE_STATION_PUSH_URL")
+sample_queue = None
+uploader = None
+if push_url:
+    if not os.getenv("MEASURE_STATION_NAME"):
+        print("MEASURE_STATION_NAME must be set when MEASURE_STATION_PUSH_URL is used")
+        exit(1)
+
+    sample_queue = SampleQueue(os.getenv("MEASURE_STATION_QUEUE_FILE", f"station_queue_{sys.argv[1].lower()}.db"))
+    uploader = Uploader(
+        sample_queue,
+        url=push_url,
+        station=os.environ["MEASURE_STATION_NAME"],
+        auth=os.environ["MEASURE_STATION_AUTHENTICATION"],
+        interval=float(os.getenv("MEASURE_STATION_PUSH_INTERVAL", "60")),
+        batch_size=int(os.getenv("MEASURE_STATION_PUSH_BATCH", "1000")),
+    )
+
+sampler = Sampler(
+    dht,
+    interval=float(os.getenv("MEASURE_STATION_SAMPLE_INTERVAL", "5")),
+    buffer_size=int(os.getenv("MEASURE_STATION_BUFFER_SIZE", "60")),
+    window=int(os.getenv("MEASURE_STATION_FILTER_WINDOW", "5")),
+    on_sample=sample_queue.append if sample_queue is not None else None,
+)
+# Ältere Messwerte werden nicht mehr ausgeliefert, der Sensor gilt dann als ausgefallen
+max_age = float(os.getenv("MEASURE_STATION_MAX_AGE", "120"))
+
+
+@asynccontextmanager
+async def lifespan(fastapi_app: FastAPI):
+    sampler.start()
+    if uploader is not None:
+        uploader.start()
+    yield
+    sampler.stop()
+    if uploader is not None:
+        uploader.stop()
+        sample_queue.close()
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/get/")
 async def temperature(auth: str):
     if auth != os.environ["MEASURE_STATION_AUTHENTICATION"]:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
-    temp, humid = dht.get_data()
+    latest = sampler.latest()
+    if latest is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Noch kein Messwert vorhanden.")
+
+    sample, samples = latest
+    age = time.time() - sample.timestamp
+    if age > max_age:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Kein aktueller Messwert vorhanden.")
 
     return {
-        "temp": temp,
-        "humid": humid
+        "temp": sample.temp,
+        "humid": sample.humid,
+        "age": round(age, 1),
+        "samples": samples,
+        "queued": sample_queue.size() if sample_queue is not None else None,
     }
 
 if __name__ == "__main__":
@@ -1,4 +1,6 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
@@ -9,7 +11,7 @@ from jwt.exceptions import InvalidTokenError
 from pwdlib import PasswordHash
 from pydantic import BaseModel
 
-from dependencies import raven_db
+from dependencies import storage, cache
 from dependencies.models import BaseRavenDoc
 
 
@@ -44,23 +46,27 @@ class User(UserData, BaseRavenDoc):
 
 password_hash = PasswordHash.recommended()
 
+# Argon2 braucht pro Hash spürbar CPU-Zeit und Speicher. Hashing läuft deshalb in einem eigenen,
+# kleinen Threadpool, damit Logins weder den Event-Loop blockieren noch den Pi auslasten.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    thread_name_prefix="argon2",
+)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 async def verify_password(plain_password, hashed_password):
-    return password_hash.verify(plain_password, hashed_password)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, password_hash.verify, plain_password, hashed_password)
 
 async def get_password_hash(password):
-    return password_hash.hash(password)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, password_hash.hash, password)
 
 
 async def get_user(username: str):
-    with raven_db.store.open_session() as db:
-        try:
-            user = db.query(object_type=User).where_equals("username", username).first()
-        except IndexError:
-            return None
-    return user
+    return await storage.get_user(username)
 
 async def authenticate_user(username: str, password: str):
     user = await get_user(username)
@@ -94,9 +100,12 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
-    user = await get_user(token_data.username)
+    user = cache.users.get(token_data.username)
     if user is None:
-        raise credentials_exception
+        user = await get_user(token_data.username)
+        if user is None:
+            raise credentials_exception
+        cache.users.set(token_data.username, user)
     return user
 
 async def get_current_active_user(
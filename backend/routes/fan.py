@@ -1,14 +1,13 @@
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
+from typing import List, Literal
 
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, HTTPException
 
-import dependencies.app
 import hardware.fan
 import hardware.util
-from dependencies import raven_db
+from dependencies import storage, fan_analytics, fan_control
 from dependencies.app import wsmanager
-from dependencies.models import State, FanStatus
-from dependencies.raven_db import get_state
+from dependencies.models import State, FanStatus, FanAnalytics
 
 router = APIRouter()
 
@@ -16,7 +15,7 @@ router = APIRouter()
 
 @router.get("/")
 async def fan_status():
-    state = await get_state()
+    state = await storage.get_state()
     return FanStatus(Id=state.Id, running=state.fan_running, updatedAt=state.timestamp, override=state.fan_override)
 
 @router.post("/toggle/")
@@ -28,22 +27,48 @@ async def fan_toggle(background_tasks: BackgroundTasks, duration: timedelta=time
     :return:
     """
     # noinspection PyTypeChecker
-    state = await get_state()
+    state = await storage.get_state()
 
     new_state = State(
         timestamp=datetime.now(tz=timezone.utc),
         fan_running=not state.fan_running,
         fan_override=datetime.now(tz=timezone.utc) + duration,
     )
-    await raven_db.store_object(new_state)
+    await storage.store_object(new_state)
 
     fan_state = FanStatus(running=new_state.fan_running, updatedAt=new_state.timestamp, override=new_state.fan_override)
 
     background_tasks.add_task(hardware.util.sync_state, new_state)
-    dependencies.app.update_fan_override_cron(new_state)
+    fan_control.override_timer.arm(new_state)
 
-    await wsmanager.broadcast(new_state.model_dump_json(by_alias=True))
+    await wsmanager.publish_state(new_state)
 
     return fan_state
 
+@router.get("/analytics/")
+async def analytics(
+    start: date | None=None,
+    end: date | None=None,
+    resolution: Literal["day", "week"]="day",
+) -> List[FanAnalytics]:
+    """
+    Laufzeit, Schaltvorgänge, Override-Anteil und geschätzter Verbrauch des Lüfters pro Tag bzw. Woche (UTC).
+
+    Die Tageswerte werden bei jedem neuen Lüfterstatus fortgeschrieben, die Abfrage liest nur die Tage
+    im Zeitraum. Standard sind die letzten 7 Tage.
+    """
+    end = end or datetime.now(tz=timezone.utc).date()
+    start = start or end - timedelta(days=6)
+    if start > end or (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="Zeitraum muss zwischen 1 und 367 Tagen liegen.")
+
+    fan_days = {date.fromisoformat(d.day): d for d in await storage.get_fan_days(start, end)}
+
+    # Der aktuelle Status ist erst beim nächsten Wechsel gespeichert, seine bisherige Dauer zählt schon mit
+    state = await storage.get_state()
+    if state is not None:
+        fan_analytics.add_interval(fan_days, state, datetime.now(tz=timezone.utc))
+
+    return fan_analytics.summarize([d for day, d in fan_days.items() if start <= day <= end], resolution)
+
 #TODO: Endpunkt für Aufhebung des Overrides
@@ -1,12 +1,236 @@
-from fastapi import APIRouter
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime, timezone
 
-from dependencies import raven_db
-from dependencies.models import Reading
+from fastapi import APIRouter, Request, HTTPException
+from starlette import status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+from dependencies import storage, calculations, cache
+from dependencies.app import wsmanager
+from dependencies.models import Reading, BatchInsertResult, BatchInsertError, Station, StationReading
 
 router = APIRouter()
 
+MAX_REPORTED_ERRORS = 100
+# Obergrenze für den Body von /insert/station/batch/ in Bytes, gepackt wie entpackt
+STATION_BATCH_MAX_BYTES = int(os.getenv("STATION_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+
+
+def _check_reading(reading: Reading) -> Reading:
+    """Prüft die Luftfeuchtigkeit, ohne die kein Taupunkt berechnet werden kann, und bringt den Zeitstempel nach UTC."""
+    for humidity in (reading.indoor_humidity, reading.outdoor_humidity):
+        if not 0 < humidity <= 100:
+            raise ValueError(f"Luftfeuchtigkeit {humidity} liegt nicht zwischen 0 und 100.")
+
+    # Zeitstempel werden ohne Zeitzone gespeichert und müssen daher in UTC vorliegen
+    if reading.timestamp.tzinfo:
+        reading.timestamp = reading.timestamp.astimezone(timezone.utc)
+    return reading
+
 
 @router.post("/")
 async def insert_data(reading: Reading):
-    await raven_db.store_object(reading)
+    try:
+        _check_reading(reading)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e))
+
+    await storage.store_object(calculations.with_dew_points(reading))
+    await wsmanager.publish_reading(reading)
     return "OK"
+
+
+class _UnreadableLine(ValueError):
+    """Zeile eines NDJSON-Bodys, die kein gültiges JSON ist. Wird wie ein ungültiger Messwert gemeldet."""
+
+
+def _parse_ndjson(text: str) -> list:
+    # Jede Zeile für sich: eine kaputte Zeile soll nicht den ganzen Block verwerfen
+    rows = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            rows.append(_UnreadableLine(f"Zeile {number}: {e}"))
+    return rows
+
+
+def _parse_rows(body: bytes, content_type: str) -> list:
+    """
+    :return: Zeilen des Bodys; nicht lesbare NDJSON-Zeilen stehen als _UnreadableLine an ihrer Position
+    """
+    text = body.decode("utf-8-sig")
+
+    if "csv" in content_type:
+        return list(csv.DictReader(io.StringIO(text)))
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return _parse_ndjson(text)
+
+    rows = json.loads(text)
+    if not isinstance(rows, list):
+        raise ValueError("JSON-Body muss ein Array von Messwerten sein.")
+    return rows
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+def _validate_rows(rows: list) -> tuple[list[Reading], list[BatchInsertError], int]:
+    valid: list[Reading] = []
+    errors: list[BatchInsertError] = []
+    rejected = 0
+
+    for index, row in enumerate(rows):
+        try:
+            if isinstance(row, _UnreadableLine):
+                raise row
+            reading = _check_reading(Reading.model_validate(row))
+        except (ValidationError, ValueError) as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(BatchInsertError(index=index, error=_error_message(e)))
+            continue
+
+        reading.Id = None
+        valid.append(reading)
+
+    calculations.fill_dew_points(valid)
+    return valid, errors, rejected
+
+
+@router.post("/batch/")
+async def insert_batch(request: Request) -> BatchInsertResult:
+    """
+    Importiert viele Messwerte auf einmal, z.B. nachgereichte Daten einer Messstation.
+
+    Der Body ist je nach Content-Type ein JSON-Array (application/json), ein Messwert pro Zeile
+    (application/x-ndjson) oder CSV mit Kopfzeile (text/csv). Feldnamen wie bei /insert/.
+    Ungültige Messwerte und nicht lesbare NDJSON-Zeilen werden übersprungen und im Ergebnis aufgeführt
+    (bei NDJSON mit Zeilennummer), alle gültigen werden gespeichert.
+    """
+    content_type = request.headers.get("content-type", "application/json")
+    body = await request.body()
+
+    try:
+        rows = await run_in_threadpool(_parse_rows, body, content_type)
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Body konnte nicht gelesen werden: {e}")
+
+    valid, errors, rejected = await run_in_threadpool(_validate_rows, rows)
+    latest = cache.latest.reading
+    accepted = await storage.bulk_store(valid) if valid else 0
+
+    # Nachgereichte Daten nicht einzeln verschicken, nur einen ggf. neuen aktuellsten Messwert
+    if cache.latest.reading is not latest:
+        await wsmanager.publish_reading(cache.latest.reading)
+
+    return BatchInsertResult(accepted=accepted, rejected=rejected, errors=errors)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+async def _read_body(request: Request, limit: int) -> bytes:
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise _BodyTooLarge()
+    return bytes(body)
+
+
+def _decode_body(body: bytes, content_encoding: str, limit: int) -> bytes:
+    """Entpackt gzip höchstens bis limit Bytes, damit ein kleiner Body nicht den Speicher füllt."""
+    if "gzip" not in content_encoding:
+        return body
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, limit + 1)
+    if len(data) > limit:
+        raise _BodyTooLarge()
+    if not decompressor.eof:
+        raise EOFError("gzip-Daten sind unvollständig.")
+    return data
+
+
+def _station_readings(rows: list, stations: dict[str, Station]) -> tuple[list[StationReading], list[BatchInsertError], int]:
+    valid: list[StationReading] = []
+    errors: list[BatchInsertError] = []
+    rejected = 0
+
+    for index, row in enumerate(rows):
+        try:
+            if isinstance(row, _UnreadableLine):
+                raise row
+            station = stations.get(row.get("station"))
+            if station is None:
+                raise ValueError(f"Station {row.get('station')!r} ist nicht registriert.")
+            timestamp = datetime.fromtimestamp(float(row["timestamp"]), tz=timezone.utc)
+            temp, humidity = float(row["temp"]), float(row["humid"])
+            if not 0 < humidity <= 100:
+                raise ValueError(f"Luftfeuchtigkeit {humidity} liegt nicht zwischen 0 und 100.")
+            reading = StationReading(
+                station=station.name,
+                zone=station.zone,
+                location=station.location,
+                timestamp=timestamp,
+                temp=temp,
+                humidity=humidity,
+                dew_point=calculations.taupunkt(temp, humidity),
+            )
+        except (ValidationError, ValueError, KeyError, TypeError, AttributeError, OverflowError) as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(BatchInsertError(index=index, error=_error_message(e)))
+            continue
+
+        # Feste ID je Station und Zeitpunkt: wiederholt gesendete Blöcke überschreiben sich selbst
+        reading.Id = f"StationReadings/{station.name}/{int(timestamp.timestamp() * 1000)}"
+        valid.append(reading)
+
+    return valid, errors, rejected
+
+
+@router.post("/station/batch/")
+async def insert_station_batch(request: Request, auth: str) -> BatchInsertResult:
+    """
+    Nimmt gepufferte Messwerte von Messstationen im Push-Modus entgegen.
+
+    Der Body enthält einen Messwert pro Zeile (NDJSON) mit station, timestamp (Unix-Zeit), temp und humid,
+    optional gzip-komprimiert (Content-Encoding: gzip). Die Station muss registriert sein.
+    Derselbe Block kann gefahrlos mehrfach gesendet werden. Nicht lesbare Zeilen werden mit Zeilennummer abgelehnt.
+    Ist der Body gepackt oder entpackt größer als STATION_BATCH_MAX_BYTES, wird er mit 413 abgelehnt.
+    """
+    if auth != os.environ["MEASURE_STATION_AUTHENTICATION"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        body = await _read_body(request, STATION_BATCH_MAX_BYTES)
+        body = await run_in_threadpool(
+            _decode_body, body, request.headers.get("content-encoding", ""), STATION_BATCH_MAX_BYTES,
+        )
+        rows = await run_in_threadpool(_parse_rows, body, "application/x-ndjson")
+    except _BodyTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"Body ist größer als {STATION_BATCH_MAX_BYTES} Bytes.",
+        )
+    except (ValueError, zlib.error, EOFError) as e:
+        raise HTTPException(status_code=400, detail=f"Body konnte nicht gelesen werden: {e}")
+
+    stations = {station.name: station for station in await storage.get_stations() if station.enabled}
+    valid, errors, rejected = await run_in_threadpool(_station_readings, rows, stations)
+    accepted = await storage.bulk_store(valid) if valid else 0
+
+    return BatchInsertResult(accepted=accepted, rejected=rejected, errors=errors)
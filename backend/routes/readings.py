@@ -1,28 +1,81 @@
+import json
 import random
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import List, Literal
 
-from fastapi import APIRouter, HTTPException
+import numpy as np
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from starlette import status
 
 import hardware.check_rpi
-from dependencies import raven_db, calculations
-from dependencies.models import Reading, ReadingWithDewPoint
+from dependencies import storage, calculations, downsampling, formats, http_cache, retention
+from dependencies.formats import HistoryFormat
+from dependencies.models import Reading, ReadingWithDewPoint, ReadingAggregate
+from dependencies.timestamps import as_utc
 
 router = APIRouter()
 
-@router.get("/current/")
-async def current() -> ReadingWithDewPoint:
-    with raven_db.store.open_session() as db:
-        data = db.query(object_type=Reading).order_by_descending("timestamp").first()
-        if data is None:
-            raise HTTPException(status_code=status.HTTP_204_NO_CONTENT)
+@router.get("/current/", response_model=ReadingWithDewPoint)
+async def current(request: Request) -> Response:
+    data = await storage.get_latest_reading()
+    if data is None:
+        raise HTTPException(status_code=status.HTTP_204_NO_CONTENT)
+
+    tag = http_cache.etag("current", data.timestamp.isoformat())
+    control = http_cache.cache_control()
+    if http_cache.is_not_modified(request, tag, data.timestamp):
+        return http_cache.not_modified(tag, data.timestamp, control)
 
     reading = calculations.append_dew_points(data)
-    return reading
+    response = JSONResponse(reading.model_dump(mode="json", by_alias=True))
+    return http_cache.set_validators(response, tag, data.timestamp, control)
+
+@router.get("/history/", response_model=List[ReadingWithDewPoint])
+async def history(request: Request, start: datetime, end: datetime, format: HistoryFormat | None=None) -> Response:
+    """
+    Alle Messwerte im Zeitraum.
+
+    :param format: "json" (Liste von Messwerten), "columnar" (ein Array pro Messreihe, Zeitstempel als
+        Unix-Sekunden) oder "msgpack" (spaltenweise, MessagePack-kodiert). Ohne Angabe entscheidet der
+        Accept-Header, Standard ist "json".
+    """
+    return await _history(
+        request, start, end, format, (start.isoformat(), end.isoformat()), http_cache.cache_control(end),
+    )
+
+@router.get("/history/delta/", response_model=List[ReadingWithDewPoint])
+async def history_delta(request: Request, days: int, end: datetime=None, format: HistoryFormat | None=None) -> Response:
+    """
+    Messwerte der letzten `days` Tage bis einen Tag nach `end`.
+
+    Ohne end reicht der Zeitraum bis jetzt. Der Validator hängt dann nur von days und den Daten ab, nicht von
+    der Uhrzeit der Anfrage, sodass wiederholte Abrufe ohne neue Messwerte ein 304 bekommen.
+    """
+    if end is None:
+        end = datetime.now(tz=timezone.utc)
+        tag_range = ("delta", days)
+        control = http_cache.cache_control(open_range=True)
+    else:
+        tag_range = ("delta", days, end.isoformat())
+        control = http_cache.cache_control(end + timedelta(days=1))
+
+    start = end - timedelta(days=days)
+    end = end + timedelta(days=1)
+    return await _history(request, start, end, format, tag_range, control)
 
-@router.get("/history/")
-async def history(start: datetime, end: datetime) -> List[ReadingWithDewPoint]:
+async def _history(
+    request: Request,
+    start: datetime,
+    end: datetime,
+    format: HistoryFormat | None,
+    tag_range: tuple,
+    control: str,
+) -> Response:
+    """
+    :param tag_range: Werte, die den Zeitraum im ETag vertreten
+    """
     if not hardware.check_rpi.is_raspberrypi():
         new_reading = Reading(
             timestamp=datetime.now(tz=timezone.utc),
@@ -31,27 +84,87 @@ async def history(start: datetime, end: datetime) -> List[ReadingWithDewPoint]:
             indoor_humidity=random.randint(1, 100),
             outdoor_humidity=random.randint(1, 100),
         )
-        await raven_db.store_object(new_reading)
+        await storage.store_object(calculations.with_dew_points(new_reading))
 
-    with raven_db.store.open_session() as db:
-        _data: List[Reading] = list(
-            db.query(object_type=Reading)
-            .where_between("timestamp", start, end)
-            .order_by("timestamp")
-        )
+    response_format = formats.negotiate(request, format)
 
-    readings: list[ReadingWithDewPoint] = []
-    for data in _data:
-        reading = calculations.append_dew_points(data)
-        readings.append(reading.model_dump(by_alias=True))
+    # Validator aus dem neuesten Messwert und der Anzahl im Zeitraum. Zeiträume vor der Verdichtungsgrenze
+    # ändern sich zusätzlich mit jeder nächtlichen Verdichtung. Kein Last-Modified: nachgereichte Messwerte
+    # sind älter als der neueste, If-Modified-Since würde sie nicht bemerken.
+    newest, count = await storage.get_readings_version(start, end)
+    cutoff = retention.raw_cutoff()
+    tag = http_cache.etag(
+        "history", *tag_range, response_format,
+        newest.isoformat() if newest else None, count,
+        cutoff.date() if as_utc(start) < as_utc(cutoff) else None,
+    )
+    if http_cache.is_not_modified(request, tag, None):
+        return http_cache.not_modified(tag, None, control)
 
-    return readings
+    _data = await storage.get_history(start, end)
 
-@router.get("/history/delta/")
-async def history_delta(days: int, end: datetime=None) -> List[ReadingWithDewPoint]:
-    if end is None:
-        end = datetime.now()
+    response = formats.render_readings(_data, response_format)
+    return http_cache.set_validators(response, tag, None, control)
 
-    start = end - timedelta(days=days)
-    end = end + timedelta(days=1)
-    return await history(start, end)
+@router.get("/history/aggregate/")
+async def history_aggregate(start: datetime, end: datetime, resolution: Literal["hour", "day"]="hour") -> List[ReadingAggregate]:
+    """
+    Min, Max und Mittelwert aller Messreihen pro Stunde bzw. Tag.
+
+    Die Werte kommen vorberechnet aus den Map-Reduce-Indizes der Datenbank.
+    """
+    return await storage.get_reading_aggregates(resolution, start, end)
+
+@router.get("/history/downsample/", response_model=List[ReadingWithDewPoint])
+async def history_downsample(
+    request: Request,
+    start: datetime,
+    end: datetime,
+    points: int=Query(500, ge=3, le=10000),
+    format: HistoryFormat | None=None,
+) -> Response:
+    """
+    Messwerte im Zeitraum, per LTTB auf höchstens `points` Punkte reduziert.
+
+    Spitzen und Verlauf aller Messreihen bleiben erhalten, sodass das Diagramm aussieht wie mit allen Messwerten.
+    """
+    _data = await storage.get_history(start, end)
+    calculations.fill_dew_points(_data)
+
+    if len(_data) > points:
+        x = np.array([r.timestamp.timestamp() for r in _data])
+        series = [
+            np.array([getattr(r, field) for r in _data])
+            for field in ("indoor_temp", "outdoor_temp", "dew_point_indoor", "dew_point_outdoor")
+        ]
+        _data = [_data[i] for i in downsampling.lttb_multi(x, series, points)]
+
+    return formats.render_readings(_data, formats.negotiate(request, format))
+
+async def _ndjson_chunks(start: datetime, end: datetime):
+    async for chunk in storage.stream_readings(start, end):
+        yield "".join(json.dumps(r) + "\n" for r in calculations.append_dew_points_batch(chunk))
+
+async def _json_array_chunks(start: datetime, end: datetime):
+    first = True
+    yield "["
+    async for chunk in storage.stream_readings(start, end):
+        body = ",".join(json.dumps(r) for r in calculations.append_dew_points_batch(chunk))
+        yield body if first else "," + body
+        first = False
+    yield "]"
+
+@router.get("/history/stream/")
+async def history_stream(start: datetime, end: datetime, format: Literal["ndjson", "json"]="ndjson") -> StreamingResponse:
+    """
+    Messwerte im Zeitraum wie /history/, aber gestreamt.
+
+    Die Messwerte werden blockweise aus der Datenbank gelesen und direkt gesendet, der Speicherbedarf
+    hängt also nicht von der Größe des Zeitraums ab. Gedacht für Exporte über lange Zeiträume.
+    Bereits verdichtete Zeiträume enthalten wie bei /history/ die Stunden- bzw. Tagesmittelwerte.
+
+    :param format: "ndjson" (ein Messwert pro Zeile) oder "json" (ein JSON-Array)
+    """
+    if format == "ndjson":
+        return StreamingResponse(_ndjson_chunks(start, end), media_type="application/x-ndjson")
+    return StreamingResponse(_json_array_chunks(start, end), media_type="application/json")
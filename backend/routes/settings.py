@@ -5,7 +5,7 @@ from fastapi import APIRouter, HTTPException, Depends
 
 import dependencies.app
 import dependencies.globals
-from dependencies import raven_db
+from dependencies import storage
 from dependencies.models import Settings
 from routes.auth import User, get_current_active_user
 
@@ -13,12 +13,12 @@ router = APIRouter()
 
 @router.get("/")
 async def get_settings(current_user: Annotated[User, Depends(get_current_active_user)]) -> Settings:
-    from_db = await raven_db.get_create_app_settings()
+    from_db = await storage.get_create_app_settings()
     return from_db
 
 @router.post("/")
 async def update_settings(settings: Settings, current_user: Annotated[User, Depends(get_current_active_user)]):
-    await raven_db.save_settings(settings)
+    await storage.save_settings(settings)
 
     dependencies.globals.settings = settings
     await dependencies.app.update_get_data_cron()
@@ -36,9 +36,9 @@ async def set_dht22_indoor_address(address: str, current_user: Annotated[User, D
             detail="Invalid URL",
         )
 
-    settings = await raven_db.get_create_app_settings()
+    settings = await storage.get_create_app_settings()
     settings.dht22_indoor_address = address
-    await raven_db.save_settings(settings)
+    await storage.save_settings(settings)
 
     return "ok"
 
@@ -50,8 +50,8 @@ async def set_dht22_outdoor_address(address: str, current_user: Annotated[User,
             detail="Invalid URL",
         )
 
-    settings = await raven_db.get_create_app_settings()
+    settings = await storage.get_create_app_settings()
     settings.dht22_outdoor_address = address
-    await raven_db.save_settings(settings)
+    await storage.save_settings(settings)
 
     return "ok"
@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import Annotated, List
+
+import validators
+from fastapi import APIRouter, HTTPException, Depends
+
+from dependencies import storage
+from dependencies.models import Station, StationReading, ZoneState
+from routes.auth import User, get_current_active_user
+
+router = APIRouter()
+
+
+@router.get("/")
+async def list_stations() -> List[Station]:
+    return await storage.get_stations()
+
+@router.post("/")
+async def save_station(station: Station, current_user: Annotated[User, Depends(get_current_active_user)]) -> Station:
+    """Legt eine Station an oder ersetzt die Station mit demselben Namen. Push-Stationen brauchen keine Adresse."""
+    if station.address:
+        if not validators.url(station.address):
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid URL",
+            )
+    elif not station.push:
+        raise HTTPException(
+            status_code=400,
+            detail="Address required for polled stations",
+        )
+
+    return await storage.save_station(station)
+
+@router.delete("/{name}/")
+async def delete_station(name: str, current_user: Annotated[User, Depends(get_current_active_user)]):
+    if not await storage.delete_station(name):
+        raise HTTPException(status_code=404, detail="Station not found")
+
+    return "ok"
+
+@router.get("/zones/")
+async def zone_states() -> List[ZoneState]:
+    """Aktuelle Lüfterentscheidung pro Zone."""
+    return await storage.get_zone_states()
+
+@router.get("/{name}/readings/")
+async def station_readings(name: str, start: datetime, end: datetime) -> List[StationReading]:
+    return await storage.get_station_readings(name, start, end)
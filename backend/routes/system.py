@@ -0,0 +1,20 @@
+from dataclasses import asdict
+
+from fastapi import APIRouter
+
+from dependencies import cache
+from hardware import hotspot
+
+router = APIRouter()
+
+
+@router.get("/cache/")
+async def cache_stats() -> dict:
+    """Treffer und Fehlzugriffe der Caches für Lüfterstatus/neuesten Messwert und angemeldete Benutzer."""
+    return {**cache.latest.stats(), "users": cache.users.stats()}
+
+
+@router.get("/hotspot/")
+async def hotspot_status() -> dict:
+    """Stand des Hotspot-Starts, der beim Start des Backends im Hintergrund läuft."""
+    return asdict(hotspot.status)
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+# Werte, ohne die sich die Anwendung nicht importieren lässt. Die Tests laufen gegen SQLite, ohne RavenDB.
+for name, value in {
+    "FAN_GPIO": "21",
+    "JWT_SECRET": "test",
+    "JWT_ALGO": "HS256",
+    "MEASURE_STATION_AUTHENTICATION": "test",
+    "STORAGE_BACKEND": "sqlite",
+    "LOG_LEVEL": "WARNING",
+    "INIT_ADMIN_USER": "admin",
+    "INIT_ADMIN_PASS": "admin",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def app_environment(tmp_path, monkeypatch):
+    """Leere SQLite-Datenbank, die Anwendung verhält sich wie auf dem Raspberry Pi."""
+    import hardware.check_rpi
+    from dependencies import cache, storage
+    # Erst nach dem Import patchen, sonst lädt hardware.fan beim Import RPi.GPIO
+    import main  # noqa: F401
+
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "test.sqlite3"))
+    # Ohne Raspberry Pi legt /readings/history/ bei jedem Aufruf einen zufälligen Messwert an
+    monkeypatch.setattr(hardware.check_rpi, "is_raspberrypi", lambda: True)
+    monkeypatch.setattr(cache, "latest", cache.LatestCache())
+    storage.use(None)
+    yield
+    storage.use(None)
+
+
+@pytest.fixture
+def client(app_environment):
+    """TestClient der Anwendung, siehe app_environment."""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
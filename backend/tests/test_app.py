@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import hardware.util
+import main
+from dependencies import cache, fan_control, storage
+from dependencies.models import Reading, State
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    calls: list[State] = []
+    monkeypatch.setattr(hardware.util, "sync_state", calls.append)
+    return calls
+
+
+def _restart_with(running: bool, override: datetime | None) -> None:
+    """Speichert einen neuen Status, beendet die Anwendung und startet sie mit derselben Datenbank neu."""
+    with TestClient(main.app) as client:
+        state = State(timestamp=datetime.now(tz=timezone.utc), fan_running=running, fan_override=override)
+        client.portal.call(storage.store_object, state)
+
+    cache.latest = cache.LatestCache()
+    storage.use(None)
+
+
+def test_restart_drives_pin_with_stored_state(app_environment, synced):
+    _restart_with(True, None)
+    synced.clear()
+
+    with TestClient(main.app):
+        assert [s.fan_running for s in synced] == [True]
+
+
+def test_restart_restores_override(app_environment, synced):
+    override = datetime.now(tz=timezone.utc) + timedelta(hours=1)
+    _restart_with(True, override)
+    synced.clear()
+
+    with TestClient(main.app):
+        assert [s.fan_running for s in synced] == [True]
+        assert fan_control.override_timer.expires is not None
+
+
+def test_end_of_override_uses_latest_reading(client, synced, monkeypatch):
+    monkeypatch.setattr(fan_control, "FAN_MIN_SWITCH_SECONDS", 0)
+    # Gespeichert ohne Taupunkte, wie ältere Messwerte in RavenDB
+    cache.latest.update(Reading(
+        timestamp=datetime.now(tz=timezone.utc),
+        indoor_temp=25, outdoor_temp=5, indoor_humidity=70, outdoor_humidity=50,
+    ))
+
+    client.portal.call(main.end_fan_override)
+
+    assert [s.fan_running for s in synced] == [True]
+    assert client.portal.call(storage.get_state).fan_running is True
+
+
+
+def test_lifespan_starts_and_stops_scheduler(app_environment, monkeypatch):
+    calls = []
+    for name in ("start", "stop"):
+        method = getattr(main.crons_app, name)
+        monkeypatch.setattr(main.crons_app, name, lambda method=method, name=name: calls.append(name) or method())
+
+    with TestClient(main.app):
+        assert calls[-1] == "start"
+
+    assert calls[-1] == "stop"
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import backfill_dew_points
+from dependencies import calculations
+from dependencies.models import Reading
+
+
+class FakeQuery:
+    """Nachbau der benutzten RavenDB-Abfrage. Gleiche Zeitstempel kommen in umgekehrter Speicherreihenfolge."""
+    def __init__(self, readings: list[Reading]):
+        self.readings = readings
+
+    def where_greater_than_or_equal(self, field: str, value):
+        return FakeQuery([r for r in self.readings if getattr(r, field) >= value])
+
+    def order_by(self, field: str):
+        return FakeQuery(sorted(reversed(self.readings), key=lambda r: getattr(r, field)))
+
+    def take(self, count: int):
+        return self.readings[:count]
+
+
+class FakeSession:
+    def __init__(self, readings: list[Reading]):
+        self.readings = readings
+        self.saves = 0
+
+    def query_index_type(self, index, object_type):
+        return FakeQuery(self.readings)
+
+    def save_changes(self):
+        self.saves += 1
+
+
+def _reading(i: int, timestamp: datetime, humidity: float = 50) -> Reading:
+    return Reading(
+        Id=f"Readings/{i}", timestamp=timestamp,
+        indoor_temp=20, outdoor_temp=10, indoor_humidity=humidity, outdoor_humidity=70,
+    )
+
+
+def _run(session: FakeSession, batch_size: int) -> tuple[int, int]:
+    after, seen = None, set()
+    read = skipped = 0
+    for _ in range(100):
+        batch, _, invalid = backfill_dew_points.backfill_batch(session, after, seen, batch_size)
+        if not batch:
+            return read, skipped
+        read += len(batch)
+        skipped += invalid
+        after, seen = backfill_dew_points.advance(batch, after, seen)
+    pytest.fail("Backfill endet nicht")
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 3, 10])
+def test_readings_with_equal_timestamps_are_not_skipped(batch_size):
+    start = datetime(2024, 1, 1)
+    # Sieben Messwerte mit gleichem Zeitstempel liegen über mehreren Blockgrenzen
+    readings = [_reading(i, start + timedelta(minutes=min(i, 3))) for i in range(10)] + [
+        _reading(i, start + timedelta(minutes=3)) for i in range(10, 14)
+    ]
+    session = FakeSession(readings)
+
+    read, skipped = _run(session, batch_size)
+
+    assert read == len(readings)
+    assert skipped == 0
+    assert all(r.dew_point_indoor == calculations.taupunkt(20, 50) for r in readings)
+
+
+def test_invalid_humidity_is_skipped():
+    start = datetime(2024, 1, 1)
+    readings = [_reading(i, start + timedelta(minutes=i), humidity=0 if i == 2 else 50) for i in range(5)]
+
+    read, skipped = _run(FakeSession(readings), 2)
+
+    assert (read, skipped) == (5, 1)
+    assert readings[2].dew_point_indoor is None
+    assert all(r.dew_point_indoor is not None for r in readings if r.Id != "Readings/2")
+
+
+def test_checkpoint_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(backfill_dew_points, "CHECKPOINT_FILE", str(tmp_path / "checkpoint"))
+    assert backfill_dew_points.load_checkpoint() == (None, set())
+
+    timestamp = datetime(2024, 1, 1, 12)
+    backfill_dew_points.save_checkpoint(timestamp, {"Readings/1", "Readings/2"})
+    assert backfill_dew_points.load_checkpoint() == (timestamp, {"Readings/1", "Readings/2"})
+
+    (tmp_path / "checkpoint").write_text(timestamp.isoformat())
+    assert backfill_dew_points.load_checkpoint() == (timestamp, set())
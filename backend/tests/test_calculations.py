@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from dependencies import calculations
+from dependencies.models import Reading
+
+
+@pytest.mark.parametrize("temp, humid", [(20, 50), (-5.5, 80), (0, 100), (35.2, 12.5), (-20, 1)])
+def test_taupunkt_batch_matches_taupunkt(temp, humid):
+    assert calculations.taupunkt_batch([temp], [humid])[0] == pytest.approx(calculations.taupunkt(temp, humid), abs=0.011)
+
+
+def test_taupunkt_batch_many():
+    rng = np.random.default_rng(1)
+    temps = rng.uniform(-20, 40, 1000)
+    humids = rng.uniform(1, 100, 1000)
+    expected = [calculations.taupunkt(t, h) for t, h in zip(temps, humids)]
+    np.testing.assert_allclose(calculations.taupunkt_batch(temps, humids), expected, atol=0.011)
+
+
+@pytest.mark.parametrize("humid", [0, -1])
+def test_taupunkt_rejects_invalid_humidity(humid):
+    with pytest.raises(ValueError):
+        calculations.taupunkt(20, humid)
+    with pytest.raises(ValueError):
+        calculations.taupunkt_batch([20, 20], [50, humid])
+
+
+def test_fill_dew_points_keeps_stored_values():
+    stored = Reading(
+        timestamp="2024-01-01T00:00:00", indoor_temp=20, outdoor_temp=10, indoor_humidity=50, outdoor_humidity=70,
+        dew_point_indoor=1.0, dew_point_outdoor=2.0,
+    )
+    missing = Reading(timestamp="2024-01-01T00:30:00", indoor_temp=20, outdoor_temp=10, indoor_humidity=50, outdoor_humidity=70)
+    calculations.fill_dew_points([stored, missing])
+
+    assert (stored.dew_point_indoor, stored.dew_point_outdoor) == (1.0, 2.0)
+    assert missing.dew_point_indoor == calculations.taupunkt(20, 50)
+    assert missing.dew_point_outdoor == calculations.taupunkt(10, 70)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from dependencies import downsampling
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(7)
+    x = np.arange(5000, dtype=np.float64) * 60
+    series = [rng.normal(20, 1, 5000), rng.normal(5, 2, 5000), rng.normal(10, 1, 5000), rng.normal(0, 1, 5000)]
+    # Je eine Spitze, die erhalten bleiben muss
+    series[0][1234] = 40
+    series[1][4321] = -30
+    return x, series
+
+
+@pytest.mark.parametrize("threshold", [3, 10, 500, 4999])
+def test_lttb_indices_bounds(data, threshold):
+    x, series = data
+    indices = downsampling.lttb_indices(x, series[0], threshold)
+
+    assert len(indices) == threshold
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_indices_small_input(data):
+    x, series = data
+    assert len(downsampling.lttb_indices(x[:5], series[0][:5], 10)) == 5
+    assert len(downsampling.lttb_indices(x, series[0], 2)) == len(x)
+
+
+@pytest.mark.parametrize("threshold", [12, 100, 500, 2000])
+def test_lttb_multi_bounds_and_peaks(data, threshold):
+    x, series = data
+    indices = downsampling.lttb_multi(x, series, threshold)
+
+    assert len(indices) <= threshold
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert 1234 in indices and 4321 in indices
+
+
+@pytest.mark.parametrize("threshold", [3, 5, 11])
+def test_lttb_multi_below_three_per_series(data, threshold):
+    x, series = data
+    indices = downsampling.lttb_multi(x, series, threshold)
+
+    assert len(indices) == threshold
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_multi_small_input(data):
+    x, series = data
+    assert len(downsampling.lttb_multi(x[:10], series, 500)) == 10
+
+
+def test_downsample_endpoint(client):
+    now = datetime.now(tz=timezone.utc)
+    rows = [
+        {
+            "timestamp": (now - timedelta(minutes=i)).isoformat(),
+            "indoorTemp": 20 + i % 7, "outdoorTemp": 10 - i % 5, "indoorHumidity": 50, "outdoorHumidity": 70,
+        }
+        for i in range(600)
+    ]
+    client.post("/insert/batch/", json=rows)
+
+    params = {"start": (now - timedelta(days=1)).isoformat(), "end": now.isoformat(), "points": 100}
+    readings = client.get("/readings/history/downsample/", params=params).json()
+    assert 3 <= len(readings) <= 100
+    timestamps = [r["timestamp"] for r in readings]
+    assert timestamps == sorted(timestamps)
+
+    params["points"] = 3
+    assert len(client.get("/readings/history/downsample/", params=params).json()) == 3
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dependencies import calculations, fan_control
+from dependencies.models import State, StationReading, ZoneState
+
+NOW = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(fan_control, "FAN_MIN_SWITCH_SECONDS", 600)
+
+
+def _state(running: bool, age: timedelta, override: datetime | None = None) -> State:
+    return State(timestamp=NOW - age, fan_running=running, fan_override=override)
+
+
+@pytest.mark.parametrize("indoor, running, expected", [
+    (10.6, None, True),
+    (9.9, None, False),
+    (10.4, False, False),
+    (10.6, False, True),
+    (9.6, True, True),
+    (9.4, True, False),
+])
+def test_should_fan_run_hysteresis(indoor, running, expected):
+    assert calculations.should_fan_run(indoor, 10, running, hysteresis=1.0) is expected
+
+
+def test_no_state_change_returns_none():
+    assert fan_control.next_state(_state(True, timedelta(hours=1)), 15, 10, NOW) is None
+    assert fan_control.next_state(_state(False, timedelta(hours=1)), 10.2, 10, NOW) is None
+
+
+def test_switch_after_minimum_time():
+    new = fan_control.next_state(_state(False, timedelta(minutes=11)), 15, 10, NOW)
+    assert new.fan_running is True
+    assert new.timestamp == NOW
+    assert new.fan_override is None
+
+
+def test_minimum_time_blocks_switch():
+    assert fan_control.next_state(_state(False, timedelta(minutes=9)), 15, 10, NOW) is None
+    assert fan_control.next_state(_state(True, timedelta(minutes=9)), 5, 10, NOW) is None
+
+
+def test_expired_override_is_cleared_without_switching():
+    current = _state(True, timedelta(minutes=30), override=NOW - timedelta(seconds=1))
+    new = fan_control.next_state(current, 15, 10, NOW)
+    assert new.fan_running is True
+    assert new.fan_override is None
+
+
+def test_first_state():
+    assert fan_control.next_state(None, 15, 10, NOW).fan_running is True
+
+
+def test_override_active():
+    assert fan_control.override_active(_state(True, timedelta(0), NOW + timedelta(minutes=1)), NOW)
+    assert not fan_control.override_active(_state(True, timedelta(0), NOW - timedelta(minutes=1)), NOW)
+    # Aus der Datenbank ohne Zeitzone, in UTC
+    naive = (NOW + timedelta(minutes=1)).replace(tzinfo=None)
+    assert fan_control.override_active(_state(True, timedelta(0), naive), NOW)
+    assert not fan_control.override_active(None, NOW)
+
+
+def test_zone_state_written_only_on_switch():
+    current = ZoneState(
+        zone="keller", timestamp=NOW - timedelta(hours=1), fan_running=False, dew_point_indoor=9, dew_point_outdoor=10,
+    )
+    assert fan_control.next_zone_state(current, "keller", 10.3, 10, NOW) is None
+
+    switched = fan_control.next_zone_state(current, "keller", 12, 10, NOW)
+    assert (switched.zone, switched.fan_running, switched.dew_point_indoor) == ("keller", True, 12)
+
+    current.timestamp = NOW - timedelta(minutes=5)
+    assert fan_control.next_zone_state(current, "keller", 12, 10, NOW) is None
+
+    assert fan_control.next_zone_state(None, "dach", 12, 10, NOW).fan_running is True
+
+
+def test_zone_dew_points():
+    def reading(station: str, zone: str, location: str, dew_point: float) -> StationReading:
+        return StationReading(
+            station=station, zone=zone, location=location, timestamp=NOW, temp=20, humidity=50, dew_point=dew_point,
+        )
+
+    dew_points = calculations.zone_dew_points([
+        reading("a", "keller", "indoor", 10),
+        reading("b", "keller", "indoor", 12),
+        reading("c", "keller", "outdoor", 8),
+        reading("d", "dach", "indoor", 9),
+        reading("e", "garten", "outdoor", 6),
+    ])
+    # dach hat keine eigene Außenstation und vergleicht mit allen
+    assert dew_points == {"keller": (11, 8), "dach": (9, 7)}
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from dependencies import http_cache
+
+
+def _reading(timestamp: datetime) -> dict:
+    return {
+        "timestamp": timestamp.isoformat(),
+        "indoorTemp": 20,
+        "outdoorTemp": 10,
+        "indoorHumidity": 50,
+        "outdoorHumidity": 70,
+    }
+
+
+@pytest.fixture
+def stored(client):
+    now = datetime.now(tz=timezone.utc)
+    response = client.post("/insert/batch/", json=[_reading(now - timedelta(hours=i)) for i in range(5)])
+    assert response.json()["accepted"] == 5
+    return client
+
+
+def test_current_not_modified(stored):
+    first = stored.get("/readings/current/")
+    assert first.status_code == 200
+
+    second = stored.get("/readings/current/", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+
+def test_history_not_modified_until_new_reading(stored):
+    now = datetime.now(tz=timezone.utc)
+    params = {"start": (now - timedelta(days=1)).isoformat(), "end": (now + timedelta(hours=1)).isoformat()}
+    first = stored.get("/readings/history/", params=params)
+    assert first.status_code == 200
+    assert len(first.json()) == 5
+
+    tag = first.headers["ETag"]
+    assert stored.get("/readings/history/", params=params, headers={"If-None-Match": tag}).status_code == 304
+
+    stored.post("/insert/", json=_reading(now))
+    changed = stored.get("/readings/history/", params=params, headers={"If-None-Match": tag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != tag
+
+
+def test_history_ignores_if_modified_since_after_backfill(stored):
+    now = datetime.now(tz=timezone.utc)
+    params = {"start": (now - timedelta(days=1)).isoformat(), "end": (now + timedelta(hours=1)).isoformat()}
+    first = stored.get("/readings/history/", params=params)
+    assert "Last-Modified" not in first.headers
+
+    # Nachgereichter Messwert, älter als der neueste im Zeitraum
+    stored.post("/insert/", json=_reading(now - timedelta(hours=10)))
+    since = {"If-Modified-Since": format_datetime(now + timedelta(minutes=1), usegmt=True)}
+    changed = stored.get("/readings/history/", params=params, headers=since)
+    assert changed.status_code == 200
+    assert len(changed.json()) == 6
+
+
+def test_current_if_modified_since(stored):
+    first = stored.get("/readings/current/")
+    since = {"If-Modified-Since": first.headers["Last-Modified"]}
+    assert stored.get("/readings/current/", headers=since).status_code == 304
+
+
+def test_open_delta_not_modified(stored):
+    first = stored.get("/readings/history/delta/", params={"days": 1})
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == f"private, max-age={http_cache.OPEN_RANGE_MAX_AGE}"
+
+    second = stored.get("/readings/history/delta/", params={"days": 1}, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+
+    other_range = stored.get("/readings/history/delta/", params={"days": 2}, headers={"If-None-Match": first.headers["ETag"]})
+    assert other_range.status_code == 200
+
+
+def test_format_changes_etag(stored):
+    json_tag = stored.get("/readings/history/delta/", params={"days": 1}).headers["ETag"]
+    columnar_tag = stored.get("/readings/history/delta/", params={"days": 1, "format": "columnar"}).headers["ETag"]
+    assert json_tag != columnar_tag
+
+
+def test_cache_control():
+    now = datetime.now(tz=timezone.utc)
+    assert http_cache.cache_control(now - timedelta(days=2)) == f"public, max-age={http_cache.CLOSED_RANGE_MAX_AGE}"
+    assert http_cache.cache_control(now) == "no-cache"
+    assert http_cache.cache_control(None) == "no-cache"
@@ -0,0 +1,140 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+from dependencies import storage
+from dependencies.models import Station
+
+
+def _reading(**overrides) -> dict:
+    return {
+        "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+        "indoorTemp": 20,
+        "outdoorTemp": 10,
+        "indoorHumidity": 50,
+        "outdoorHumidity": 70,
+        **overrides,
+    }
+
+
+def test_insert_stores_dew_points(client):
+    assert client.post("/insert/", json=_reading()).status_code == 200
+
+    current = client.get("/readings/current/").json()
+    assert current["dewPointIndoor"] is not None
+    assert current["dewPointOutdoor"] is not None
+
+
+def test_insert_rejects_invalid_humidity(client):
+    for humidity in (0, -3, 101):
+        response = client.post("/insert/", json=_reading(indoorHumidity=humidity))
+        assert response.status_code == 422
+        assert "Luftfeuchtigkeit" in response.json()["detail"]
+
+    assert client.get("/readings/current/").status_code == 204
+
+
+def test_insert_normalizes_timestamp_to_utc(client):
+    local = datetime(2024, 6, 1, 14, 0, tzinfo=timezone(timedelta(hours=2)))
+    client.post("/insert/", json=_reading(timestamp=local.isoformat()))
+
+    stored = datetime.fromisoformat(client.get("/readings/current/").json()["timestamp"])
+    assert stored.replace(tzinfo=stored.tzinfo or timezone.utc) == local
+    assert stored.utcoffset() in (None, timedelta(0))
+    assert stored.hour == 12
+
+
+def _ndjson(rows: list) -> str:
+    return "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows) + "\n"
+
+
+def test_batch_json(client):
+    rows = [_reading(timestamp=(datetime.now(tz=timezone.utc) - timedelta(minutes=i)).isoformat()) for i in range(3)]
+    rows.append(_reading(outdoorHumidity=0))
+    result = client.post("/insert/batch/", json=rows).json()
+
+    assert (result["accepted"], result["rejected"]) == (3, 1)
+    assert result["errors"][0]["index"] == 3
+
+
+def test_batch_csv(client):
+    body = (
+        "timestamp,indoorTemp,outdoorTemp,indoorHumidity,outdoorHumidity\n"
+        "2024-01-01T00:00:00,20,10,50,70\n"
+        "2024-01-01T00:30:00,20,abc,50,70\n"
+    )
+    result = client.post("/insert/batch/", content=body, headers={"Content-Type": "text/csv"}).json()
+
+    assert (result["accepted"], result["rejected"]) == (1, 1)
+    assert result["errors"][0]["index"] == 1
+
+
+def test_batch_ndjson_rejects_only_broken_lines(client):
+    body = _ndjson([_reading(), "", '{"timestamp": "2024-01-01T00:00:00", kaputt', _reading()])
+    response = client.post("/insert/batch/", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (2, 1)
+    assert result["errors"][0]["index"] == 1
+    assert result["errors"][0]["error"].startswith("Zeile 3:")
+
+
+def test_batch_unreadable_body(client):
+    response = client.post("/insert/batch/", content=b"\xff\xfe kein utf-8", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert client.post("/insert/batch/", json={"kein": "array"}).status_code == 400
+
+
+def test_station_batch(client, monkeypatch):
+    monkeypatch.setenv("MEASURE_STATION_AUTHENTICATION", "geheim")
+    station = {"name": "keller", "address": "", "zone": "keller", "location": "indoor", "push": True}
+    monkeypatch.setattr(storage, "get_stations", _stations([Station(**station)]))
+
+    now = datetime.now(tz=timezone.utc).timestamp()
+    body = gzip.compress(_ndjson([
+        {"station": "keller", "timestamp": now, "temp": 15, "humid": 60},
+        "kaputt",
+        {"station": "dach", "timestamp": now, "temp": 15, "humid": 60},
+        {"station": "keller", "timestamp": now - 60, "temp": 15, "humid": 0},
+    ]).encode())
+    response = client.post(
+        "/insert/station/batch/", params={"auth": "geheim"}, content=body,
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+    )
+
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (1, 3)
+    assert [e["index"] for e in result["errors"]] == [1, 2, 3]
+    assert result["errors"][0]["error"].startswith("Zeile 2:")
+
+    assert client.post("/insert/station/batch/", params={"auth": "falsch"}, content=body).status_code == 401
+
+
+def test_station_batch_size_limit(client, monkeypatch):
+    import routes.insert
+
+    monkeypatch.setenv("MEASURE_STATION_AUTHENTICATION", "geheim")
+    monkeypatch.setattr(routes.insert, "STATION_BATCH_MAX_BYTES", 1000)
+    monkeypatch.setattr(storage, "get_stations", _stations([]))
+    now = datetime.now(tz=timezone.utc).timestamp()
+    body = _ndjson([{"station": "keller", "timestamp": now - i, "temp": 15, "humid": 60} for i in range(50)]).encode()
+    packed = gzip.compress(body)
+    assert len(packed) < 1000 < len(body)
+
+    def post(content: bytes, encoding: str | None = None):
+        headers = {"Content-Type": "application/x-ndjson"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return client.post("/insert/station/batch/", params={"auth": "geheim"}, content=content, headers=headers)
+
+    assert post(body).status_code == 413
+    assert post(packed, "gzip").status_code == 413
+    assert post(packed[:len(packed) // 2], "gzip").status_code == 400
+    assert post(gzip.compress(body[:900]), "gzip").status_code == 200
+
+
+def _stations(stations: list):
+    async def get_stations():
+        return stations
+    return get_stations
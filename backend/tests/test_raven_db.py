@@ -0,0 +1,37 @@
+from dependencies import indexes, raven_db
+from dependencies.models import State
+
+
+class FakeQuery:
+    """Abfrage auf einen Index, der noch nicht aktuell ist: mit Warten läuft sie in den Timeout."""
+    def __init__(self, results: list, wait: bool = False):
+        self.results = results
+        self.wait = wait
+
+    def wait_for_non_stale_results(self, wait_timeout=None):
+        return FakeQuery(self.results, wait=True)
+
+    def order_by_descending(self, field: str):
+        return self
+
+    def take(self, count: int):
+        if self.wait:
+            raise TimeoutError("Waited for the query to return non stale result.")
+        return self.results[:count]
+
+
+class FakeSession:
+    def __init__(self, results: list):
+        self.results = results
+
+    def query_index_type(self, index, object_type):
+        return FakeQuery(self.results)
+
+
+def test_stale_index_returns_preliminary_result():
+    state = State(timestamp="2024-01-01T00:00:00", fan_running=True, fan_override=None)
+    latest, stale = raven_db._latest_when_indexed(FakeSession([state]), indexes.States_ByTimestamp, State)
+    assert (latest, stale) == (state, True)
+
+    latest, stale = raven_db._latest_when_indexed(FakeSession([]), indexes.States_ByTimestamp, State)
+    assert (latest, stale) == (None, True)
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dependencies import cache, retention, sqlite_db, storage
+from dependencies.models import Reading, StationReading, ZoneState
+
+
+@pytest.fixture
+def sqlite(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "test.sqlite3"))
+    monkeypatch.setattr(cache, "latest", cache.LatestCache())
+    storage.use(None)
+    asyncio.run(storage.init())
+    yield storage
+    asyncio.run(storage.close())
+    storage.use(None)
+
+
+def _readings(start: datetime, days: int) -> list[Reading]:
+    return [
+        Reading(
+            timestamp=start + timedelta(minutes=30 * i),
+            indoor_temp=20, outdoor_temp=10 + i % 5, indoor_humidity=50, outdoor_humidity=70,
+        )
+        for i in range(days * 48)
+    ]
+
+
+async def _stream(start: datetime, end: datetime, chunk_size: int) -> list[Reading]:
+    streamed = []
+    async for chunk in storage.stream_readings(start, end, chunk_size):
+        assert 0 < len(chunk) <= chunk_size
+        streamed += chunk
+    return streamed
+
+
+def test_stream_matches_history_after_compaction(sqlite):
+    now = datetime.now(tz=timezone.utc)
+    start = now - timedelta(days=retention.RAW_DAYS + 10)
+
+    async def run():
+        await storage.bulk_store(_readings(start, retention.RAW_DAYS + 10))
+        assert (await storage.compact_readings())["compacted"] > 0
+
+        history = await storage.get_history(start, now)
+        streamed = await _stream(start, now, 7)
+        return history, streamed
+
+    history, streamed = asyncio.run(run())
+
+    assert len(streamed) == len(history)
+    assert [r.timestamp for r in streamed] == [r.timestamp for r in history]
+    assert [r.outdoor_temp for r in streamed] == [r.outdoor_temp for r in history]
+    # Die ältesten Werte kommen aus den verdichteten Stundenwerten
+    assert streamed[0].timestamp.minute == 0
+    assert history[0].timestamp < retention.raw_cutoff()
+
+
+def test_stream_endpoint_includes_compacted_range(client):
+    now = datetime.now(tz=timezone.utc)
+    # Zwei ganze Tage vor der Verdichtungsgrenze: 48 Stundenwerte
+    start = retention.raw_cutoff().replace(tzinfo=timezone.utc) - timedelta(days=3)
+    rows = [
+        {"timestamp": r.timestamp.isoformat(), "indoorTemp": 20, "outdoorTemp": 10, "indoorHumidity": 50, "outdoorHumidity": 70}
+        for r in _readings(start, 2)
+    ]
+    client.post("/insert/batch/", json=rows)
+    client.portal.call(storage.compact_readings)
+
+    params = {"start": start.isoformat(), "end": now.isoformat()}
+    lines = client.get("/readings/history/stream/", params=params).text.splitlines()
+    assert len(lines) == len(client.get("/readings/history/", params=params).json()) == 48
+
+
+def test_station_readings_and_zone_states_expire(sqlite):
+    now = datetime.now(tz=timezone.utc)
+    old = now - timedelta(days=retention.STATION_DAYS + 5)
+
+    def station_reading(timestamp: datetime) -> StationReading:
+        return StationReading(
+            station="a", zone="keller", location="indoor", timestamp=timestamp, temp=15, humidity=60, dew_point=7.3,
+        )
+
+    def zone_state(zone: str, timestamp: datetime) -> ZoneState:
+        return ZoneState(zone=zone, timestamp=timestamp, fan_running=True, dew_point_indoor=8, dew_point_outdoor=5)
+
+    async def run():
+        await storage.bulk_store([station_reading(old), station_reading(now)])
+        # keller hat seit Langem nicht mehr umgeschaltet, die letzte Entscheidung muss bleiben
+        await storage.bulk_store([
+            zone_state("keller", old - timedelta(days=1)),
+            zone_state("keller", old),
+            zone_state("dach", old),
+            zone_state("dach", now),
+        ])
+        await storage.compact_readings()
+
+        return await storage.get_station_readings("a", old - timedelta(days=1), now + timedelta(minutes=1))
+
+    readings = asyncio.run(run())
+    assert [r.timestamp.replace(tzinfo=None) for r in readings] == [now.replace(tzinfo=None)]
+
+    rows = sqlite_db._connection.execute(
+        "SELECT key, timestamp FROM documents WHERE collection = 'ZoneStates' ORDER BY key, timestamp"
+    ).fetchall()
+    assert [key for key, _ in rows] == ["dach", "keller"]
+    assert rows[1][1].startswith(old.strftime("%Y-%m-%dT%H:%M"))
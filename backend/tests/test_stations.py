@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dependencies import stations
+from dependencies.models import Station, StationReading
+
+NOW = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(stations, "PUSH_STATION_MAX_AGE", 3600)
+
+
+def _station(name: str, push: bool = True) -> Station:
+    return Station(name=name, address="http://station", zone="a", location="indoor", push=push)
+
+
+def _reading(name: str, timestamp: datetime) -> StationReading:
+    return StationReading(
+        station=name, zone="a", location="indoor", timestamp=timestamp, temp=20, humidity=50, dew_point=9.3,
+    )
+
+
+def test_recent_pushed_skips_stale_readings():
+    registry = [_station("fresh"), _station("stale"), _station("silent")]
+    latest = {
+        "fresh": _reading("fresh", NOW - timedelta(minutes=10)),
+        "stale": _reading("stale", NOW - timedelta(hours=2)),
+    }
+
+    assert stations.recent_pushed(registry, latest, NOW) == [latest["fresh"]]
+
+
+def test_recent_pushed_ignores_polled_stations():
+    latest = {"polled": _reading("polled", NOW)}
+
+    assert stations.recent_pushed([_station("polled", push=False)], latest, NOW) == []
+
+
+def test_recent_pushed_accepts_naive_timestamps():
+    # So liegen die Zeitstempel nach dem Laden aus der Datenbank vor
+    latest = {"fresh": _reading("fresh", (NOW - timedelta(minutes=10)).replace(tzinfo=None))}
+
+    assert stations.recent_pushed([_station("fresh")], latest, NOW) == [latest["fresh"]]
+
+
+@pytest.fixture
+def admin(client):
+    token = client.post("/auth/token/", data={"username": "admin", "password": "admin"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_push_station_without_address(client, admin):
+    station = {"name": "keller", "zone": "keller", "location": "indoor", "push": True}
+    response = client.post("/stations/", json=station, headers=admin)
+
+    assert response.status_code == 200
+    assert response.json()["address"] is None
+    assert [s["name"] for s in client.get("/stations/").json()] == ["keller"]
+
+
+def test_polled_station_requires_address(client, admin):
+    station = {"name": "dach", "zone": "dach", "location": "outdoor"}
+
+    assert client.post("/stations/", json=station, headers=admin).status_code == 400
+    assert client.post("/stations/", json={**station, "address": "kein url"}, headers=admin).status_code == 400
+    assert client.post("/stations/", json={**station, "address": "http://10.42.0.5/get/"}, headers=admin).status_code == 200
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from dependencies import cache, storage
+from dependencies.models import Settings
+
+
+@pytest.fixture
+def sqlite(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "test.sqlite3"))
+    monkeypatch.setattr(cache, "latest", cache.LatestCache())
+    storage.use(None)
+    asyncio.run(storage.init())
+    yield storage
+    asyncio.run(storage.close())
+    storage.use(None)
+
+
+def test_init_creates_default_state(sqlite):
+    state = asyncio.run(storage.get_state())
+
+    assert state is not None and state.Id is not None
+    assert state.fan_running is False and state.fan_override is None
+
+
+def test_settings_are_created_once_and_replaced(sqlite):
+    async def run():
+        created = await storage.get_create_app_settings()
+        await storage.save_settings(created.model_copy(update={"Id": None, "data_cron": "*/5 * * * *"}))
+        return created, await storage.get_app_settings()
+
+    created, saved = asyncio.run(run())
+
+    assert saved.Id == created.Id
+    assert saved.data_cron == "*/5 * * * *"
+
+
+def test_too_many_settings(sqlite):
+    async def run():
+        await storage.store_object(Settings(
+            dht22_indoor_address="", dht22_outdoor_address="", data_cron="* * * * *", fan_override_duration=0,
+        ))
+        await storage.store_object(Settings(
+            dht22_indoor_address="", dht22_outdoor_address="", data_cron="* * * * *", fan_override_duration=0,
+        ))
+        await storage.get_app_settings()
+
+    with pytest.raises(storage.TooManySettings):
+        asyncio.run(run())
+
+
+def test_add_user(sqlite):
+    async def run():
+        await storage.add_user("anna", "hash", "Anna", "anna@example.org")
+        return await storage.count_users(), await storage.get_user("anna")
+
+    count, user = asyncio.run(run())
+
+    assert count == 1
+    assert user.hashed_password == "hash" and not user.disabled